@@ -1,16 +1,24 @@
-from flask import Blueprint, jsonify, session
-from pymongo import MongoClient
+from flask import Blueprint, jsonify, request, session
 from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime
 
+from api.admin_metrics import collect_stats, metric_rollup
+from api.query_params import parse_int_param
+from database import repositories
+from database.cache import cache
+from database.mongo import pool_stats
+from notifications.outbox import outbox_stats
+from notifications.sender import batch_stats
 
-client = MongoClient('mongodb://localhost:27017/')
-db = client['mydatabase'] 
-users_collection = db['users']
-subjects_collection = db['subject']
-exam_plans_collection = db['exam_plans']
-study_sessions_collection = db['study_sessions']
-admin_summary_log_collection = db['admin_summary_log'] # "ตารางที่ 5"
+
+users_collection = repositories.users
+subjects_collection = repositories.subjects
+exam_plans_collection = repositories.exam_plans
+study_sessions_collection = repositories.study_sessions
+admin_summary_log_collection = repositories.admin_summary_log # "ตารางที่ 5"
+
+LOG_PAGE_SIZE = 20
 
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -28,56 +36,77 @@ def admin_required(f):
 
 
 
+def admin_usernames(user_ids):
+    """ชื่อแอดมินของ Log (cache ต่อ user_id เพราะแอดมินมีไม่กี่คนแต่ Log มีเยอะ)"""
+    names = {}
+    for user_id in {u for u in user_ids if u is not None}:
+        names[user_id] = cache.get_or_load(user_id, "admin", "username", lambda user_id=user_id: (
+            users_collection.find_one({"_id": user_id}, {"username": 1}) or {}
+        ).get("username"))
+    return names
+
+
+def log_history_page(before=None, limit=LOG_PAGE_SIZE):
+    """
+    ประวัติ Log เรียงใหม่ -> เก่า แบบ keyset (log_timestamp, _id) ใช้ index log_timestamp
+    before: _id ของ Log ตัวสุดท้ายของหน้าก่อน
+    """
+    query = {}
+    if before is not None:
+        anchor = admin_summary_log_collection.find_one({"_id": before}, {"log_timestamp": 1})
+        if anchor is None:
+            raise ValueError("ไม่พบ Log ที่ระบุใน before")
+        query = {"$or": [
+            {"log_timestamp": {"$lt": anchor["log_timestamp"]}},
+            {"log_timestamp": anchor["log_timestamp"], "_id": {"$lt": before}},
+        ]}
+
+    logs = list(admin_summary_log_collection.find(query, {
+        "log_timestamp": 1, "user_id": 1,
+        "total_users": 1, "total_plans": 1, "total_subjects": 1, "total_admins": 1,
+    }).sort([("log_timestamp", -1), ("_id", -1)]).limit(limit + 1))
+
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+    names = admin_usernames(log.get("user_id") for log in logs)
+
+    history = []
+    for log in logs:
+        user_id = log.pop("user_id", None)
+        history.append({
+            **log,
+            "_id": str(log["_id"]),
+            "admin_username": names.get(user_id),
+        })
+
+    next_before = history[-1]["_id"] if has_more else None
+    return history, next_before
+
+
 @admin_bp.route('/summary', methods=['GET'])
 @admin_required # ตรวจสอบสิทธิ์ Admin ก
 def get_summary():
     """
     API สำหรับดึงข้อมูลสรุป 2 ส่วน: Live Stats และ Log History
+    ?before=<log_id>&limit=  หน้าถัดไปของ Log History
     """
     try:
         #ดึงสถิติ ณ ปัจจุบัน 
-        live_stats = {
-            "total_users": users_collection.count_documents({"role": "user"}),
-            "total_admins": users_collection.count_documents({"role": "admin"}),
-            "total_plans": exam_plans_collection.count_documents({}),
-            "total_subjects": subjects_collection.count_documents({})
-        }
-        
-        # ดึงประวัติ  จากตารางที่ 5
-        pipeline = [
-            { '$sort': { 'log_timestamp': -1 } }, 
-            {
-                '$lookup': {
-                    'from': 'users',             
-                    'localField': 'user_id',      
-                    'foreignField': '_id',        
-                    'as': 'admin_info'          
-                }
-            },
-            {
-                '$unwind': { 
-                    'path': '$admin_info',
-                    'preserveNullAndEmptyArrays': True # เก็บ Log 
-                } 
-            },
-            {
-                '$project': { 
-                    '_id': { '$toString': '$_id' }, 
-                    'log_timestamp': { '$dateToString': { 'format': '%Y-%m-%dT%H:%M:%S.%LZ', 'date': '$log_timestamp' } },
-                    'total_users': 1,
-                    'total_plans': 1,
-                    'total_subjects': 1,
-                    'total_admins': 1,
-                    'admin_username': '$admin_info.username' 
-                }
-            }
-        ]
-        
-        log_history = list(admin_summary_log_collection.aggregate(pipeline))
-        
+        live_stats = collect_stats()
+        live_stats.pop("total_generated_sessions")
+
+        # ดึงประวัติ  จากตารางที่ 5 (ทีละหน้า)
+        try:
+            limit = parse_int_param(request.args, "limit", LOG_PAGE_SIZE, maximum=100)
+            before = ObjectId(request.args["before"]) if request.args.get("before") else None
+            log_history, next_before = log_history_page(before, limit)
+        except (ValueError, InvalidId) as e:
+            return jsonify({'message': str(e)}), 400
+
         return jsonify({
             'live_stats': live_stats,
-            'log_history': log_history
+            'log_history': log_history,
+            'next_before': next_before
         })
 
     except Exception as e:
@@ -94,24 +123,14 @@ def create_summary():
     try:
         admin_user_id = session.get('user_id')
         
-        #คำนวณ
-        stats = {
-            "total_users": users_collection.count_documents({"role": "user"}),
-            "total_admins": users_collection.count_documents({"role": "admin"}),
-            "total_plans": exam_plans_collection.count_documents({}),
-            "total_subjects": subjects_collection.count_documents({}),
-            "total_generated_sessions": study_sessions_collection.count_documents({}) # อันนี้คือโบนัส
-        }
+        #คำนวณ (นับจริง เพราะบันทึกเป็นรายงาน)
+        stats = collect_stats(exact=True)
         
         #บันทึก ลงในตารางที่ 5
         log_entry = {
             "log_timestamp": datetime.now(),
             "user_id": ObjectId(admin_user_id),
-            "total_users": stats["total_users"],
-            "total_admins": stats["total_admins"],
-            "total_plans": stats["total_plans"],
-            "total_subjects": stats["total_subjects"],
-            "total_generated_sessions": stats["total_generated_sessions"]
+            **stats
         }
         
         admin_summary_log_collection.insert_one(log_entry)
@@ -119,4 +138,49 @@ def create_summary():
         return jsonify({'success': True, 'message': 'สร้างรายงานสรุปผลสำเร็จ'}), 201
 
     except Exception as e:
-        return jsonify({'message': str(e)}), 500
\ No newline at end of file
+        return jsonify({'message': str(e)}), 500
+
+
+@admin_bp.route('/db_stats', methods=['GET'])
+@admin_required
+def get_db_stats():
+    """
+    API สำหรับดูสถานะ Connection Pool ของ MongoDB (Client กลางของทั้งแอป)
+    """
+    return jsonify(pool_stats()), 200
+
+
+@admin_bp.route('/outbox_stats', methods=['GET'])
+@admin_required
+def get_outbox_stats():
+    """
+    API สำหรับดูจำนวนอีเมลแจ้งเตือนใน outbox แยกตามสถานะ (queued / sending / sent / failed)
+    และเวลาที่ใช้ของ batch ล่าสุด (connect / ส่ง / reconnect)
+    """
+    return jsonify({**outbox_stats(), "batches": batch_stats()}), 200
+
+
+@admin_bp.route('/cache_stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    """
+    API สำหรับดู hit / miss ของ cache รายวิชาและรายการแผน (แยกตามกลุ่ม)
+    """
+    return jsonify(cache.stats()), 200
+
+
+@admin_bp.route('/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    """
+    API สำหรับกราฟสถิติย้อนหลัง (อ่านจาก snapshot ใน admin_metrics ไม่ scan collection จริง)
+    ?unit=day|week&days=30
+    """
+    try:
+        unit = request.args.get('unit', 'day')
+        days = parse_int_param(request.args, 'days', 30, maximum=366)
+        points = metric_rollup(unit, days)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify({'unit': unit, 'points': points}), 200
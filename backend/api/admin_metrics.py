@@ -0,0 +1,98 @@
+"""
+สถิติของระบบแบบ time-series (admin_metrics) สำหรับกราฟหน้า Admin
+
+Job เก็บ snapshot ทุก ADMIN_METRICS_INTERVAL_MINUTES นาที
+ข้อมูลเก่ากว่า ADMIN_METRICS_RETENTION_DAYS วันถูกลบเองด้วย expireAfterSeconds (ดู migration v6)
+"""
+import os
+from datetime import datetime, timedelta
+
+from database import repositories
+
+
+ADMIN_METRICS_INTERVAL_MINUTES = int(os.getenv("ADMIN_METRICS_INTERVAL_MINUTES", "15"))
+ROLLUP_UNITS = ("day", "week")
+
+users_collection = repositories.users
+subjects_collection = repositories.subjects
+exam_plans_collection = repositories.exam_plans
+study_sessions_collection = repositories.study_sessions
+admin_metrics_collection = repositories.admin_metrics
+
+
+def collect_stats(exact=False):
+    """
+    สถิติรวมของระบบ: นับ user/admin ด้วย $group เดียวบน users
+    ส่วน collection อื่นใช้ estimated_document_count (อ่านจาก metadata ไม่ต้อง scan)
+    exact=True ใช้ count_documents แทน (สำหรับรายงานที่บันทึกลง Log)
+    """
+    roles = {
+        doc["_id"]: doc["count"]
+        for doc in users_collection.aggregate([{"$group": {"_id": "$role", "count": {"$sum": 1}}}])
+    }
+
+    def count(collection):
+        return collection.count_documents({}) if exact else collection.estimated_document_count()
+
+    return {
+        "total_users": roles.get("user", 0),
+        "total_admins": roles.get("admin", 0),
+        "total_plans": count(exam_plans_collection),
+        "total_subjects": count(subjects_collection),
+        "total_generated_sessions": count(study_sessions_collection),
+    }
+
+
+def take_metrics_snapshot():
+    """Job: บันทึกสถิติ ณ ตอนนี้ 1 จุดลง admin_metrics"""
+    stats = collect_stats()
+    completed = study_sessions_collection.count_documents({"status": "completed"})
+    total = stats["total_generated_sessions"]
+
+    point = {
+        "ts": datetime.utcnow(),
+        "meta": {"source": "snapshot"},
+        **stats,
+        "completed_sessions": completed,
+        "completion_rate": round(completed / total, 4) if total else 0.0,
+    }
+    admin_metrics_collection.insert_one(point)
+    print(f"[METRICS] snapshot: {stats['total_users']} users, {stats['total_plans']} plans, "
+          f"{completed}/{total} sessions completed")
+    return point
+
+
+def metric_rollup(unit="day", days=30):
+    """
+    รวม snapshot เป็นรายวัน / รายสัปดาห์ (ตามเวลาไทย)
+    ค่าสะสมใช้ค่าล่าสุดของช่วง, sessions_generated = ส่วนต่างภายในช่วง, completion_rate = ค่าเฉลี่ย
+    """
+    if unit not in ROLLUP_UNITS:
+        raise ValueError(f"'unit' must be one of {', '.join(ROLLUP_UNITS)}")
+
+    since = datetime.utcnow() - timedelta(days=days)
+    pipeline = [
+        {"$match": {"ts": {"$gte": since}}},
+        {"$sort": {"ts": 1}},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$ts", "unit": unit, "timezone": "Asia/Bangkok"}},
+            "total_users": {"$last": "$total_users"},
+            "total_plans": {"$last": "$total_plans"},
+            "total_generated_sessions": {"$last": "$total_generated_sessions"},
+            "first_generated_sessions": {"$first": "$total_generated_sessions"},
+            "completion_rate": {"$avg": "$completion_rate"},
+            "samples": {"$sum": 1},
+        }},
+        {"$sort": {"_id": 1}},
+        {"$project": {
+            "_id": 0,
+            "period_start": "$_id",
+            "total_users": 1,
+            "total_plans": 1,
+            "total_generated_sessions": 1,
+            "sessions_generated": {"$subtract": ["$total_generated_sessions", "$first_generated_sessions"]},
+            "completion_rate": {"$round": ["$completion_rate", 4]},
+            "samples": 1,
+        }},
+    ]
+    return list(admin_metrics_collection.aggregate(pipeline))
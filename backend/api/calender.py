@@ -1,131 +1,68 @@
-from flask import Flask, request, jsonify, Blueprint, session, make_response
+from flask import request, jsonify, Blueprint, session, make_response
 from flask_cors import CORS
 import secrets 
-import math
 import random 
-import uuid
-from pymongo import MongoClient
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
-from datetime import datetime, date, timedelta
-from collections import Counter 
+from datetime import datetime, date
 import pytz
 import traceback
 
-calender_bp = Blueprint('calender', __name__, url_prefix='/calender')
-CORS(calender_bp, supports_credentials=True, origins=["http://localhost:5173"])
+from api.raw_bson import (
+    json_body_response, merge_json_object, raw_bson_enabled, raw_collection, raw_json_array, raw_projection,
+)
+from api.events import publish_event
+from api.conditional import is_not_modified, not_modified_response, plan_etag, with_etag
+from api.streaming import ndjson_response, wants_ndjson
+from api.query_params import parse_day_param, parse_int_param, schedule_window_query
+from database import repositories
+from database.cache import cache
+from notifications.dispatcher import schedule_changed
+from scheduling.engine import generate_schedule
+from scheduling.availability import build_available_slots, parse_slot_minutes
+from scheduling.busy_bitmap import load_user_availability
+from scheduling.timeutil import day_number, day_number_to_date_str, normalize_date_str
 
-client = MongoClient('mongodb://localhost:27017/')
-db = client['mydatabase']
+calender_bp = Blueprint('calender', __name__, url_prefix='/calender')
+CORS(calender_bp, supports_credentials=True, origins=["http://localhost:5173"], expose_headers=["ETag"])
 
-subjects_collection = db["subject"]
-exam_plans_collection = db["exam_plans"]      
-study_sessions_collection = db["study_sessions"] 
+subjects_collection = repositories.subjects
+exam_plans_collection = repositories.exam_plans
+study_sessions_collection = repositories.study_sessions
+fixed_schedules_collection = repositories.fixed_schedules
+availability_bitmaps_collection = repositories.availability_bitmaps
 
 # ตั้งค่า Timezone
 THAI_TZ = pytz.timezone('Asia/Bangkok')
 
 
-def time_to_minutes(time_str):
-    try:
-        hours, minutes = map(int, time_str.split(':'))
-        return (hours * 60) + minutes
-    except Exception:
-        return 0
-
-def minutes_to_time(total_minutes):
-    hours = total_minutes // 60
-    minutes = total_minutes % 60
-    return f"{hours:02d}:{minutes:02d}"
-
-# Algorithm จัดตาราง
-def generate_weighted_schedule(subjects, study_slots):
-    if not subjects or not study_slots:
-        return []
-
-    total_priority = sum(max(1, s.get('priority', 1)) for s in subjects) 
-    
-    if total_priority == 0: 
-        return [{**slot, 'subject': 'Free Slot', 'slot_id': f"slot_{secrets.token_hex(8)}", 'status': 'pending'} for slot in study_slots]
-
-    total_slots = len(study_slots)
-    slots_per_point = total_slots / total_priority
-    
-    task_pool = []
-    sorted_subjects = sorted(subjects, key=lambda s: s.get('priority', 1), reverse=True)
-
-    allocated_count = 0
-    for s in sorted_subjects:
-        p_val = max(1, s.get('priority', 1))
-        count = math.floor(p_val * slots_per_point)
-        allocated_count += count
-        for _ in range(count):
-            task_pool.append(s)
-
-    remainder = total_slots - allocated_count
-    idx = 0
-    while remainder > 0:
-        subj = sorted_subjects[idx % len(sorted_subjects)]
-        task_pool.append(subj)
-        remainder -= 1
-        idx += 1
-
-    random.shuffle(task_pool)
-
-    final_schedule = []
-    last_subject_name = None
-
-    for i in range(total_slots):
-        if not task_pool:
-            final_schedule.append({
-                **study_slots[i],
-                'subject': 'Free Slot',
-                'status': 'pending',
-                'slot_id': f"slot_{secrets.token_hex(8)}"
-            })
-            continue
-
-        selected_idx = 0
-        if len(task_pool) > 1 and task_pool[0]['name'] == last_subject_name:
-            for k in range(1, min(5, len(task_pool))): 
-                if task_pool[k]['name'] != last_subject_name:
-                    selected_idx = k
-                    break
-        
-        selected_task = task_pool.pop(selected_idx)
-        last_subject_name = selected_task['name']
-
-        final_schedule.append({
-            **study_slots[i], 
-            'subject': selected_task['name'],
-            'color': selected_task.get('color', '#EF4444'), 
-            'status': 'pending',
-            'slot_id': f"slot_{secrets.token_hex(8)}"
-        })
-
-    return final_schedule
-
-
-
 @calender_bp.route("/api/schedule", methods=["GET"])
 def get_all_schedule():
     if "user_id" not in session: return jsonify({"message": "Unauthorized"}), 401
     try:
         user_id = ObjectId(session["user_id"])
-        sessions = list(study_sessions_collection.find({"user_id": user_id}))
-        
-        for s in sessions:
-            s["_id"] = str(s["_id"])
-            s["exam_id"] = str(s["exam_id"])
-            s["user_id"] = str(s["user_id"])
-            
-            if "date" in s:
-                if isinstance(s["date"], (datetime, date)):
-                    s["date"] = s["date"].strftime("%Y-%m-%d")
-                else:
-                    s["date"] = str(s["date"]).split("T")[0]
-
-        return jsonify(sessions), 200
+        try:
+            query = schedule_window_query(user_id, request.args)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        # RAW_BSON_READS: ส่ง BSON -> JSON ตรงๆ ไม่สร้าง dict ระหว่างทาง
+        if raw_bson_enabled() and not wants_ndjson():
+            raw_cursor = raw_collection(study_sessions_collection).find(
+                query, raw_projection(study_sessions_collection.LIST_PROJECTION)
+            ).sort([("day", 1), ("startTime", 1)])
+            return json_body_response(raw_json_array(raw_cursor))
+
+        # ?from=&to=&exam_id= จำกัดช่วงที่ดึง (ใช้ index user_id + day)
+        cursor = study_sessions_collection.find(
+            query, study_sessions_collection.LIST_PROJECTION
+        ).sort([("day", 1), ("startTime", 1)])
+
+        # Accept: application/x-ndjson -> ส่งแบบ stream ทีละ document
+        if wants_ndjson():
+            return ndjson_response(cursor)
+
+        return jsonify(list(cursor)), 200
     except Exception as e:
         return jsonify({"message": "Error fetching schedule", "error": str(e)}), 500
 
@@ -134,26 +71,28 @@ def get_user_subjects():
     if "user_id" not in session: return jsonify({"message": "Unauthorized"}), 401
     try:
         user_id = ObjectId(session["user_id"])
-        cursor = subjects_collection.find({"user_id": user_id})
-        subjects_list = []
-        
-        for doc in cursor:
-            exam_date_str = "-"
-            if "exam_date" in doc and doc["exam_date"]:
-                if isinstance(doc["exam_date"], (datetime, date)):
-                    exam_date_str = doc["exam_date"].strftime("%Y-%m-%d")
-                else:
-                    exam_date_str = str(doc["exam_date"])
-
-            subjects_list.append({
-                "_id": str(doc["_id"]), 
-                "title": doc.get("title", "No Title"), 
-                "priority": doc.get("priority", 1),
-                "color": doc.get("color", "#3B82F6"),
-                "exam_date": exam_date_str,
-                "topics": doc.get("topics", [])
-            })
-            
+
+        def load_subjects():
+            subjects_list = []
+            for doc in subjects_collection.find({"user_id": user_id}):
+                exam_date_str = "-"
+                if "exam_date" in doc and doc["exam_date"]:
+                    if isinstance(doc["exam_date"], (datetime, date)):
+                        exam_date_str = doc["exam_date"].strftime("%Y-%m-%d")
+                    else:
+                        exam_date_str = str(doc["exam_date"])
+
+                subjects_list.append({
+                    "_id": str(doc["_id"]),
+                    "title": doc.get("title", "No Title"),
+                    "priority": doc.get("priority", 1),
+                    "color": doc.get("color", "#3B82F6"),
+                    "exam_date": exam_date_str,
+                    "topics": doc.get("topics", [])
+                })
+            return subjects_list
+
+        subjects_list = cache.get_or_load(user_id, "subjects", "calender", load_subjects)
         return jsonify(subjects_list), 200
     except Exception as e:
         return jsonify({"message": "Error", "error": str(e)}), 500
@@ -168,25 +107,23 @@ def add_exam_plan():
              return jsonify({"message": "ข้อมูลไม่ครบถ้วน"}), 400
 
         study_plan_slots_raw = data["studyPlan"] 
-        available_time_slots = [] 
-        slot_duration = 60 
-
-        for day in study_plan_slots_raw:
-            current_slot_start = time_to_minutes(day['startTime'])
-            day_end = time_to_minutes(day['endTime'])
-            while current_slot_start < day_end and (current_slot_start + slot_duration) <= day_end:
-                available_time_slots.append({
-                    'date': day['date'], 
-                    'startTime': minutes_to_time(current_slot_start),
-                    'endTime': minutes_to_time(current_slot_start + slot_duration),
-                })
-                current_slot_start += slot_duration
+        exam_date_str = str(data["examDate"]).split("T")[0].strip()
+
+        availability = load_user_availability(
+            availability_bitmaps_collection, fixed_schedules_collection, ObjectId(session["user_id"])
+        )
+        available_time_slots = build_available_slots(
+            study_plan_slots_raw,
+            exam_date_str=exam_date_str,
+            slot_minutes=parse_slot_minutes(data.get("slotDuration")),
+            availability=availability,
+        )
         
         if not available_time_slots:
              return jsonify({"message": "เวลาไม่พอสำหรับอ่านหนังสือ"}), 400
 
         exam_subjects = data["examSubjects"]
-        scheduled_plan = generate_weighted_schedule(exam_subjects, available_time_slots)
+        scheduled_plan = generate_schedule(exam_subjects, available_time_slots)
         
         user_id = session["user_id"]
         new_plan = {
@@ -196,19 +133,17 @@ def add_exam_plan():
             "exam_date": data["examDate"],
             "study_plan_raw": study_plan_slots_raw,
             "createdAt": datetime.now(THAI_TZ),
-            "status": "active"
+            "status": "active",
+            "version": 1
         }
         plan_result = exam_plans_collection.insert_one(new_plan)
         plan_id = plan_result.inserted_id
 
-        sessions_to_insert = []
-        for slot in scheduled_plan:
-            slot["exam_id"] = plan_id
-            slot["user_id"] = ObjectId(user_id)
-            sessions_to_insert.append(slot)
-
-        if sessions_to_insert:
-            study_sessions_collection.insert_many(sessions_to_insert)
+        repositories.plan_stats.init_plan(plan_id)
+        study_sessions_collection.insert_sessions(scheduled_plan, exam_id=plan_id, user_id=ObjectId(user_id))
+        cache.invalidate(user_id, "plans")
+        publish_event(user_id, "plan_created", {"plan_id": str(plan_id)})
+        schedule_changed()
 
         return jsonify({
             "message": "บันทึกแผนเรียบร้อย",
@@ -225,17 +160,9 @@ def get_exam_plans():
     if "user_id" not in session: return jsonify({"message": "Unauthorized"}), 401
     try:
         user_id = ObjectId(session["user_id"])
-        plans = list(exam_plans_collection.find({"user_id": user_id}).sort("createdAt", -1))
-        
-        for plan in plans:
-            plan["_id"] = str(plan["_id"])
-            plan["user_id"] = str(plan["user_id"])
-            
-            if "exam_date" in plan and plan["exam_date"]:
-                if isinstance(plan["exam_date"], (datetime, date)):
-                    plan["exam_date"] = plan["exam_date"].strftime("%Y-%m-%d")
-                else:
-                    plan["exam_date"] = str(plan["exam_date"])
+        plans = cache.get_or_load(user_id, "plans", "calender", lambda: list(
+            exam_plans_collection.find({"user_id": user_id}).sort("createdAt", -1)
+        ))
 
         return jsonify(plans), 200
     except Exception as e:
@@ -248,31 +175,60 @@ def get_single_exam_plan(plan_id):
         user_id = ObjectId(session["user_id"])
         plan_oid = ObjectId(plan_id)
 
+        # If-None-Match: เช็คแค่ version ของแผน (ไม่ต้องโหลด Session) ถ้าไม่เปลี่ยนตอบ 304
+        if request.if_none_match:
+            head = exam_plans_collection.find_one({"_id": plan_oid, "user_id": user_id}, {"version": 1})
+            if not head: return jsonify({"message": "Not found"}), 404
+            if is_not_modified(plan_etag(head)):
+                return not_modified_response(plan_etag(head))
+
         plan = exam_plans_collection.find_one({"_id": plan_oid, "user_id": user_id})
         if not plan: return jsonify({"message": "Not found"}), 404
-
-        if "exam_date" in plan and plan["exam_date"]:
-             if isinstance(plan["exam_date"], (datetime, date)):
-                plan["exam_date"] = plan["exam_date"].strftime("%Y-%m-%d")
-             else:
-                plan["exam_date"] = str(plan["exam_date"])
-
-        sessions = list(study_sessions_collection.find({"exam_id": plan_oid}).sort([("date", 1), ("startTime", 1)]))
-        
-        for s in sessions:
-            s["_id"] = str(s["_id"])
-            del s["exam_id"]
-            del s["user_id"]
-
-        plan["_id"] = str(plan["_id"])
-        plan["user_id"] = str(plan["user_id"])
+        etag = plan_etag(plan)
+
+        # ?weeks=N (&from=YYYY-MM-DD): แบ่งหน้าแบบ keyset ทีละสัปดาห์ ไม่ส่งมา = ทั้งแผน
+        session_query = {"exam_id": plan_oid}
+        weeks = parse_int_param(request.args, "weeks", None, maximum=52)
+        if weeks:
+            start_day = parse_day_param(request.args, "from")
+            if start_day is None:
+                first = study_sessions_collection.find_one({"exam_id": plan_oid}, {"day": 1}, sort=[("day", 1)])
+                start_day = first["day"] if first else 0
+            end_day = start_day + 7 * weeks
+            session_query["day"] = {"$gte": start_day, "$lt": end_day}
+
+            next_session = study_sessions_collection.find_one(
+                {"exam_id": plan_oid, "day": {"$gte": end_day}}, {"day": 1}, sort=[("day", 1)]
+            )
+            plan["window"] = {
+                "from": day_number_to_date_str(start_day),
+                "to": day_number_to_date_str(end_day - 1),
+            }
+            plan["next_from"] = day_number_to_date_str(next_session["day"]) if next_session else None
+
+        if raw_bson_enabled():
+            raw_cursor = raw_collection(study_sessions_collection).find(
+                session_query,
+                raw_projection(study_sessions_collection.PLAN_PROJECTION),
+            ).sort([("day", 1), ("startTime", 1)])
+            sessions_json = raw_json_array(raw_cursor)
+            return with_etag(json_body_response(
+                merge_json_object(plan, generated_schedule=sessions_json, study_plan=sessions_json)
+            ), etag)
+
+        sessions = list(
+            study_sessions_collection.find(session_query, study_sessions_collection.PLAN_PROJECTION)
+            .sort([("day", 1), ("startTime", 1)])
+        )
         
         plan["generated_schedule"] = sessions
         plan["study_plan"] = sessions 
 
-        return jsonify(plan), 200
+        return with_etag(jsonify(plan), etag)
     except InvalidId:
         return jsonify({"message": "Invalid ID"}), 400
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": "Error", "error": str(e)}), 500
 
@@ -288,19 +244,17 @@ def update_plan_progress(plan_id):
         
         if not updated_items: return jsonify({"message": "No data"}), 400
 
-        count = 0
-        for item in updated_items:
-            slot_id = item.get('slot_id')
-            new_status = item.get('status')
-            
-            if slot_id and new_status:
-                result = study_sessions_collection.update_one(
-                    {"slot_id": slot_id, "user_id": user_id},
-                    {"$set": {"status": new_status}}
-                )
-                if result.matched_count > 0: count += 1
+        plan_oid = ObjectId(plan_id)
+        result = study_sessions_collection.update_statuses(user_id, updated_items, exam_id=plan_oid)
+        if result["modified"]:
+            exam_plans_collection.bump_version(plan_oid, user_id)
+            cache.invalidate(user_id, "plans")
+            publish_event(user_id, "session_status", {
+                "plan_id": plan_id,
+                "changes": [{"slot_id": c.get("slot_id"), "status": c.get("status")} for c in updated_items],
+            })
 
-        return jsonify({"message": f"Updated {count} slots"}), 200
+        return jsonify({"message": f"Updated {result['matched']} slots", **result}), 200
 
     except Exception as e:
         print(f"[ERROR] update_plan_progress: {e}")
@@ -316,22 +270,21 @@ def reschedule_plan(plan_id):
         plan_oid = ObjectId(plan_id)
         
         raw_date = request.json.get("date")
-        postpone_date_str = str(raw_date).split('T')[0].strip()
-        
-        try: postpone_date_dt = datetime.strptime(postpone_date_str, "%Y-%m-%d")
-        except: postpone_date_dt = datetime.now()
+        try: postpone_day = day_number(normalize_date_str(raw_date))
+        except ValueError: postpone_day = day_number(datetime.now(THAI_TZ).strftime("%Y-%m-%d"))
+        postpone_date_str = day_number_to_date_str(postpone_day)
 
+        # แผนต้องเป็นของ User นี้ ไม่งั้นเลื่อนตาราง / bump version ของคนอื่นได้
+        plan = exam_plans_collection.find_one({"_id": plan_oid, "user_id": user_id}, {"subjects": 1})
+        if not plan: return jsonify({"message": "Not found"}), 404
 
         query = {
             "exam_id": plan_oid,
             "status": "pending",
-            "$or": [
-                {"date": {"$gte": postpone_date_str}},
-                {"date": {"$gte": postpone_date_dt}}
-            ]
+            "day": {"$gte": postpone_day}
         }
         
-        affected_sessions = list(study_sessions_collection.find(query).sort([("date", 1), ("startTime", 1)]))
+        affected_sessions = list(study_sessions_collection.find(query).sort([("day", 1), ("startTime", 1)]))
         
         if not affected_sessions:
             return jsonify({"message": "ไม่พบตารางเรียนที่จะเลื่อน", "rescheduled_count": 0}), 200
@@ -342,7 +295,6 @@ def reschedule_plan(plan_id):
             if s.get('subject') not in ['Free Slot', 'เลื่อนตาราง (Rescheduled)', '⛔ เลื่อนตาราง (Rescheduled)']:
                 pending_subjects.append(s['subject'])
 
-        plan = exam_plans_collection.find_one({"_id": plan_oid})
         original_subjects_info = {s['name']: s for s in plan.get('subjects', [])}
 
         flat_subjects_pool = []
@@ -358,15 +310,7 @@ def reschedule_plan(plan_id):
         for s in affected_sessions:
             if s.get('status') == 'rescheduled': continue
 
-            try:
-                raw_d = s["date"]
-                if isinstance(raw_d, str): d_obj = datetime.strptime(raw_d.split('T')[0], "%Y-%m-%d")
-                elif isinstance(raw_d, datetime): d_obj = raw_d
-                else: continue
-            except: continue
-
-         
-            new_date_str = (d_obj + timedelta(days=1)).strftime("%Y-%m-%d")
+            new_date_str = day_number_to_date_str(s["day"] + 1)
             
             if flat_subjects_pool:
                 subj = flat_subjects_pool.pop(0)
@@ -383,18 +327,16 @@ def reschedule_plan(plan_id):
             })
 
         # ลบของเก่า
-        delete_ids = [s["_id"] for s in affected_sessions]
-        if delete_ids:
-            study_sessions_collection.delete_many({"_id": {"$in": delete_ids}})
+        study_sessions_collection.delete_sessions(affected_sessions)
 
         # ใส่ของใหม่
-        if new_sessions_to_insert:
-            study_sessions_collection.insert_many(new_sessions_to_insert)
+        study_sessions_collection.insert_sessions(new_sessions_to_insert)
 
         # ปักหมุดวันเลื่อน
-        study_sessions_collection.delete_many({
-            "exam_id": plan_oid, "date": postpone_date_str, "status": "rescheduled"
-        })
+        study_sessions_collection.delete_sessions(list(study_sessions_collection.find(
+            {"exam_id": plan_oid, "day": postpone_day, "status": "rescheduled"},
+            study_sessions_collection.STATS_PROJECTION,
+        )))
         marker_session = {
             "exam_id": plan_oid, "user_id": user_id,
             "subject": "⛔ เลื่อนตาราง", 
@@ -404,7 +346,11 @@ def reschedule_plan(plan_id):
             "isExam": False, "color": "#9CA3AF",
             "slot_id": f"marker_{secrets.token_hex(8)}"
         }
-        study_sessions_collection.insert_one(marker_session)
+        study_sessions_collection.insert_sessions([marker_session])
+        exam_plans_collection.bump_version(plan_oid, user_id)
+        cache.invalidate(user_id, "plans")
+        publish_event(user_id, "reschedule", {"plan_id": plan_id, "date": postpone_date_str, "rescheduled_count": len(new_sessions_to_insert)})
+        schedule_changed()
 
         return jsonify({
             "message": "Reschedule successful",
@@ -0,0 +1,29 @@
+import zlib
+
+from flask import current_app, request
+
+
+def plan_etag(plan):
+    """
+    ETag ของแผน = id + version (+ query string เพราะ ?weeks= ให้ผลต่างกัน)
+    version เพิ่มทุกครั้งที่ Session ของแผนเปลี่ยน (progress / reschedule / สร้างใหม่)
+    """
+    variant = zlib.crc32(request.query_string)
+    return f"{plan['_id']}-{plan.get('version', 0)}-{variant:08x}"
+
+
+def is_not_modified(etag):
+    return request.if_none_match.contains(etag)
+
+
+def not_modified_response(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
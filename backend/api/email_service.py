@@ -4,27 +4,32 @@ import os
 
 mail = Mail()
 
+def build_notification_message(subject, recipient_email, start_time=None):
+    """
+    สร้างอีเมลแจ้งเตือน (แบบสร้างแรงบันดาลใจ) ใช้ร่วมกับ worker ของ outbox
+    start_time: เวลาเริ่ม Session (ส่งช้า/retry ก็ยังแสดงเวลาที่ถูก) ไม่ส่งมาใช้เวลาปัจจุบัน
+    """
+    #ดึงเวลาปัจจุบันมาแสดงผล
+    current_time_str = start_time or datetime.now().strftime('%H:%M')
+
+    return Message(
+
+        subject=f"ได้เวลาลุยวิชา {subject} แล้ว! 🚀", 
+        sender=os.getenv('MAIL_DEFAULT_SENDER'),
+        recipients=[recipient_email],
+
+        body=f"สวัสดีครับ,\n\n"
+             f"ตั้งสมาธิให้พร้อม! 🧠\n\n"
+             f"ถึงเวลา ( {current_time_str} น.) สำหรับวิชา {subject} ที่คุณตั้งเป้าไว้แล้ว\n\n"
+             f"ความพยายามในวันนี้ สร้างความสำเร็จในวันสอบนะครับ สู้ๆ!"
+    )
+
 def send_notification_email(subject, recipient_email):
     """
     ฟังก์ชันสำหรับส่งอีเมลแจ้งเตือน (แบบสร้างแรงบันดาลใจ)
     """
     try:
-        #ดึงเวลาปัจจุบันมาแสดงผล
-        current_time_str = datetime.now().strftime('%H:%M')
-        
-        msg = Message(
-         
-            subject=f"ได้เวลาลุยวิชา {subject} แล้ว! 🚀", 
-            sender=os.getenv('MAIL_DEFAULT_SENDER'),
-            recipients=[recipient_email],
-       
-            body=f"สวัสดีครับ,\n\n"
-                 f"ตั้งสมาธิให้พร้อม! 🧠\n\n"
-                 f"ถึงเวลา ( {current_time_str} น.) สำหรับวิชา {subject} ที่คุณตั้งเป้าไว้แล้ว\n\n"
-                 f"ความพยายามในวันนี้ สร้างความสำเร็จในวันสอบนะครับ สู้ๆ!"
-        )
-        
-        mail.send(msg)
+        mail.send(build_notification_message(subject, recipient_email))
         print(f"ส่งอีเมล (แบบสร้างแรงบันดาลใจ) สำหรับวิชา {subject} ไปยัง {recipient_email} สำเร็จ")
     
     except Exception as e:
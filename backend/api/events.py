@@ -0,0 +1,286 @@
+"""
+Server-Sent Events ต่อ User: แจ้งการเปลี่ยนแปลงตารางแบบ real-time แทนการ GET ซ้ำ
+
+Event ถูกเขียนลง capped collection user_events (ดู migration v8)
+แต่ละ process มี tailable cursor ตัวเดียว (EventTailer) กระจาย event เข้า queue ของแต่ละ connection
+id ของ event = seq จาก counter กลาง ($inc ตอน publish) เพราะ ObjectId มาจากนาฬิกาของแต่ละเครื่อง เรียงข้ามเครื่องไม่ได้
+Browser ส่ง Last-Event-ID กลับมาเองตอน reconnect เพื่อรับ event ที่พลาดไป
+
+ชนิด event: session_status, reschedule, plan_created, timer, resync
+"""
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from flask import Blueprint, Response, current_app, jsonify, request, session, stream_with_context
+from flask_cors import CORS
+from pymongo import CursorType, ReturnDocument
+from pymongo.errors import PyMongoError
+
+from api.time import current_or_next
+from database import repositories
+
+
+SSE_MIMETYPE = "text/event-stream"
+HEARTBEAT_SECONDS = int(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# เวลาที่ cursor / queue รอ event ใหม่ต่อรอบ (ใช้เป็นจังหวะเช็ค timer ด้วย)
+AWAIT_MS = 5000
+# event ที่ค้างส่งได้ต่อ connection ก่อนจะตัดเป็น resync
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "256"))
+# จอง seq กับ insert เป็นคนละขั้น event ที่ seq น้อยกว่าอาจ insert ทีหลังได้ -> อ่านย้อนเผื่อไว้เท่านี้แล้วตัดตัวซ้ำด้วย seq
+RESUME_SLACK = 64
+
+events_bp = Blueprint("events_bp", __name__, url_prefix="/events")
+CORS(events_bp, supports_credentials=True, origins=["http://localhost:5173"])
+
+user_events_collection = repositories.user_events
+counters_collection = repositories.counters
+
+
+def next_event_seq():
+    counter = counters_collection.find_one_and_update(
+        {"_id": "user_events"}, {"$inc": {"seq": 1}}, upsert=True, return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"]
+
+
+def current_event_seq():
+    counter = counters_collection.find_one({"_id": "user_events"})
+    return counter["seq"] if counter else 0
+
+
+def publish_event(user_id, event_type, data):
+    """บันทึก event ของ User (ผิดพลาดก็ไม่ให้กระทบ request หลัก)"""
+    try:
+        user_events_collection.insert_one({
+            "seq": next_event_seq(),
+            "user_id": ObjectId(user_id),
+            "type": event_type,
+            "data": data,
+            "ts": datetime.utcnow(),
+        })
+    except PyMongoError as e:
+        print(f"[EVENTS] publish {event_type} failed: {e}")
+
+
+def format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {current_app.json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def parse_last_event_id():
+    value = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+class EventTailer:
+    """
+    tailable cursor ตัวเดียวต่อ process อ่าน user_events ของทุก User แล้วกระจายเข้า queue ของแต่ละ connection
+    connection SSE จึงไม่ถือ connection ของ Mongo pool ค้างไว้เอง (มีแค่ thread นี้ตัวเดียว)
+    """
+
+    def __init__(self, collection, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.collection = collection
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, user_oid):
+        subscriber = Subscriber(user_oid, self.queue_size)
+        with self._lock:
+            self._subscribers[user_oid].add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sse-tailer", daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            group = self._subscribers.get(subscriber.user_oid)
+            if group is not None:
+                group.discard(subscriber)
+                if not group:
+                    del self._subscribers[subscriber.user_oid]
+
+    def _dispatch(self, doc):
+        with self._lock:
+            targets = list(self._subscribers.get(doc.get("user_id"), ()))
+        for subscriber in targets:
+            subscriber.push(doc)
+
+    def _run(self):
+        last_seq = None
+        while True:
+            try:
+                if last_seq is None:
+                    newest = self.collection.find_one({}, {"seq": 1}, sort=[("$natural", -1)])
+                    last_seq = newest.get("seq", 0) if newest else 0
+                # อ่านย้อน RESUME_SLACK เผื่อ event ที่ insert ช้า ตัวที่ส่งไปแล้ว connection ตัดทิ้งเอง (EventFilter)
+                cursor = self.collection.find(
+                    {"seq": {"$gt": last_seq - RESUME_SLACK}}, cursor_type=CursorType.TAILABLE_AWAIT,
+                ).max_await_time_ms(AWAIT_MS)
+                try:
+                    while cursor.alive:
+                        doc = cursor.try_next()
+                        if doc is not None:
+                            last_seq = max(last_seq, doc["seq"])
+                            self._dispatch(doc)
+                finally:
+                    cursor.close()
+            except PyMongoError as e:
+                print(f"[EVENTS] tailer error: {e}")
+            # tailable cursor ตายเมื่อ collection ว่าง / ถูกเขียนทับ / DB ล่ม -> รอแล้วเปิดใหม่
+            time.sleep(AWAIT_MS / 1000)
+
+
+class Subscriber:
+    """queue ของ 1 connection  client ช้าจน queue เต็ม -> ทิ้ง event แล้วส่ง resync แทน"""
+
+    def __init__(self, user_oid, queue_size):
+        self.user_oid = user_oid
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def push(self, doc):
+        try:
+            self.queue.put_nowait(doc)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+class EventFilter:
+    """
+    event ที่ connection นี้ควรส่ง: seq มากกว่า floor และยังไม่เคยส่ง
+    ไม่เทียบแค่ seq > ตัวล่าสุด เพราะ event ที่ seq น้อยกว่าอาจมาถึงทีหลัง
+    """
+
+    def __init__(self, floor):
+        self.floor = floor
+        self.seen = set()
+
+    def accept(self, seq):
+        if seq <= self.floor or seq in self.seen:
+            return False
+        self.seen.add(seq)
+        if len(self.seen) > 4 * RESUME_SLACK:
+            # ตัวที่เก่ากว่าช่วงที่ tailer อ่านย้อนจะไม่กลับมาอีกแล้ว
+            self.floor = max(self.seen) - RESUME_SLACK
+            self.seen = {s for s in self.seen if s > self.floor}
+        return True
+
+
+tailer = EventTailer(user_events_collection)
+
+
+def event_stream(user_oid, last_seq, plan_id=None):
+    """
+    Generator ของ SSE: event จาก user_events, timer ของ plan_id (ถ้าระบุ) และ heartbeat
+    """
+    # subscribe ก่อนอ่าน event ที่พลาด เพื่อไม่ให้มีช่องว่างระหว่างสองทาง (ตัวซ้ำตัดด้วย EventFilter)
+    subscriber = tailer.subscribe(user_oid)
+    try:
+        missed = []
+        if last_seq is not None:
+            # event ถัดจาก last_seq ถูก capped collection เขียนทับไปแล้ว -> ให้ client โหลดข้อมูลใหม่ทั้งหมด
+            oldest = user_events_collection.find_one({}, {"seq": 1}, sort=[("$natural", 1)])
+            if oldest is not None and oldest.get("seq", 0) > last_seq + 1:
+                yield format_sse("resync", {})
+            else:
+                missed = list(user_events_collection.find({"user_id": user_oid, "seq": {"$gt": last_seq}}).sort("seq", 1))
+        else:
+            last_seq = current_event_seq()
+        events = EventFilter(last_seq)
+
+        last_timer = object()
+        last_beat = time.monotonic()
+
+        def timer_event():
+            nonlocal last_timer
+            entry = current_or_next(user_oid, plan_id)
+            if entry["session"] != last_timer:
+                last_timer = entry["session"]
+                return format_sse("timer", {"plan_id": plan_id, "session": last_timer})
+            return None
+
+        def send(doc):
+            if not events.accept(doc["seq"]):
+                return
+            yield format_sse(doc["type"], doc["data"], event_id=doc["seq"])
+            if plan_id and doc["data"].get("plan_id") == plan_id:
+                event = timer_event()
+                if event:
+                    yield event
+
+        if plan_id:
+            yield timer_event()
+        for doc in missed:
+            yield from send(doc)
+
+        while True:
+            if subscriber.overflowed:
+                subscriber.overflowed = False
+                subscriber.drain()
+                yield format_sse("resync", {})
+
+            doc = subscriber.get(timeout=AWAIT_MS / 1000)
+            if doc is not None:
+                yield from send(doc)
+                continue
+
+            # ไม่มี event ใหม่ในรอบนี้: เช็ค timer (Session จบ / เริ่มตัวถัดไป) และ heartbeat
+            if plan_id:
+                event = timer_event()
+                if event:
+                    yield event
+            if time.monotonic() - last_beat >= HEARTBEAT_SECONDS:
+                last_beat = time.monotonic()
+                yield ": heartbeat\n\n"
+    finally:
+        tailer.unsubscribe(subscriber)
+
+
+@events_bp.route("/stream", methods=["GET"])
+def stream_events():
+    """
+    SSE ของ User ที่ login อยู่  ?plan_id= เพื่อรับ event timer (กำลังเรียน / ถัดไป) ของแผนนั้นด้วย
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"message": "Unauthorized"}), 401
+
+    plan_id = request.args.get("plan_id") or None
+    if plan_id and not ObjectId.is_valid(plan_id):
+        return jsonify({"message": "'plan_id' is not a valid id"}), 400
+
+    return Response(
+        stream_with_context(event_stream(ObjectId(user_id), parse_last_event_id(), plan_id)),
+        mimetype=SSE_MIMETYPE,
+        headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"},
+    )
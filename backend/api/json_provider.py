@@ -0,0 +1,47 @@
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # ไม่มี orjson ก็ยังใช้ json มาตรฐานได้ (ช้ากว่า)
+    orjson = None
+
+
+def bson_default(o):
+    """แปลงชนิดข้อมูลจาก MongoDB ที่ JSON ไม่รู้จัก"""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, datetime):
+        # pymongo คืนเวลาเป็น UTC แบบไม่มี tzinfo
+        if o.tzinfo is None:
+            o = o.replace(tzinfo=timezone.utc)
+        return o.isoformat()
+    if isinstance(o, date):
+        return o.strftime("%Y-%m-%d")
+    if isinstance(o, Decimal128):
+        return str(o.to_decimal())
+    if isinstance(o, (Decimal, uuid.UUID)):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """
+    JSON Provider ของทั้งแอป: ส่ง ObjectId / datetime จาก MongoDB ออกไปได้ตรงๆ
+    ไม่ต้องวนแปลง str() ทีละ document ใน handler
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+            if kwargs.get("indent"):
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=bson_default, option=option).decode()
+
+        kwargs.setdefault("default", bson_default)
+        return super().dumps(obj, **kwargs)
@@ -1,14 +1,13 @@
 from flask import Blueprint, request, jsonify, session
 from flask_cors import cross_origin
-from pymongo import MongoClient
 from werkzeug.security import check_password_hash
 from bson.objectid import ObjectId  
 
+from database import repositories
+
 login_bp = Blueprint('login', __name__, url_prefix='/login')
 
-client = MongoClient('mongodb://localhost:27017/')
-db = client['mydatabase']
-users_collection = db['users']
+users_collection = repositories.users
 
 @login_bp.route('/', methods=['POST'])
 @cross_origin(supports_credentials=True, origins=['http://localhost:5173'])
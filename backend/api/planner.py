@@ -1,133 +1,40 @@
 from flask import Blueprint, jsonify, session, request, make_response
 from flask_cors import CORS
-from pymongo import MongoClient
 from bson.objectid import ObjectId
-from datetime import datetime, timedelta
-import os
-import math
+from datetime import datetime
 import uuid
-import random 
-from collections import Counter
 import traceback
 import pytz 
 
+from api.raw_bson import json_body_response, raw_bson_enabled, raw_collection, raw_json_array, raw_projection
+from api.events import publish_event
+from api.conditional import is_not_modified, not_modified_response, plan_etag, with_etag
+from api.streaming import ndjson_response, wants_ndjson
+from api.query_params import schedule_window_query
+from database import repositories
+from database.cache import cache
+from notifications.dispatcher import schedule_changed
+from scheduling.engine import generate_schedule
+from scheduling.availability import build_available_slots, parse_slot_minutes
+from scheduling.busy_bitmap import load_user_availability, save_user_availability
+from scheduling.timeutil import day_number, day_number_to_date_str, normalize_date_str
 
-planner_bp = Blueprint("planner_bp", __name__)
 
-CORS(planner_bp, supports_credentials=True, methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
+planner_bp = Blueprint("planner_bp", __name__)
 
+CORS(planner_bp, supports_credentials=True, methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"], expose_headers=["ETag"])
 
-client = MongoClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017/"))
-db = client["mydatabase"] 
 
-subjects_collection = db["subject"]
-exam_plans_collection = db["exam_plans"]
-study_sessions_collection = db["study_sessions"]
-fixed_schedules_collection = db["fixed_schedules"]
+subjects_collection = repositories.subjects
+exam_plans_collection = repositories.exam_plans
+study_sessions_collection = repositories.study_sessions
+fixed_schedules_collection = repositories.fixed_schedules
+availability_bitmaps_collection = repositories.availability_bitmaps
 
 
 THAI_TZ = pytz.timezone('Asia/Bangkok')
 
 
-def time_to_minutes(time_str):
-
-    try:
-        hours, minutes = map(int, time_str.split(':'))
-        return (hours * 60) + minutes
-    except Exception:
-        return 0
-
-def minutes_to_time(total_minutes):
-
-    hours = total_minutes // 60
-    minutes = total_minutes % 60
-    return f"{hours:02d}:{minutes:02d}"
-
-def is_time_overlap(start1, end1, start2, end2):
-
-    return max(start1, start2) < min(end1, end2)
-
-#Algorithm จัดตาราง 
-def generate_weighted_schedule(subjects, study_slots):
-
-    if not subjects or not study_slots:
-        return []
-
-    total_priority = sum(s.get('priority', 1) for s in subjects)
-    if total_priority == 0:
-        return [
-            {**slot, 'subject': 'Free Slot', 'status': 'pending', 'slot_id': str(uuid.uuid4())}
-            for slot in study_slots
-        ]
-
-    total_slots = len(study_slots)
-    slots_per_point = total_slots / total_priority
-    
-    task_pool = []
-    allocated_count = 0
-    
-
-    
-    # เติม Pool ตามน้ำหนัก Priority
-    for s in subjects:
-        count = math.floor(s['priority'] * slots_per_point)
-        allocated_count += count
-        for _ in range(count):
-            task_pool.append(s)
-
-    # เติมเศษที่เหลือ
-    remainder = total_slots - allocated_count
-    sorted_subjects = sorted(subjects, key=lambda s: s['priority'], reverse=True)
-    
-    idx = 0
-    while remainder > 0:
-        subj = sorted_subjects[idx % len(sorted_subjects)]
-        task_pool.append(subj)
-        remainder -= 1
-        idx += 1
-
-    # สลับลำดับใน Pool เพื่อความหลากหลาย
-    random.shuffle(task_pool)
-
-    final_schedule = []
-    last_subject_name = None
-
-    # หยอดลง Slot 
-    for i in range(total_slots):
-        if not task_pool:
-            final_schedule.append({
-                **study_slots[i],
-                'subject': 'Free Slot',
-                'status': 'pending',
-                'slot_id': str(uuid.uuid4())
-            })
-            continue
-
-        selected_index = -1
-        for pool_idx, task in enumerate(task_pool):
-            if task['name'] != last_subject_name:
-                selected_index = pool_idx
-                break
-        
-        if selected_index == -1:
-            selected_index = 0
-
-        selected_task = task_pool.pop(selected_index)
-        
-        final_schedule.append({
-            **study_slots[i],
-            'subject': selected_task['name'],
-            'status': 'pending',
-            'slot_id': str(uuid.uuid4()),
-            'color': selected_task.get('color', '#EF4444') 
-        })
-
-        last_subject_name = selected_task['name']
-
-    return final_schedule
-
-
-
 @planner_bp.route("/api/settings/fixed-schedule", methods=["POST", "GET"])
 def handle_fixed_schedule():
     if "user_id" not in session:
@@ -144,6 +51,10 @@ def handle_fixed_schedule():
                 for item in schedules:
                     item["user_id"] = user_id
                 fixed_schedules_collection.insert_many(schedules)
+
+            # สร้าง Bitmap เวลาไม่ว่างใหม่ทุกครั้งที่บันทึก
+            save_user_availability(availability_bitmaps_collection, user_id, schedules)
+            cache.invalidate(user_id, "fixed_schedule")
             
             return jsonify({"message": "Saved fixed schedule successfully"}), 200
         except Exception as e:
@@ -151,7 +62,9 @@ def handle_fixed_schedule():
 
     elif request.method == "GET":
         try:
-            schedules = list(fixed_schedules_collection.find({"user_id": user_id}, {"_id": 0, "user_id": 0}))
+            schedules = cache.get_or_load(user_id, "fixed_schedule", "list", lambda: list(
+                fixed_schedules_collection.find({"user_id": user_id}, {"_id": 0, "user_id": 0})
+            ))
             return jsonify(schedules), 200
         except Exception as e:
              return jsonify({"message": "Error fetching", "error": str(e)}), 500
@@ -161,21 +74,28 @@ def get_all_schedule():
     if "user_id" not in session: return jsonify({"message": "Unauthorized"}), 401
     try:
         user_id = ObjectId(session["user_id"])
-        sessions = list(study_sessions_collection.find({"user_id": user_id}))
-        
-        # แปลง ObjectId และ Date ให้เป็น String เพื่อส่งกลับ JSON
-        for s in sessions:
-            s["_id"] = str(s["_id"])
-            s["exam_id"] = str(s["exam_id"])
-            s["user_id"] = str(s["user_id"])
-            
-            if "date" in s:
-                if isinstance(s["date"], (datetime)):
-                    s["date"] = s["date"].strftime("%Y-%m-%d")
-                else:
-                    s["date"] = str(s["date"]).split("T")[0]
-            
-        return jsonify(sessions), 200
+        try:
+            query = schedule_window_query(user_id, request.args)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        # RAW_BSON_READS: ส่ง BSON -> JSON ตรงๆ ไม่สร้าง dict ระหว่างทาง
+        if raw_bson_enabled() and not wants_ndjson():
+            raw_cursor = raw_collection(study_sessions_collection).find(
+                query, raw_projection(study_sessions_collection.LIST_PROJECTION)
+            ).sort([("day", 1), ("startTime", 1)])
+            return json_body_response(raw_json_array(raw_cursor))
+
+        # ?from=&to=&exam_id= จำกัดช่วงที่ดึง (ใช้ index user_id + day)
+        cursor = study_sessions_collection.find(
+            query, study_sessions_collection.LIST_PROJECTION
+        ).sort([("day", 1), ("startTime", 1)])
+
+        # Accept: application/x-ndjson -> ส่งแบบ stream ทีละ document
+        if wants_ndjson():
+            return ndjson_response(cursor)
+
+        return jsonify(list(cursor)), 200
     except Exception as e:
         return jsonify({"message": "Error fetching schedule", "error": str(e)}), 500
 
@@ -186,27 +106,29 @@ def get_user_subjects():
     
     try:
         user_id = ObjectId(session["user_id"])
-        cursor = subjects_collection.find({"user_id": user_id})
-        subjects_list = []
-        
-        for doc in cursor:
-            final_topics = doc.get("topics", [])
-            if not final_topics:
-                try:
-                    chapter_count = int(doc.get("subject", "0"))
-                    if chapter_count > 0:
-                        final_topics = [f"บทที่ {i+1}" for i in range(chapter_count)]
-                except (ValueError, TypeError):
-                    pass
-
-            subjects_list.append({
-                "_id": str(doc["_id"]),
-                "title": doc.get("title", "ไม่มีชื่อวิชา"),
-                "priority": doc.get("priority", 1),
-                "topics": final_topics,
-                "color": doc.get("color", "#EF4444")
-            })
-            
+
+        def load_subjects():
+            subjects_list = []
+            for doc in subjects_collection.find({"user_id": user_id}):
+                final_topics = doc.get("topics", [])
+                if not final_topics:
+                    try:
+                        chapter_count = int(doc.get("subject", "0"))
+                        if chapter_count > 0:
+                            final_topics = [f"บทที่ {i+1}" for i in range(chapter_count)]
+                    except (ValueError, TypeError):
+                        pass
+
+                subjects_list.append({
+                    "_id": str(doc["_id"]),
+                    "title": doc.get("title", "ไม่มีชื่อวิชา"),
+                    "priority": doc.get("priority", 1),
+                    "topics": final_topics,
+                    "color": doc.get("color", "#EF4444")
+                })
+            return subjects_list
+
+        subjects_list = cache.get_or_load(user_id, "subjects", "planner", load_subjects)
         return jsonify(subjects_list), 200
     except Exception as e:
         return jsonify({"message": "Error fetching subjects", "error": str(e)}), 500
@@ -225,67 +147,24 @@ def add_exam_plan():
 
         exam_date_raw = data["examDate"]
         exam_date_str = exam_date_raw.split("T")[0].strip()
-        print(f"[DEBUG] Exam Date Target: {exam_date_str}")
-
-        # ดึง Fixed Schedule มาเพื่อตรวจสอบเวลาว่าง
-        user_fixed_schedules = list(fixed_schedules_collection.find({"user_id": user_id}))
-        fixed_map = {}
-        for fs in user_fixed_schedules:
-            day_name = fs.get('day')
-            s_min = time_to_minutes(fs.get('startTime'))
-            e_min = time_to_minutes(fs.get('endTime'))
-            if day_name not in fixed_map:
-                fixed_map[day_name] = []
-            fixed_map[day_name].append((s_min, e_min))
-
-        raw_study_plan = data["studyPlan"]
-        available_time_slots = []
-        slot_duration = 60 # กำหนดความยาวต่อคาบ (นาที)
-
-        for day in raw_study_plan:
-            day_date_str = day['date'].split("T")[0].strip()
-            
-            # กรองวันสอบออก (ไม่ให้อ่านหนังสือในวันสอบ)
-            if day_date_str == exam_date_str:
-                print(f"[FILTER] Skipping exam date overlap: {day_date_str}")
-                continue
-                                 
-            current_date_obj = datetime.strptime(day_date_str, "%Y-%m-%d")
-            day_of_week = current_date_obj.strftime("%A")
-
-            start_min = time_to_minutes(day['startTime'])
-            end_min = time_to_minutes(day['endTime'])
-            
-            current_time = start_min
-            # แบ่งเวลาเป็น Slot ย่อยๆ
-            while current_time + slot_duration <= end_min:
-                slot_start = current_time
-                slot_end = current_time + slot_duration
-                
-                # Check Fixed Schedule (เช็คว่าชนกับเวลาเรียนปกติไหม)
-                is_blocked = False
-                if day_of_week in fixed_map:
-                    for fixed_start, fixed_end in fixed_map[day_of_week]:
-                        if is_time_overlap(slot_start, slot_end, fixed_start, fixed_end):
-                            is_blocked = True
-                            print(f"[BLOCKED] {day_date_str} {minutes_to_time(slot_start)} blocked by Fixed Schedule")
-                            break
-                
-                if not is_blocked:
-                    available_time_slots.append({
-                        'date': day_date_str,
-                        'startTime': minutes_to_time(slot_start),
-                        'endTime': minutes_to_time(slot_end)
-                    })
-                
-                current_time += slot_duration
+
+        # ดึงเวลาไม่ว่าง (Bitmap จาก Fixed Schedule) มาเพื่อตรวจสอบเวลาว่าง
+        availability = load_user_availability(
+            availability_bitmaps_collection, fixed_schedules_collection, user_id
+        )
+
+        # หักเวลา Fixed Schedule ออกจากช่วงอ่านหนังสือ แล้วตัดเป็น Slot (ไม่รวมวันสอบ)
+        slot_duration = parse_slot_minutes(data.get("slotDuration"))
+        available_time_slots = build_available_slots(
+            data["studyPlan"], exam_date_str=exam_date_str, slot_minutes=slot_duration, availability=availability
+        )
 
         if not available_time_slots:
              return jsonify({"message": "เวลาไม่พอสำหรับอ่านหนังสือ (ติดวันสอบ หรือติดตาราง Fixed Schedule หมด)"}), 400
 
         # เรียกใช้ Algorithm จัดตาราง
         exam_subjects = data["examSubjects"]
-        scheduled_plan = generate_weighted_schedule(exam_subjects, available_time_slots)
+        scheduled_plan = generate_schedule(exam_subjects, available_time_slots)
 
         # บันทึกแผนแม่บท
         exam_doc = {
@@ -295,21 +174,20 @@ def add_exam_plan():
             "exam_date": data["examDate"],
             "prep_start_date": data.get("prepStartDate"),
             "prep_end_date": data.get("prepEndDate"),
-            "createdAt": datetime.now(THAI_TZ)
+            "createdAt": datetime.now(THAI_TZ),
+            "status": "active",
+            "version": 1
         }
         exam_result = exam_plans_collection.insert_one(exam_doc)
         exam_id = exam_result.inserted_id
 
         # บันทึกรายวิชาย่อย (Sessions)
-        sessions_to_insert = []
-        for slot in scheduled_plan:
-            slot["exam_id"] = exam_id
-            slot["user_id"] = user_id
-            sessions_to_insert.append(slot)
-
-        if sessions_to_insert:
-            study_sessions_collection.insert_many(sessions_to_insert)
-        
+        repositories.plan_stats.init_plan(exam_id)
+        study_sessions_collection.insert_sessions(scheduled_plan, exam_id=exam_id, user_id=user_id)
+        cache.invalidate(user_id, "plans")
+        publish_event(user_id, "plan_created", {"plan_id": str(exam_id)})
+        schedule_changed()
+
         return jsonify({"message": "บันทึกแผนสำเร็จ", "planId": str(exam_id)}), 201
 
     except Exception as e:
@@ -326,39 +204,22 @@ def get_exam_plan(plan_id):
         user_id = ObjectId(session["user_id"])
         plan_oid = ObjectId(plan_id)
 
+        if request.if_none_match:
+            head = exam_plans_collection.find_one({"_id": plan_oid, "user_id": user_id}, {"version": 1})
+            if not head:
+                return jsonify({"message": "Not found"}), 404
+            if is_not_modified(plan_etag(head)):
+                return not_modified_response(plan_etag(head))
+
         plan = exam_plans_collection.find_one({"_id": plan_oid, "user_id": user_id})
         if not plan:
             return jsonify({"message": "Not found"}), 404
 
-        sessions_cursor = study_sessions_collection.find(
-            {"exam_id": plan_oid}
-        ).sort([("date", 1), ("startTime", 1)])
-
-        study_plan = []
-        for sess in sessions_cursor:
-            sess["_id"] = str(sess["_id"])
-            del sess["exam_id"]
-            del sess["user_id"]
-            
-            # Format Date
-            if "date" in sess:
-                if isinstance(sess["date"], datetime):
-                    sess["date"] = sess["date"].strftime("%Y-%m-%d")
-                else:
-                    sess["date"] = str(sess["date"]).split("T")[0]
-            
-            study_plan.append(sess)
-
-        plan["_id"] = str(plan["_id"])
-        plan["user_id"] = str(plan["user_id"])
-        
-        if "exam_date" in plan and plan["exam_date"]:
-            if isinstance(plan["exam_date"], datetime):
-                plan["exam_date"] = plan["exam_date"].strftime("%Y-%m-%d")
-        
-        plan["study_plan"] = study_plan
+        plan["study_plan"] = list(study_sessions_collection.find(
+            {"exam_id": plan_oid}, study_sessions_collection.PLAN_PROJECTION
+        ).sort([("day", 1), ("startTime", 1)]))
         
-        return jsonify(plan), 200
+        return with_etag(jsonify(plan), plan_etag(plan))
 
     except Exception as e:
         return jsonify({"message": "Error", "error": str(e)}), 500
@@ -375,14 +236,18 @@ def update_progress(plan_id):
         data = request.json
         chapters = data.get("chapters", [])
         
-        for ch in chapters:
-            if "slot_id" in ch and "status" in ch:
-                study_sessions_collection.update_one(
-                    {"slot_id": ch["slot_id"], "user_id": ObjectId(session["user_id"])},
-                    {"$set": {"status": ch["status"]}}
-                )
-        
-        return jsonify({"message": "Progress updated"}), 200
+        user_id, plan_oid = ObjectId(session["user_id"]), ObjectId(plan_id)
+        # จำกัดที่ Slot ของแผนนี้ ไม่งั้นแก้ Slot แผน A แต่ไป bump version แผน B (ETag แผน A ค้าง)
+        result = study_sessions_collection.update_statuses(user_id, chapters, exam_id=plan_oid)
+        if result["modified"]:
+            exam_plans_collection.bump_version(plan_oid, user_id)
+            cache.invalidate(session["user_id"], "plans")
+            publish_event(session["user_id"], "session_status", {
+                "plan_id": plan_id,
+                "changes": [{"slot_id": c.get("slot_id"), "status": c.get("status")} for c in chapters],
+            })
+
+        return jsonify({"message": "Progress updated", **result}), 200
     except Exception as e:
         return jsonify({"message": "Error", "error": str(e)}), 500
 
@@ -405,28 +270,27 @@ def reschedule_plan(plan_id):
         
         # รับวันที่ต้องการเลื่อน
         raw_date = request.json.get("date")
-        postpone_date_str = str(raw_date).split('T')[0]
-        
-        # สร้างตัวแปร datetime ไว้เผื่อ Database เก็บเป็น Date Object
+        postpone_date_str = normalize_date_str(raw_date)
         try:
-            postpone_date_dt = datetime.strptime(postpone_date_str, "%Y-%m-%d")
-        except:
-            postpone_date_dt = datetime.now()
+            postpone_day = day_number(postpone_date_str)
+        except ValueError:
+            postpone_day = day_number(datetime.now(THAI_TZ).strftime("%Y-%m-%d"))
 
         print(f"[RESCHEDULE] Triggered for date: {postpone_date_str}")
 
+        # แผนต้องเป็นของ User นี้ ไม่งั้นเลื่อนตาราง / bump version ของคนอื่นได้
+        if not exam_plans_collection.find_one({"_id": plan_oid, "user_id": user_id}, {"_id": 1}):
+            return jsonify({"message": "Not found"}), 404
+
         # ค้นหาตารางที่ยังไม่เสร็จ (pending) ตั้งแต่วันนั้นเป็นต้นไป
         query = {
             "exam_id": plan_oid,
             "status": "pending",
-            "$or": [
-                {"date": {"$gte": postpone_date_str}},       
-                {"date": {"$gte": postpone_date_dt}}          
-            ]
+            "day": {"$gte": postpone_day}
         }
         
         affected_sessions = list(
-            study_sessions_collection.find(query).sort([("date", 1), ("startTime", 1)])
+            study_sessions_collection.find(query).sort([("day", 1), ("startTime", 1)])
         )
         
         if not affected_sessions:
@@ -435,64 +299,31 @@ def reschedule_plan(plan_id):
                 "rescheduled_count": 0
             }), 200
 
-        # จัดกลุ่มตามวันที่เดิม (เพื่อ Shift ไปทีละวัน)
-        date_groups = {}
-        for sess in affected_sessions:
-            raw_s_date = sess.get("date")
-            s_date_str = ""
-            
-            if isinstance(raw_s_date, str):
-                s_date_str = raw_s_date.split('T')[0]
-            elif isinstance(raw_s_date, datetime):
-                s_date_str = raw_s_date.strftime("%Y-%m-%d")
-            
-            if s_date_str:
-                if s_date_str not in date_groups:
-                    date_groups[s_date_str] = []
-                date_groups[s_date_str].append(sess)
-        
-        sorted_dates = sorted(date_groups.keys())
-        
         # สร้างรายการใหม่ (เลื่อนวัน +1)
         new_sessions_to_insert = []
-        
-        for original_date_str in sorted_dates:
-            sessions_on_date = date_groups[original_date_str]
-            
-            try:
-                original_date_obj = datetime.strptime(original_date_str, "%Y-%m-%d")
-                new_date_obj = original_date_obj + timedelta(days=1)
-                new_date_str = new_date_obj.strftime("%Y-%m-%d") 
-            except Exception as e:
-                continue
-
-            for sess in sessions_on_date:
-                # สร้าง Object ใหม่
-                new_sess = {
-                    "exam_id": plan_oid,
-                    "user_id": user_id,
-                    "subject": sess.get("subject", "Free Slot"),
-                    "date": new_date_str,          
-                    "startTime": sess["startTime"],
-                    "endTime": sess["endTime"],
-                    "status": "postponed",         
-                    "status": "pending", 
-                    "isExam": sess.get("isExam", False),
-                    "color": sess.get("color", "#3B82F6"),
-                    "slot_id": str(uuid.uuid4())   
-                }
-                new_sessions_to_insert.append(new_sess)
+        for sess in affected_sessions:
+            new_sessions_to_insert.append({
+                "exam_id": plan_oid,
+                "user_id": user_id,
+                "subject": sess.get("subject", "Free Slot"),
+                "date": day_number_to_date_str(sess["day"] + 1),
+                "startTime": sess["startTime"],
+                "endTime": sess["endTime"],
+                "status": "pending", 
+                "isExam": sess.get("isExam", False),
+                "color": sess.get("color", "#3B82F6"),
+                "slot_id": str(uuid.uuid4())   
+            })
 
         # ลบตารางเก่าทิ้ง
-        delete_ids = [s["_id"] for s in affected_sessions]
-        if delete_ids:
-            study_sessions_collection.delete_many({"_id": {"$in": delete_ids}})
+        study_sessions_collection.delete_sessions(affected_sessions)
 
         # บันทึกตารางใหม่
-        if new_sessions_to_insert:
-            study_sessions_collection.insert_many(new_sessions_to_insert)
-            
-            
+        study_sessions_collection.insert_sessions(new_sessions_to_insert)
+        exam_plans_collection.bump_version(plan_oid, user_id)
+        cache.invalidate(user_id, "plans")
+        publish_event(user_id, "reschedule", {"plan_id": plan_id, "date": postpone_date_str, "rescheduled_count": len(new_sessions_to_insert)})
+        schedule_changed()
 
         return jsonify({
             "message": f"เลื่อนตารางสำเร็จ! ({len(new_sessions_to_insert)} รายการ)",
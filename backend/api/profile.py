@@ -1,12 +1,11 @@
 from flask import Blueprint, request, jsonify, session
-from pymongo import MongoClient
 from bson.objectid import ObjectId
 
+from database import repositories
+
 profile_bp = Blueprint('profile_bp', __name__, url_prefix='/profile_bp')
 
-client = MongoClient('mongodb://localhost:27017/')
-db = client['mydatabase']
-users_collection = db['users']
+users_collection = repositories.users
 
 @profile_bp.route('/', methods=['GET'])
 def profile():
@@ -0,0 +1,54 @@
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+
+from scheduling.timeutil import day_number
+
+
+def parse_day_param(args, name):
+    """อ่านพารามิเตอร์วันที่ (YYYY-MM-DD) เป็นเลขวัน ไม่ส่งมาคืน None"""
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return day_number(value.split("T")[0])
+    except ValueError:
+        raise ValueError(f"'{name}' must be YYYY-MM-DD")
+
+
+def parse_int_param(args, name, default, minimum=1, maximum=None):
+    value = args.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an integer")
+    if number < minimum or (maximum is not None and number > maximum):
+        raise ValueError(f"'{name}' out of range")
+    return number
+
+
+def schedule_window_query(user_id, args):
+    """
+    สร้าง query ของ study_sessions จาก ?from=YYYY-MM-DD&to=YYYY-MM-DD&exam_id=...
+    (ไม่ส่งช่วงวันที่มา = ทั้งหมด เหมือนเดิม)
+    """
+    query = {"user_id": user_id}
+
+    from_day = parse_day_param(args, "from")
+    to_day = parse_day_param(args, "to")
+    if from_day is not None or to_day is not None:
+        query["day"] = {}
+        if from_day is not None:
+            query["day"]["$gte"] = from_day
+        if to_day is not None:
+            query["day"]["$lte"] = to_day
+
+    exam_id = args.get("exam_id")
+    if exam_id:
+        try:
+            query["exam_id"] = ObjectId(exam_id)
+        except InvalidId:
+            raise ValueError("'exam_id' is not a valid id")
+
+    return query
@@ -0,0 +1,65 @@
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from flask import current_app
+
+# optional: pip install python-bsonjs (แปลง BSON -> JSON ด้วย C ในรอบเดียว)
+# ไม่ติดตั้ง = ปิดเส้นทาง raw (json_util ของ pymongo decode ทั้ง document อยู่ดี ไม่ได้เร็วขึ้น)
+try:
+    import bsonjs
+except ImportError:
+    bsonjs = None
+
+
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+def raw_bson_available():
+    return bsonjs is not None
+
+
+def raw_bson_enabled():
+    """เปิดด้วย RAW_BSON_READS=1 และต้องติดตั้ง python-bsonjs (ค่าเริ่มต้นปิด ใช้เส้นทางปกติ)"""
+    return bool(current_app.config.get("RAW_BSON_READS")) and raw_bson_available()
+
+
+def raw_collection(repository):
+    """Collection เดิมแต่คืน RawBSONDocument (ไม่ decode เป็น dict)"""
+    return repository.collection.with_options(codec_options=RAW_CODEC_OPTIONS)
+
+
+def raw_projection(fields, exclude=()):
+    """
+    Projection ที่ให้ MongoDB แปลง ObjectId เป็น string มาให้เลย
+    ทำให้ BSON ที่ได้กลับมาแปลงเป็น JSON ธรรมดาได้ทันที
+    """
+    projection = {"_id": {"$toString": "$_id"}}
+    for field in fields:
+        if field in exclude:
+            continue
+        projection[field] = {"$toString": f"${field}"} if field.endswith("_id") else 1
+    return projection
+
+
+def raw_to_json(doc):
+    return bsonjs.dumps(doc.raw)
+
+
+def raw_json_array(cursor):
+    return "[" + ",".join(raw_to_json(doc) for doc in cursor) + "]"
+
+
+def json_body_response(body, status=200):
+    return current_app.response_class(body, status=status, mimetype="application/json")
+
+
+def merge_json_object(obj, **raw_fields):
+    """
+    ต่อ field ที่เป็น JSON อยู่แล้ว (เช่น array ของ Session จาก raw_json_array)
+    เข้าไปใน object ที่ยังเป็น dict โดยไม่ต้อง parse ซ้ำ
+    """
+    head = current_app.json.dumps(obj)
+    parts = [f'{current_app.json.dumps(name)}:{body}' for name, body in raw_fields.items()]
+    if not parts:
+        return head
+    separator = "," if head != "{}" else ""
+    return head[:-1] + separator + ",".join(parts) + "}"
@@ -1,97 +1,96 @@
-from pymongo import MongoClient
-from bson.objectid import ObjectId
 from datetime import datetime, timedelta
-import pytz 
-import os
 
+from flask import current_app
 
-from api.email_service import send_notification_email
+from database import repositories
+from notifications.outbox import enqueue_notification
+from notifications.sender import wake_workers
 
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/mydatabase")
-client = MongoClient(MONGO_URI)
-db = client["mydatabase"]
+users_collection = repositories.users
+exam_plans_collection = repositories.exam_plans
+study_sessions_collection = repositories.study_sessions
 
+# ส่งเมลถ้าเวลาปัจจุบัน อยู่ระหว่าง "เวลาเริ่ม Session" ถึง "เวลาเริ่ม + 5 นาที"
+NOTIFY_WINDOW = timedelta(minutes=5)
 
-users_collection = db["users"] 
-exam_plans_collection = db["exam_plans"]
 
+def find_due_sessions(now):
+    """
+    Session ที่ถึงเวลาแจ้งเตือน: starts_at อยู่ในหน้าต่าง, ยัง pending, ยังไม่เคยแจ้ง
+    ใช้ index starts_at ต้นทุนตามจำนวน Session ที่ถึงเวลาเท่านั้น
+    """
+    return list(study_sessions_collection.find(
+        {
+            "starts_at": {"$gt": now - NOTIFY_WINDOW, "$lte": now},
+            "status": "pending",
+            "notified_at": {"$exists": False},
+        },
+        {"exam_id": 1, "user_id": 1, "subject": 1, "slot_id": 1, "startTime": 1},
+    ).sort("starts_at", 1))
 
-TIMEZONE = pytz.timezone('Asia/Bangkok') 
 
 def check_and_send_notifications(app):
 
-    
-
     with app.app_context():
         
-        now_bkk = datetime.now(TIMEZONE)
-        print(f"[{now_bkk.strftime('%Y-%m-%d %H:%M:%S')}] Running notification check...")
+        now = datetime.utcnow()
 
-        # ค้นหา "แผน" ทั้งหมดที่ยัง "active"
-        active_plans = list(exam_plans_collection.find({"status": "active"}))
-        
-        if not active_plans:
-            print("No active plans found.")
+        due_sessions = find_due_sessions(now)
+        if not due_sessions:
             return
 
-        for plan in active_plans:
-            user_id = plan.get("user_id")
-            
-            #ค้นหาอีเมลของผู้ใช้
-           
-            user = users_collection.find_one({"_id": ObjectId(user_id)})
-            if not user or "email" not in user:
-                print(f"Skipping plan {plan['_id']}: User or email not found.")
-                continue 
-            
-            recipient_email = user["email"]
-            
-            plan_modified = False
-            updates_to_make = {}
-
-            # วนลูปดู "ช่องเวลา" (Slot) ทั้งหมดในแผน
-            for index, slot in enumerate(plan.get("study_plan", [])):
-                
-                # เช็คว่า "ยังไม่อ่าน" (pending) หรือไม่?
-                if slot.get("status") == "pending":
-                    try:
-                        # แปลง (Parse) วันที่และเวลาจาก DB
-                        slot_date_str = slot.get("date").split("T")[0] 
-                        slot_time_str = slot.get("startTime") 
-                        
-                        slot_dt_str = f"{slot_date_str} {slot_time_str}"
-                        
-                        slot_datetime_bkk = TIMEZONE.localize(
-                            datetime.strptime(slot_dt_str, "%Y-%m-%d %H:%M")
-                        )
-
-                        # เช็คว่าถึงเวลาหรือยัง?
-                        time_diff_seconds = (now_bkk - slot_datetime_bkk).total_seconds()
-                        
-                        # (ส่งเมลถ้าเวลาปัจจุบัน อยู่ระหว่าง "เวลาใน Slot" ถึง "เวลาใน Slot + 5 นาที")
-                        if 0 <= time_diff_seconds < 300: # (5 นาที)
-                            
-                            print(f"  -> SENDING: Subject '{slot.get('subject')}' to {recipient_email}")
-                            
-                            # ส่งอีเมล!
-                            send_notification_email(
-                                subject=slot.get("subject", "Reading Task"),
-                                recipient_email=recipient_email
-                            )
-                            
-                            # อัปเดตสถานะ ป้องกันการส่งซ้ำ
-                            # (เปลี่ยน 'pending' เป็น 'notified'
-                            updates_to_make[f"study_plan.{index}.status"] = "notified"
-                            plan_modified = True
-
-                    except Exception as e:
-                        print(f"  -> ERROR parsing date/time for slot {slot.get('slot_id')}: {e}")
-
-            # อัปเดตสถานะลง DB (ทีเดียว)
-            if plan_modified:
-                exam_plans_collection.update_one(
-                    {"_id": plan["_id"]},
-                    {"$set": updates_to_make}
+        # แจ้งเตือนเฉพาะแผนที่ยังไม่ถูกปิด (แผนเก่าไม่มีฟิลด์ status ถือว่า active) และดึงอีเมลผู้ใช้ทีเดียวด้วย $in
+        active_plan_ids = {
+            plan["_id"] for plan in exam_plans_collection.find(
+                {"_id": {"$in": list({s["exam_id"] for s in due_sessions})}, "status": {"$ne": "inactive"}},
+                {"_id": 1},
+            )
+        }
+        emails = {
+            user["_id"]: user["email"] for user in users_collection.find(
+                {"_id": {"$in": list({s["user_id"] for s in due_sessions})}, "email": {"$exists": True}},
+                {"email": 1},
+            )
+        }
+
+        # ไม่ส่งเมลเองใน tick: ใส่ outbox แล้วให้ worker (notifications/sender.py) ส่ง
+        queued = 0
+        notified_ids = []
+        skipped = {"plan_inactive": [], "no_email": []}
+        for sess in due_sessions:
+            if sess["exam_id"] not in active_plan_ids:
+                skipped["plan_inactive"].append(sess["_id"])
+                continue
+
+            recipient_email = emails.get(sess["user_id"])
+            if not recipient_email:
+                current_app.logger.debug("Skipping session %s: user or email not found", sess.get("slot_id"))
+                skipped["no_email"].append(sess["_id"])
+                continue
+
+            if enqueue_notification(
+                recipient_email,
+                sess.get("subject", "Reading Task"),
+                session_id=sess["_id"],
+                user_id=sess["user_id"],
+                start_time=sess.get("startTime"),
+            ):
+                queued += 1
+            notified_ids.append(sess["_id"])
+
+        # ทำเครื่องหมายว่าแจ้งแล้วทีเดียวหลัง enqueue ครบ (ถ้าล้มกลางทาง tick ถัดไป enqueue ซ้ำได้ เพราะ outbox กันซ้ำด้วย dedupe_key)
+        if notified_ids:
+            study_sessions_collection.update_many({"_id": {"$in": notified_ids}}, {"$set": {"notified_at": now}})
+
+        # Session ที่ข้ามก็ mark ด้วย ไม่ให้วนกลับมาใน query ช่วงเวลาซ้ำทุกรอบ
+        for reason, session_ids in skipped.items():
+            if session_ids:
+                study_sessions_collection.update_many(
+                    {"_id": {"$in": session_ids}},
+                    {"$set": {"notified_at": now, "notify_skipped": reason}},
                 )
-                print(f"  -> Updated {len(updates_to_make)} slots status for plan {plan['_id']}")
\ No newline at end of file
+
+        if queued:
+            wake_workers()
+        current_app.logger.debug("Queued %d of %d due sessions", queued, len(due_sessions))
@@ -1,13 +1,11 @@
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient
 from werkzeug.security import generate_password_hash  
 
-register_bp = Blueprint('register', __name__, url_prefix='/register')
+from database import repositories
 
+register_bp = Blueprint('register', __name__, url_prefix='/register')
 
-client = MongoClient('mongodb://localhost:27017/')
-db = client['mydatabase']
-users_collection = db['users']
+users_collection = repositories.users
 
 
 @register_bp.route('/', methods=['POST'])
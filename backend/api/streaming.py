@@ -0,0 +1,34 @@
+from flask import Response, current_app, request, stream_with_context
+
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+
+
+def wants_ndjson():
+    """Client ขอผลลัพธ์แบบ stream (Accept: application/x-ndjson) หรือไม่"""
+    accept = request.accept_mimetypes
+    return accept.quality(NDJSON_MIMETYPE) > accept.quality("application/json")
+
+
+def ndjson_response(cursor, transform=None, batch_size=STREAM_BATCH_SIZE):
+    """
+    ส่งผลลัพธ์จาก cursor ทีละบรรทัด (1 document ต่อบรรทัด)
+    ดึงจาก DB ทีละ batch ใช้หน่วยความจำคงที่ และเริ่มส่งได้ทันที
+    """
+    cursor = cursor.batch_size(batch_size)
+
+    def generate():
+        try:
+            for doc in cursor:
+                if transform is not None:
+                    doc = transform(doc)
+                yield current_app.json.dumps(doc) + "\n"
+        finally:
+            cursor.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=NDJSON_MIMETYPE,
+        headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"},
+    )
@@ -1,17 +1,17 @@
 from flask import Blueprint, request, jsonify, session
 from flask_cors import CORS
-from pymongo import MongoClient
 from bson.objectid import ObjectId
-from datetime import datetime, date
+from datetime import datetime
 import traceback
 
+from database import repositories
+from database.cache import cache
+
 subject_bp = Blueprint("subject_bp", __name__, url_prefix='/subject')
 
 CORS(subject_bp, supports_credentials=True)
 
-client = MongoClient("mongodb://localhost:27017/")
-db = client["mydatabase"]
-courses_collection = db["subject"]
+courses_collection = repositories.subjects
 
 
 def validate_and_structure_course(data):
@@ -95,28 +95,11 @@ def get_all_courses():
         user_id = session["user_id"]
         user_obj_id = ObjectId(user_id)
         
-        subjects_cursor = courses_collection.find(
-            {"user_id": user_obj_id}
-        ).sort("priority", -1)
-        
-        subjects_list = []
-        for subject in subjects_cursor:
-            subject['_id'] = str(subject['_id'])
-            subject['user_id'] = str(subject['user_id'])
-            
-            if "exam_date" in subject and subject["exam_date"]:
-
-                if isinstance(subject["exam_date"], (datetime, date)):
-                    subject["exam_date"] = subject["exam_date"].strftime("%Y-%m-%d")
-                else:
-         
-                    subject["exam_date"] = str(subject["exam_date"])
-            else:
-                subject["exam_date"] = "-" 
-            
-            subjects_list.append(subject)
+        subjects = cache.get_or_load(user_id, "subjects", "course_list", lambda: list(
+            courses_collection.find({"user_id": user_obj_id}).sort("priority", -1)
+        ))
 
-        return jsonify(subjects_list), 200
+        return jsonify(subjects), 200
 
     except Exception:
         print(traceback.format_exc())
@@ -154,6 +137,7 @@ def add_course():
 
         if valid_courses:
             courses_collection.insert_many(valid_courses)
+            cache.invalidate(session["user_id"], "subjects")
             return jsonify({"message": f"Successfully added {len(valid_courses)} courses"}), 201
         
         return jsonify({"message": "No valid data to insert"}), 400
@@ -186,7 +170,8 @@ def update_course(subject_id):
 
         if result.matched_count == 0:
             return jsonify({"message": "Course not found or unauthorized"}), 404
-        
+
+        cache.invalidate(session["user_id"], "subjects")
         return jsonify({"message": "Course updated successfully"}), 200
 
     except Exception:
@@ -205,6 +190,7 @@ def delete_course(subject_id):
         })
 
         if result.deleted_count == 1:
+            cache.invalidate(session["user_id"], "subjects")
             return jsonify({"message": "Deleted successfully"}), 200
         else:
             return jsonify({"message": "Course not found"}), 404
@@ -1,16 +1,15 @@
 from flask import Blueprint, request, jsonify, session
 from flask_cors import CORS
-from pymongo import MongoClient
 from bson.objectid import ObjectId
 from datetime import datetime
 import pytz
 
+from database import repositories
+
 tasks_bp = Blueprint('tasks', __name__, url_prefix='/calender/api/custom-tasks')
 CORS(tasks_bp, supports_credentials=True, origins=['http://localhost:5173'])
 
-client = MongoClient('mongodb://localhost:27017/')
-db = client['mydatabase']
-custom_tasks_collection = db['custom_tasks']
+custom_tasks_collection = repositories.custom_tasks
 THAI_TZ = pytz.timezone('Asia/Bangkok')
 
 @tasks_bp.route("", methods=["GET", "OPTIONS"]) 
@@ -25,17 +24,9 @@ def get_custom_tasks():
         query = {"user_id": user_id}
         if date_str: query["date"] = date_str
 
-        tasks = list(custom_tasks_collection.find(query).sort("created_at", 1))
-        
-        for t in tasks:
-            t["_id"] = str(t["_id"])
-            t["user_id"] = str(t["user_id"])
-            
-
-            if "created_at" in t and isinstance(t["created_at"], datetime):
-                t["created_at"] = t["created_at"].strftime("%Y-%m-%d %H:%M:%S")
+        tasks = custom_tasks_collection.find(query).sort("created_at", 1)
             
-        return jsonify(tasks), 200
+        return jsonify(list(tasks)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
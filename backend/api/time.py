@@ -1,25 +1,18 @@
-import os
 from flask import Blueprint, jsonify, session
 from flask_cors import CORS
-from pymongo import MongoClient
 from datetime import datetime
 from bson.objectid import ObjectId
 import pytz
 import traceback
 
+from database import repositories
+from database.cache import cache
+from scheduling.timeutil import local_to_utc
 
-try:
 
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client['mydatabase']
-    exam_plans_collection = db["exam_plans"]
-    study_sessions_collection = db["study_sessions"]
-    THAI_TZ = pytz.timezone('Asia/Bangkok')
-    print("✅ (API Timer) MongoDB Connected")
-except Exception as e:
-    print(f"❌ (API Timer) DB Error: {e}")
-    exam_plans_collection = None
-    study_sessions_collection = None
+exam_plans_collection = repositories.exam_plans
+study_sessions_collection = repositories.study_sessions
+THAI_TZ = pytz.timezone('Asia/Bangkok')
 
 api_bp = Blueprint('api_bp', __name__, url_prefix='/api')
 CORS(api_bp, supports_credentials=True, origins=["http://localhost:5173"])
@@ -36,19 +29,18 @@ def get_all_plans():
         if not user_id:
             return jsonify({"error": "Unauthorized"}), 401
 
-        # Query โดยกรอง user_id
-        plans = list(exam_plans_collection.find(
-            {"user_id": ObjectId(user_id)}, 
-            {"_id": 1, "exam_title": 1}
-        ).sort("createdAt", -1))
-        
-        # จัด Format ข้อมูลส่งกลับ
-        plan_list = []
-        for p in plans:
-            plan_list.append({
-                "_id": str(p["_id"]),
-                "exam_title": p.get("exam_title", "Unknow Plan")
-            })
+        # Query โดยกรอง user_id (ผ่าน cache)
+        def load_plans():
+            plans = exam_plans_collection.find(
+                {"user_id": ObjectId(user_id)},
+                {"_id": 1, "exam_title": 1}
+            ).sort("createdAt", -1)
+            return [
+                {"_id": str(p["_id"]), "exam_title": p.get("exam_title", "Unknow Plan")}
+                for p in plans
+            ]
+
+        plan_list = cache.get_or_load(user_id, "plans", "timer", load_plans)
         
         print(f"📚 Sent {len(plan_list)} plans to Timer (User: {user_id})")
         return jsonify(plan_list), 200
@@ -57,6 +49,64 @@ def get_all_plans():
         print(f"❌ Error /get_all_plans: {e}")
         return jsonify({"error": str(e)}), 500
 
+def load_current_or_next(plan_oid, user_oid, now):
+    """
+    Session ที่กำลังเรียนอยู่ หรือถัดไปของวันนี้ ด้วย find_one เดียว (index exam_id + ends_at)
+    Session ไม่ซ้อนกัน ตัวแรกที่ยังไม่จบ (ends_at > now) จึงเป็น Active หรือ Upcoming เสมอ
+    เวลาทั้งหมดเป็น UTC แบบ naive (แบบเดียวกับที่ pymongo คืนมา)
+    คืนค่า {"session": dict | None, "valid_until": datetime}
+    """
+    today_str = pytz.utc.localize(now).astimezone(THAI_TZ).strftime('%Y-%m-%d')
+    end_of_today = local_to_utc(today_str, 24 * 60).replace(tzinfo=None)
+
+    sess = study_sessions_collection.find_one(
+        {"exam_id": plan_oid, "user_id": user_oid, "ends_at": {"$gt": now}, "starts_at": {"$lt": end_of_today}},
+        {"subject": 1, "startTime": 1, "endTime": 1, "status": 1, "ends_at": 1},
+        sort=[("ends_at", 1)],
+    )
+    if sess is None:
+        return {"session": None, "valid_until": end_of_today}
+
+    return {
+        "session": {
+            "subject": sess.get("subject"),
+            "startTime": sess.get("startTime"),
+            "endTime": sess.get("endTime"),
+            "status": sess.get("status", "pending")
+        },
+        "valid_until": min(sess["ends_at"], end_of_today),
+    }
+
+
+def timeline_ttl(entry, now):
+    """
+    อายุ cache ของผล current_or_next: ถึง valid_until (อาจถึงสิ้นวัน)
+    backend ใน process ล้าง cache ข้าม worker ไม่ได้ -> ไม่เกิน TTL ปกติของ cache
+    """
+    seconds = max(1, int((entry["valid_until"] - now).total_seconds()))
+    if not cache.backend.shared:
+        seconds = min(seconds, cache.default_ttl)
+    return seconds
+
+
+def current_or_next(user_id, plan_id, now=None):
+    """
+    ผลของ load_current_or_next ผ่าน cache ของ User
+    ผลเดิมใช้ได้จนกว่า Session นั้นจะจบ (หรือถึงสิ้นวันถ้าไม่มีแล้ว) อายุ cache ดู timeline_ttl
+    แก้ตาราง (progress / reschedule / สร้างแผน) จะล้าง cache กลุ่ม plans ของ User ทิ้ง
+    """
+    now = now or datetime.utcnow()
+    plan_oid, user_oid = ObjectId(plan_id), ObjectId(user_id)
+    entry = cache.get_or_load(
+        user_id, "plans", f"timeline:{plan_id}",
+        lambda: load_current_or_next(plan_oid, user_oid, now),
+        ttl=lambda e: timeline_ttl(e, now),
+    )
+    if entry["valid_until"] <= now:
+        entry = load_current_or_next(plan_oid, user_oid, now)
+    return entry
+
+
 # ดึงวิชาที่จะเรียน (ของ User นี้ + ตามเวลาจริง) 
 @api_bp.route('/get_today_event/<plan_id>', methods=['GET'])
 def get_today_event(plan_id):
@@ -69,49 +119,10 @@ def get_today_event(plan_id):
         if not user_id:
             return jsonify({"error": "Unauthorized"}), 401
 
-        # เวลาปัจจุบัน
-        now = datetime.now(THAI_TZ)
-        today_str = now.strftime('%Y-%m-%d')
-        current_time_str = now.strftime('%H:%M')
-
-        print(f"\n⏰ checking event for Plan: {plan_id} | Time: {current_time_str}")
-
-        # ดึงตารางเรียนทั้งหมดของ "วันนี้" (เรียงตามเวลา)
-        today_sessions = list(study_sessions_collection.find({
-            "exam_id": ObjectId(plan_id),
-            "user_id": ObjectId(user_id), 
-            "date": today_str
-        }).sort("startTime", 1))
-
-        target_session = None
-
-        # Logic หา Session ที่เหมาะสม
-        for sess in today_sessions:
-            start = sess.get("startTime", "00:00")
-            end = sess.get("endTime", "23:59")
-            
-            # กำลังเรียนอยู่ตอนนี้ (Active)
-            if start <= current_time_str <= end:
-                target_session = sess
-                print("   -> Found ACTIVE session")
-                break 
-            
-            # ยังไม่ถึงเวลาเรียน (Upcoming) เอาอันแรกที่เจอ
-            if start > current_time_str and target_session is None:
-                target_session = sess
-                print("   -> Found UPCOMING session")
-                break 
-
-        if target_session:
-            result = {
-                "subject": target_session.get("subject"),
-                "startTime": target_session.get("startTime"),
-                "endTime": target_session.get("endTime"),
-                "status": target_session.get("status", "pending")
-            }
-            return jsonify(result), 200
-        else:
-            return jsonify(None), 200 # ไม่มีเรียนแล้ววันนี้
+        print(f"\n⏰ checking event for Plan: {plan_id} | Time: {datetime.now(THAI_TZ).strftime('%H:%M')}")
+
+        entry = current_or_next(user_id, plan_id)
+        return jsonify(entry["session"]), 200 # None = ไม่มีเรียนแล้ววันนี้
 
     except Exception as e:
         print(f"❌ Error /get_today_event: {e}")
@@ -5,13 +5,11 @@ from api.login import login_bp
 import os
 
 
-from api.scheduler_jobs import check_and_send_notifications
-from apscheduler.schedulers.background import BackgroundScheduler
+from background import start_background, stop_background
 import atexit 
 
 from datetime import datetime
 from bson.objectid import ObjectId 
-from flask_pymongo import PyMongo
 from api.planner import planner_bp
 from api.profile import profile_bp
 from api.subject import subject_bp
@@ -21,8 +19,19 @@ from api.time import api_bp
 from api.admin import admin_bp
 from api.email_service import mail, send_notification_email
 from api.tasks import tasks_bp
+from api.events import events_bp
+from api.json_provider import BSONJSONProvider
+from api.raw_bson import raw_bson_available
+from database.mongo import MONGO_URI, client_options, close_client
+from database.migrations import run_migrations
+from pymongo.errors import PyMongoError
 
 app = Flask(__name__)
+app.json = BSONJSONProvider(app)
+# อ่าน Session แบบ RawBSONDocument (ข้ามการ decode เป็น dict) เปิดด้วย RAW_BSON_READS=1
+app.config["RAW_BSON_READS"] = os.getenv("RAW_BSON_READS", "0") == "1"
+if app.config["RAW_BSON_READS"] and not raw_bson_available():
+    print("[RAW_BSON] RAW_BSON_READS=1 but python-bsonjs is not installed; using the default read path")
 app.secret_key = 'your_secret_key'
 from dotenv import load_dotenv 
 
@@ -41,10 +50,12 @@ app.register_blueprint(home_bp)
 app.register_blueprint(api_bp)
 app.register_blueprint(admin_bp)
 app.register_blueprint(tasks_bp)
+app.register_blueprint(events_bp)
 
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
+# ทดสอบในเครื่อง: MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=0 (python -m notifications.fake_smtp)
+app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', '587'))
+app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', '1') == '1'
 app.config['MAIL_USE_SSL'] = False
 app.config['MAIL_DEBUG'] = True 
 
@@ -54,29 +65,34 @@ app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
 mail.init_app(app) 
 
 
-app.config["MONGO_URI"] = "mongodb://localhost:27017/mydatabase" 
-mongo = PyMongo(app)
-print("Connected to MongoDB at mongodb://localhost:27017/mydatabase")
+# MongoDB ใช้ Client/Pool กลางตัวเดียว (database/mongo.py) ตั้งค่าผ่าน MONGODB_URI, MONGO_MAX_POOL_SIZE ฯลฯ
+print(f"MongoDB pool: {MONGO_URI} (maxPoolSize={client_options()['maxPoolSize']})")
 
-scheduler = BackgroundScheduler(daemon=True)
+# สร้าง Index / รัน Migration ที่ค้างอยู่ตอนเริ่มแอป (ปิดได้ด้วย RUN_MIGRATIONS=0)
+if os.getenv("RUN_MIGRATIONS", "1") == "1":
+    try:
+        run_migrations()
+    except PyMongoError as e:
+        print(f"[MIGRATION] skipped: {e}")
 
+# Background job (scheduler / outbox / dispatcher) รันเฉพาะ process ที่เป็น leader (database/lease.py)
+# ทุก process แค่เริ่มแข่ง lease ตอนนี้ ส่วน job จริงเริ่มเมื่อได้เป็น leader เท่านั้น
+start_background(app)
 
-scheduler.add_job(
-    check_and_send_notifications,
-    trigger='interval',
-    minutes=1, 
-    args=[app] 
-)
-scheduler.start()
 
+# process ที่ถูก fork หลัง import (gunicorn --preload) ไม่มี thread ของ elector ติดมา -> เริ่มใหม่ตอน request แรก
+@app.before_request
+def ensure_background_jobs():
+    start_background(app)
 
-atexit.register(lambda: scheduler.shutdown())
-print("Scheduler started... checking every 1 minute.")
+
+# atexit ทำงานย้อนลำดับ: หยุด job / ปล่อย lease ก่อนปิด MongoClient
+atexit.register(close_client)
+atexit.register(stop_background)
 # -----------------------------------------------------------------------------
 
 
 if __name__ == "__main__":
- 
     app.run(port=5000, debug=True, use_reloader=False)
 
 ######hiuaWESHcf
\ No newline at end of file
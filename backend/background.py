@@ -0,0 +1,92 @@
+"""
+Background job ทั้งหมดของแอป (metrics snapshot, outbox sender, notification dispatcher)
+
+รันเฉพาะ process ที่ถือ lease "background-jobs" (database/lease.py)
+gunicorn หลาย worker / หลายเครื่อง จะมี leader ตัวเดียว ถ้า leader ตายตัวอื่นรับช่วงภายใน ~LEASE_TTL_SECONDS
+ปิดใน process นี้ด้วย RUN_BACKGROUND_JOBS=0
+"""
+import os
+import threading
+from datetime import datetime
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from api.admin_metrics import ADMIN_METRICS_INTERVAL_MINUTES, take_metrics_snapshot
+from database.lease import LeaderElector, claim_job_run
+from notifications.dispatcher import start_dispatcher, stop_dispatcher
+from notifications.sender import ensure_workers, start_pool, stop_pool
+
+
+LEASE_NAME = "background-jobs"
+
+
+def window_start(now, minutes):
+    """ต้นช่วงเวลาของรอบ interval (ใช้เป็น key กันรันซ้ำ)"""
+    total = now.hour * 60 + now.minute
+    floored = total - total % minutes
+    return now.replace(hour=floored // 60, minute=floored % 60, second=0, microsecond=0)
+
+
+def metrics_snapshot_job():
+    if claim_job_run("metrics_snapshot", window_start(datetime.utcnow(), ADMIN_METRICS_INTERVAL_MINUTES)):
+        take_metrics_snapshot()
+
+
+class BackgroundJobs:
+
+    def __init__(self, app):
+        self.app = app
+        self.scheduler = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.scheduler is not None:
+                return
+            # snapshot สถิติสำหรับกราฟหน้า Admin (admin_metrics)
+            self.scheduler = BackgroundScheduler(daemon=True)
+            self.scheduler.add_job(metrics_snapshot_job, trigger='interval', minutes=ADMIN_METRICS_INTERVAL_MINUTES)
+            self.scheduler.start()
+            # worker ส่งอีเมลจาก outbox (notification_outbox)
+            start_pool(self.app)
+            self.scheduler.add_job(ensure_workers, trigger='interval', seconds=30)
+            # แจ้งเตือนตรงเวลาเริ่ม Session (min-heap) แทนการเช็คทุก 1 นาที
+            start_dispatcher(self.app)
+            print("Background jobs started (this process is the leader).")
+
+    def stop(self):
+        with self._lock:
+            if self.scheduler is None:
+                return
+            stop_dispatcher()
+            stop_pool()
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
+            print("Background jobs stopped.")
+
+
+_elector = None
+_elector_pid = None
+_start_lock = threading.Lock()
+
+
+def start_background(app):
+    """
+    เริ่มแข่งเป็น leader (เรียกซ้ำได้) คืนค่า LeaderElector หรือ None ถ้าปิดไว้
+    thread ไม่ข้าม fork: process ลูกของ gunicorn --preload จะเริ่ม elector ของตัวเองใหม่
+    """
+    global _elector, _elector_pid
+    if os.getenv("RUN_BACKGROUND_JOBS", "1") != "1":
+        return None
+    with _start_lock:
+        if _elector is None or _elector_pid != os.getpid():
+            jobs = BackgroundJobs(app)
+            _elector = LeaderElector(LEASE_NAME, on_elected=jobs.start, on_lost=jobs.stop)
+            _elector_pid = os.getpid()
+            _elector.start()
+    return _elector
+
+
+def stop_background():
+    if _elector is not None and _elector_pid == os.getpid():
+        _elector.stop()
@@ -0,0 +1,153 @@
+"""
+Cache แบบ read-through ต่อผู้ใช้ สำหรับรายการเล็กๆ ที่อ่านบ่อยแต่เปลี่ยนไม่บ่อย
+(รายวิชา / รายการแผน / Fixed Schedule)
+
+key = "<user_id>:<group>:<name>"  เช่น "65f..:subjects:course_list"
+การเขียนข้อมูลของกลุ่มไหน ให้เรียก cache.invalidate(user_id, "<group>")
+
+Backend เลือกด้วย CACHE_BACKEND
+    memory (ค่าเริ่มต้น) : LRU + TTL ใน process
+    mongo                : ใช้ collection cache_entries ร่วมกันทุก process (มี TTL index)
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+
+from database import repositories
+
+
+DEFAULT_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "60"))
+
+
+class InProcessBackend:
+    name = "memory"
+    # invalidate() ล้างได้เฉพาะ process นี้ process อื่นยังเห็นค่าเก่าจนหมด TTL
+    shared = False
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def size(self):
+        return len(self._data)
+
+
+class MongoBackend:
+    """
+    เก็บค่าเป็น BSON ใน cache_entries (ObjectId / datetime เก็บได้ตรงๆ)
+    หมดอายุด้วย TTL index บน expires_at และเช็คซ้ำตอนอ่าน
+    """
+    name = "mongo"
+    shared = True
+
+    def __init__(self, repository):
+        self.repository = repository
+
+    def get(self, key):
+        doc = self.repository.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}}, {"value": 1})
+        if doc is None:
+            return False, None
+        return True, doc["value"]
+
+    def set(self, key, value, ttl):
+        self.repository.replace_one(
+            {"_id": key},
+            {"value": value, "expires_at": datetime.utcnow() + timedelta(seconds=ttl)},
+            upsert=True,
+        )
+
+    def delete_prefix(self, prefix):
+        self.repository.delete_many({"_id": {"$regex": "^" + re.escape(prefix)}})
+
+    def size(self):
+        return self.repository.estimated_document_count()
+
+
+class ReadThroughCache:
+
+    def __init__(self, backend, default_ttl=DEFAULT_TTL_SECONDS):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {"hits": 0, "misses": 0, "invalidations": 0})
+
+    @staticmethod
+    def make_key(user_id, group, name):
+        return f"{user_id}:{group}:{name}"
+
+    def _count(self, group, field):
+        with self._lock:
+            self._stats[group][field] += 1
+
+    def get_or_load(self, user_id, group, name, loader, ttl=None):
+        """
+        คืนค่าจาก cache ถ้ามี ไม่มีก็เรียก loader() แล้วเก็บไว้
+        ttl เป็นฟังก์ชันได้ ttl(value) -> วินาที (ค่าที่หมดอายุตามข้อมูลเอง)
+        """
+        key = self.make_key(user_id, group, name)
+        found, value = self.backend.get(key)
+        if found:
+            self._count(group, "hits")
+            return value
+
+        self._count(group, "misses")
+        value = loader()
+        if callable(ttl):
+            ttl = ttl(value)
+        self.backend.set(key, value, ttl or self.default_ttl)
+        return value
+
+    def invalidate(self, user_id, *groups):
+        for group in groups:
+            self.backend.delete_prefix(f"{user_id}:{group}:")
+            self._count(group, "invalidations")
+
+    def stats(self):
+        with self._lock:
+            groups = {group: dict(counts) for group, counts in self._stats.items()}
+        for counts in groups.values():
+            total = counts["hits"] + counts["misses"]
+            counts["hit_rate"] = round(counts["hits"] / total, 3) if total else None
+        return {
+            "backend": self.backend.name,
+            "ttl_seconds": self.default_ttl,
+            "entries": self.backend.size(),
+            "groups": groups,
+        }
+
+
+def make_backend():
+    if os.getenv("CACHE_BACKEND", "memory") == "mongo":
+        return MongoBackend(repositories.cache_entries)
+    return InProcessBackend(maxsize=int(os.getenv("CACHE_MAX_ENTRIES", "4096")))
+
+
+cache = ReadThroughCache(make_backend())
@@ -0,0 +1,145 @@
+"""
+Lease ใน MongoDB สำหรับเลือก process เดียวให้รัน background job (leader election)
+
+leases:   {_id: ชื่อ lease, holder, expires_at}  ผู้ถือต้องต่ออายุก่อนหมด ไม่งั้นคนอื่นเอาไปได้
+job_runs: {_id: "<job>:<window>"}  กันงานเดียวกันในช่วงเวลาเดียวกันรันซ้ำ (แม้ตอนสลับ leader)
+"""
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from database import repositories
+
+
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "15"))
+
+leases_collection = repositories.leases
+job_runs_collection = repositories.job_runs
+
+
+def make_holder_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire_lease(name, holder, ttl_seconds=LEASE_TTL_SECONDS):
+    """
+    ได้ lease (หรือต่ออายุของตัวเอง) คืน True  มีคนอื่นถืออยู่และยังไม่หมดอายุคืน False
+    upsert ด้วย _id อย่างเดียว (MongoDB ไม่รับ $expr ใน filter ของ upsert)
+    การแย่ง lease ตัดสินใน pipeline: เป็นของเราอยู่แล้ว / ยังไม่มีคนถือ / หมดอายุ -> เขียนทับ
+    ไม่งั้นคงค่าเดิมไว้ แล้วอ่าน holder ที่ได้กลับมาดูว่าเป็นเราไหม
+    เวลาทั้งหมดใช้ $$NOW ของ server นาฬิกาแต่ละเครื่องเพี้ยนกันก็ไม่ได้ leader 2 ตัว
+    """
+    takeover = {"$or": [
+        {"$eq": ["$holder", {"$literal": holder}]},
+        {"$eq": [{"$type": "$expires_at"}, "missing"]},
+        {"$lt": ["$expires_at", "$$NOW"]},
+    ]}
+    try:
+        doc = leases_collection.find_one_and_update(
+            {"_id": name},
+            [{"$set": {
+                "holder": {"$cond": [takeover, {"$literal": holder}, "$holder"]},
+                "expires_at": {"$cond": [takeover, {"$add": ["$$NOW", ttl_seconds * 1000]}, "$expires_at"]},
+                "renewed_at": {"$cond": [takeover, "$$NOW", "$renewed_at"]},
+            }}],
+            projection={"holder": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # upsert พร้อมกันสองเครื่องตอนยังไม่มี document: อีกเครื่องได้ไป
+        return False
+    return doc is not None and doc.get("holder") == holder
+
+
+def release_lease(name, holder):
+    leases_collection.delete_one({"_id": name, "holder": holder})
+
+
+def job_run_key(job, window):
+    return f"{job}:{window.isoformat() if isinstance(window, datetime) else window}"
+
+
+def claim_job_run(job, window, holder=None):
+    """
+    จองการรัน job ในช่วงเวลา window (เช่น นาที / รอบ interval) คืน False ถ้ามีคนรันไปแล้ว
+    """
+    try:
+        job_runs_collection.insert_one(
+            {"_id": job_run_key(job, window), "job": job, "holder": holder, "started_at": datetime.utcnow()}
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+class LeaderElector:
+    """
+    พยายามถือ lease ชื่อ name ตลอดเวลา ต่ออายุทุก ttl/3 วินาที
+    ได้เป็น leader -> on_elected(), เสีย lease (ต่ออายุไม่ทัน / DB ล่ม) -> on_lost()
+    """
+
+    def __init__(self, name, on_elected, on_lost, ttl_seconds=LEASE_TTL_SECONDS):
+        self.name = name
+        self.holder = make_holder_id()
+        self.on_elected = on_elected
+        self.on_lost = on_lost
+        self.ttl_seconds = ttl_seconds
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"lease-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.is_leader:
+            self._resign()
+
+    def _step_down(self):
+        self.is_leader = False
+        print(f"[LEASE] {self.holder} is no longer leader of '{self.name}'")
+        try:
+            self.on_lost()
+        except Exception as e:
+            print(f"[LEASE] on_lost failed: {e}")
+
+    def _resign(self):
+        self._step_down()
+        try:
+            # ปล่อย lease ทันที ให้ process อื่นรับช่วงได้โดยไม่ต้องรอหมดอายุ
+            release_lease(self.name, self.holder)
+        except PyMongoError:
+            pass
+
+    def _run(self):
+        interval = max(1.0, self.ttl_seconds / 3)
+        while not self._stop.is_set():
+            try:
+                held = acquire_lease(self.name, self.holder, self.ttl_seconds)
+            except PyMongoError as e:
+                print(f"[LEASE] renew failed: {e}")
+                held = False
+
+            if held and not self.is_leader:
+                self.is_leader = True
+                print(f"[LEASE] {self.holder} elected leader of '{self.name}'")
+                try:
+                    self.on_elected()
+                except Exception as e:
+                    # เริ่มงานของ leader ไม่สำเร็จ: ไม่ถือ lease ไว้เฉยๆ ลงจากตำแหน่งให้ process อื่น (หรือรอบถัดไป) ลองใหม่
+                    print(f"[LEASE] on_elected failed: {e}")
+                    self._resign()
+            elif not held and self.is_leader:
+                self._step_down()
+
+            self._stop.wait(interval)
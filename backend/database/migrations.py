@@ -0,0 +1,287 @@
+"""
+Index / Migration ของฐานข้อมูล (มีเลขเวอร์ชัน บันทึกไว้ใน schema_migrations)
+
+รัน:  cd backend && python -m database.migrations migrate
+ดูสถานะ: cd backend && python -m database.migrations status
+"""
+import os
+import sys
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import OperationFailure
+
+from database.mongo import get_db
+from scheduling.timeutil import session_time_fields
+
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+# ตำแหน่งล่าสุดของ backfill ที่ทำทีละ batch (แยกจาก schema_migrations ที่เก็บแค่เวอร์ชันที่รันแล้ว)
+CHECKPOINTS_COLLECTION = "migration_checkpoints"
+ADMIN_METRICS_RETENTION_DAYS = int(os.getenv("ADMIN_METRICS_RETENTION_DAYS", "90"))
+USER_EVENTS_CAP_MB = int(os.getenv("USER_EVENTS_CAP_MB", "16"))
+
+
+class Migration:
+
+    def __init__(self, version, description, indexes=(), drop_indexes=(), run=None, optional=False):
+        self.version = version
+        self.description = description
+        # optional: ล้มแล้วข้ามไปรันตัวถัดไป (ไม่บันทึกว่ารันแล้ว รอบหน้าลองใหม่)
+        self.optional = optional
+        # indexes: [(collection, keys, options)] ต้องระบุ name ใน options เสมอ
+        self.indexes = list(indexes)
+        # drop_indexes: [(collection, index_name)]
+        self.drop_indexes = list(drop_indexes)
+        self.run = run
+
+    def apply(self, db):
+        for collection, name in self.drop_indexes:
+            if name in db[collection].index_information():
+                db[collection].drop_index(name)
+        for collection, keys, options in self.indexes:
+            db[collection].create_index(keys, **options)
+        if self.run:
+            self.run(db)
+
+
+def backfill_session_times(db, batch_size=500, log=print,
+                           missing_field="day", checkpoint_id="backfill_session_times"):
+    """
+    เติมฟิลด์จาก session_time_fields() (date / day / starts_at / ends_at / duration_minutes)
+    ให้ study_sessions เก่าที่ยังไม่มี missing_field
+    ทำทีละ batch ตามลำดับ _id และจำตำแหน่งล่าสุดไว้ หยุดกลางทางแล้วรันต่อได้
+    """
+    progress = db[CHECKPOINTS_COLLECTION]
+    checkpoint = progress.find_one({"_id": checkpoint_id}) or {}
+    last_id = checkpoint.get("last_id")
+    total = checkpoint.get("updated", 0)
+
+    while True:
+        query = {missing_field: {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(
+            db["study_sessions"]
+            .find(query, {"date": 1, "startTime": 1, "endTime": 1})
+            .sort("_id", ASCENDING)
+            .limit(batch_size)
+        )
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            try:
+                fields = session_time_fields(doc["date"], doc.get("startTime"), doc.get("endTime"))
+            except (KeyError, ValueError):
+                log(f"[MIGRATION] skip session {doc['_id']}: unreadable date {doc.get('date')!r}")
+                continue
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+
+        if ops:
+            total += db["study_sessions"].bulk_write(ops, ordered=False).modified_count
+        last_id = batch[-1]["_id"]
+        progress.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"last_id": last_id, "updated": total}},
+            upsert=True,
+        )
+
+    log(f"[MIGRATION] backfilled {missing_field} on {total} study_sessions")
+
+
+def backfill_session_durations(db, batch_size=500, log=print):
+    backfill_session_times(db, batch_size, log,
+                           missing_field="duration_minutes", checkpoint_id="backfill_session_durations")
+
+
+def create_admin_metrics(db, log=print):
+    """time-series collection ของ snapshot สถิติ ลบข้อมูลเก่าเองตาม ADMIN_METRICS_RETENTION_DAYS"""
+    if "admin_metrics" in db.list_collection_names(filter={"name": "admin_metrics"}):
+        return
+    db.create_collection(
+        "admin_metrics",
+        timeseries={"timeField": "ts", "metaField": "meta", "granularity": "minutes"},
+        expireAfterSeconds=ADMIN_METRICS_RETENTION_DAYS * 24 * 3600,
+    )
+    log(f"[MIGRATION] created admin_metrics (retention {ADMIN_METRICS_RETENTION_DAYS} days)")
+
+
+def create_user_events(db, log=print):
+    """capped collection ของ event ที่ส่งทาง SSE (event เก่าถูกเขียนทับเอง อ่านด้วย tailable cursor)"""
+    if "user_events" in db.list_collection_names(filter={"name": "user_events"}):
+        return
+    db.create_collection("user_events", capped=True, size=USER_EVENTS_CAP_MB * 1024 * 1024)
+    log(f"[MIGRATION] created capped user_events ({USER_EVENTS_CAP_MB} MB)")
+
+
+MIGRATIONS = [
+    Migration(1, "indexes for hot queries", indexes=[
+        ("study_sessions", [("exam_id", ASCENDING), ("date", ASCENDING), ("startTime", ASCENDING)],
+         {"name": "exam_date_start"}),
+        ("study_sessions", [("slot_id", ASCENDING), ("user_id", ASCENDING)],
+         {"name": "slot_user"}),
+        ("study_sessions", [("user_id", ASCENDING), ("date", ASCENDING), ("startTime", ASCENDING)],
+         {"name": "user_date_start"}),
+        ("custom_tasks", [("user_id", ASCENDING), ("date", ASCENDING), ("created_at", ASCENDING)],
+         {"name": "user_date_created"}),
+        ("subject", [("user_id", ASCENDING), ("priority", DESCENDING)],
+         {"name": "user_priority"}),
+        ("exam_plans", [("user_id", ASCENDING), ("createdAt", DESCENDING)],
+         {"name": "user_created"}),
+        ("fixed_schedules", [("user_id", ASCENDING)],
+         {"name": "user"}),
+    ]),
+    Migration(2, "canonical session day/starts_at + backfill", indexes=[
+        ("study_sessions", [("exam_id", ASCENDING), ("day", ASCENDING), ("startTime", ASCENDING)],
+         {"name": "exam_day_start"}),
+        ("study_sessions", [("user_id", ASCENDING), ("day", ASCENDING), ("startTime", ASCENDING)],
+         {"name": "user_day_start"}),
+    ], drop_indexes=[
+        ("study_sessions", "exam_date_start"),
+        ("study_sessions", "user_date_start"),
+    ], run=backfill_session_times),
+    Migration(3, "shared cache entries expire by TTL", indexes=[
+        ("cache_entries", [("expires_at", ASCENDING)],
+         {"name": "expires_ttl", "expireAfterSeconds": 0}),
+    ]),
+    Migration(4, "backfill session duration_minutes", run=backfill_session_durations),
+    Migration(5, "keyset index for admin log history", indexes=[
+        ("admin_summary_log", [("log_timestamp", DESCENDING), ("_id", DESCENDING)],
+         {"name": "log_timestamp"}),
+    ]),
+    Migration(6, "time-series admin_metrics with retention", run=create_admin_metrics),
+    Migration(7, "current/next session lookup", indexes=[
+        ("study_sessions", [("exam_id", ASCENDING), ("ends_at", ASCENDING)],
+         {"name": "exam_ends_at"}),
+    ]),
+    Migration(8, "capped user_events for SSE", run=create_user_events),
+    Migration(9, "due-notification range query", indexes=[
+        ("study_sessions", [("starts_at", ASCENDING)],
+         {"name": "pending_starts_at", "partialFilterExpression": {"status": "pending"}}),
+    ]),
+    Migration(10, "notification outbox", indexes=[
+        ("notification_outbox", [("dedupe_key", ASCENDING)],
+         {"name": "dedupe_key_unique", "unique": True}),
+        ("notification_outbox", [("status", ASCENDING), ("next_attempt_at", ASCENDING)],
+         {"name": "status_next_attempt"}),
+    ]),
+    Migration(11, "leader lease and idempotent job runs", indexes=[
+        ("leases", [("expires_at", ASCENDING)],
+         {"name": "expires_ttl", "expireAfterSeconds": 3600}),
+        ("job_runs", [("started_at", ASCENDING)],
+         {"name": "started_ttl", "expireAfterSeconds": 7 * 24 * 3600}),
+    ]),
+    Migration(12, "outbox batch stats shared across workers", indexes=[
+        ("outbox_batches", [("finished_at", ASCENDING)],
+         {"name": "finished_ttl", "expireAfterSeconds": 7 * 24 * 3600}),
+    ]),
+    # ข้อมูลเก่าอาจมี username / email ซ้ำ สร้างไม่ได้ก็ไม่ขวาง Migration อื่น (ลบตัวซ้ำแล้วรันใหม่)
+    Migration(13, "unique username/email", indexes=[
+        ("users", [("username", ASCENDING)],
+         {"name": "username_unique", "unique": True}),
+        ("users", [("email", ASCENDING)],
+         {"name": "email_unique", "unique": True}),
+    ], optional=True),
+    Migration(14, "replay user_events by sequence", indexes=[
+        ("user_events", [("user_id", ASCENDING), ("seq", ASCENDING)],
+         {"name": "user_seq"}),
+    ]),
+]
+
+
+def expected_indexes():
+    """index ที่ควรมีหลังรันทุก Migration: {collection: {name: keys}}"""
+    expected = {}
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        for collection, name in migration.drop_indexes:
+            expected.get(collection, {}).pop(name, None)
+        for collection, keys, options in migration.indexes:
+            expected.setdefault(collection, {})[options["name"]] = keys
+    return expected
+
+
+def applied_versions(db):
+    # checkpoint รุ่นเก่าเคยเก็บใน collection นี้ด้วย _id เป็นชื่อ นับเฉพาะเลขเวอร์ชัน
+    return {doc["_id"] for doc in db[MIGRATIONS_COLLECTION].find({"_id": {"$type": "number"}}, {"_id": 1})}
+
+
+def run_migrations(db=None, log=print):
+    """
+    รัน Migration ที่ยังไม่เคยรัน ตามลำดับเวอร์ชัน หยุดที่ตัวแรกที่ error (ยกเว้น optional ข้ามไป)
+    คืนค่า list เวอร์ชันที่รันสำเร็จ
+    """
+    db = db if db is not None else get_db()
+    done = applied_versions(db)
+    applied = []
+
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        log(f"[MIGRATION] v{migration.version}: {migration.description}")
+        try:
+            migration.apply(db)
+        except OperationFailure as e:
+            if migration.optional:
+                log(f"[MIGRATION] v{migration.version} skipped (will retry next run): {e}")
+                continue
+            log(f"[MIGRATION] v{migration.version} failed: {e}")
+            break
+        db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": migration.version},
+            {"$set": {"description": migration.description, "applied_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        applied.append(migration.version)
+
+    return applied
+
+
+def index_report(db=None):
+    """
+    รายงาน index ที่ขาด (missing) และ index ที่ไม่เคยถูกใช้ตั้งแต่ server เริ่ม (unused)
+    """
+    db = db if db is not None else get_db()
+    expected = expected_indexes()
+    report = {"missing": [], "unused": [], "pending_versions": []}
+
+    done = applied_versions(db)
+    report["pending_versions"] = sorted(m.version for m in MIGRATIONS if m.version not in done)
+
+    for collection, indexes in expected.items():
+        existing = db[collection].index_information()
+        for name in indexes:
+            if name not in existing:
+                report["missing"].append(f"{collection}.{name}")
+
+        try:
+            stats = db[collection].aggregate([{"$indexStats": {}}])
+            for stat in stats:
+                if stat["name"] != "_id_" and stat.get("accesses", {}).get("ops", 0) == 0:
+                    report["unused"].append(f"{collection}.{stat['name']}")
+        except OperationFailure:
+            # $indexStats ต้องใช้สิทธิ์ clusterMonitor
+            pass
+
+    return report
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else "status"
+    if command == "migrate":
+        applied = run_migrations()
+        print(f"Applied: {applied or 'nothing to do'}")
+    elif command == "status":
+        report = index_report()
+        print(f"Pending versions: {report['pending_versions'] or '-'}")
+        print(f"Missing indexes:  {', '.join(report['missing']) or '-'}")
+        print(f"Unused indexes:   {', '.join(report['unused']) or '-'}")
+    else:
+        print("usage: python -m database.migrations [migrate|status]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
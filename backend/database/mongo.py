@@ -0,0 +1,115 @@
+import os
+import threading
+from collections import defaultdict
+
+from pymongo import MongoClient, monitoring
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+
+MONGO_URI = os.getenv("MONGODB_URI") or os.getenv("MONGO_URI") or "mongodb://localhost:27017/"
+DB_NAME = os.getenv("MONGO_DB_NAME", "mydatabase")
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    เก็บสถิติ Connection Pool (ต่อ server address) สำหรับดูผ่าน /admin/db_stats
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {
+            "open": 0, "in_use": 0, "created": 0, "closed": 0,
+            "checked_out": 0, "checkout_failed": 0, "cleared": 0,
+        })
+
+    def _bump(self, address, **changes):
+        key = "%s:%s" % address
+        with self._lock:
+            entry = self._stats[key]
+            for field, delta in changes.items():
+                entry[field] += delta
+
+    def pool_created(self, event): self._bump(event.address)
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): self._bump(event.address, cleared=1)
+    def pool_closed(self, event): pass
+    def connection_created(self, event): self._bump(event.address, created=1, open=1)
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): self._bump(event.address, closed=1, open=-1)
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): self._bump(event.address, checkout_failed=1)
+    def connection_checked_out(self, event): self._bump(event.address, checked_out=1, in_use=1)
+    def connection_checked_in(self, event): self._bump(event.address, in_use=-1)
+
+    def snapshot(self):
+        with self._lock:
+            return {address: dict(entry) for address, entry in self._stats.items()}
+
+
+pool_listener = PoolStatsListener()
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def client_options():
+    """ตั้งค่า Pool / Timeout จาก Environment (ค่า default เหมาะกับเครื่อง dev)"""
+    options = {
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE", 50),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": _env_int("MONGO_MAX_IDLE_TIME_MS", 60000),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "waitQueueTimeoutMS": _env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000),
+        "retryWrites": True,
+        "event_listeners": [pool_listener],
+    }
+    socket_timeout = _env_int("MONGO_SOCKET_TIMEOUT_MS", 0)
+    if socket_timeout:
+        options["socketTimeoutMS"] = socket_timeout
+    return options
+
+
+def get_client():
+    """MongoClient ตัวเดียวของทั้ง process (สร้างครั้งแรกที่เรียกใช้)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(MONGO_URI, **client_options())
+    return _client
+
+
+def get_db():
+    write_w = os.getenv("MONGO_WRITE_CONCERN", "1")
+    read_level = os.getenv("MONGO_READ_CONCERN", "local")
+    return get_client().get_database(
+        DB_NAME,
+        write_concern=WriteConcern(w=int(write_w) if write_w.isdigit() else write_w),
+        read_concern=ReadConcern(read_level),
+    )
+
+
+def pool_stats():
+    options = client_options()
+    return {
+        "max_pool_size": options["maxPoolSize"],
+        "min_pool_size": options["minPoolSize"],
+        "pools": pool_listener.snapshot(),
+    }
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,33 @@
+"""
+ซ่อม plan_stats ที่ไม่ตรงกับ study_sessions (คำนวณใหม่จาก Session จริง)
+
+รัน:  cd backend && python -m database.plan_stats rebuild            (ทุกแผน)
+      cd backend && python -m database.plan_stats rebuild <plan_id> ...
+"""
+import sys
+
+from bson.objectid import ObjectId
+
+from database import repositories
+
+
+def rebuild_all(plan_ids=None, log=print):
+    if plan_ids is None:
+        plan_ids = [doc["_id"] for doc in repositories.exam_plans.find({}, {"_id": 1})]
+    for plan_id in plan_ids:
+        stats = repositories.plan_stats.rebuild(plan_id)
+        log(f"[PLAN_STATS] {plan_id}: {len(stats['days'])} days, {stats['completed_minutes']} min completed")
+    return len(plan_ids)
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] != "rebuild":
+        print("usage: python -m database.plan_stats rebuild [plan_id ...]")
+        return 2
+    plan_ids = [ObjectId(p) for p in argv[2:]] or None
+    print(f"Rebuilt {rebuild_all(plan_ids)} plans")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
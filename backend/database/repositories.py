@@ -0,0 +1,298 @@
+from collections import defaultdict
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import InvalidOperation
+
+from database.mongo import get_client, get_db
+from scheduling.timeutil import session_minutes, session_time_fields
+
+
+class Repository:
+    """
+    จุดเข้าถึง Collection เดียว ใช้ Client/Pool กลางร่วมกันทั้งแอป
+    เรียก method ของ pymongo Collection ได้ตรงๆ (find, insert_one, ...)
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._collection = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = get_db()[self.name]
+        return self._collection
+
+    def __getattr__(self, attr):
+        return getattr(self.collection, attr)
+
+    def __repr__(self):
+        return f"Repository({self.name!r})"
+
+
+class StudySessionRepository(Repository):
+    """
+    study_sessions: ทุกการเขียน Session ใหม่ต้องผ่าน with_time_fields()
+    เพื่อให้มี date / day / starts_at / ends_at แบบเดียวกันเสมอ
+    """
+
+    # ฟิลด์ที่หน้าเว็บใช้แสดงตาราง (ไม่ส่ง user_id / ฟิลด์ภายใน)
+    LIST_PROJECTION = {
+        "exam_id": 1, "subject": 1, "date": 1, "startTime": 1, "endTime": 1,
+        "status": 1, "color": 1, "slot_id": 1, "isExam": 1,
+    }
+    # Session ในรายละเอียดแผน (exam_id ซ้ำกับแผนอยู่แล้ว)
+    PLAN_PROJECTION = {field: 1 for field in LIST_PROJECTION if field != "exam_id"}
+
+    @staticmethod
+    def with_time_fields(session_doc, **extra):
+        return {
+            **session_doc,
+            **session_time_fields(session_doc["date"], session_doc["startTime"], session_doc["endTime"]),
+            **extra,
+        }
+
+    # ฟิลด์ที่ plan_stats ต้องใช้คำนวณ
+    STATS_PROJECTION = {"exam_id": 1, "date": 1, "startTime": 1, "endTime": 1, "status": 1, "duration_minutes": 1}
+
+    def insert_sessions(self, sessions, **extra):
+        docs = [self.with_time_fields(s, **extra) for s in sessions]
+        if docs:
+            self.collection.insert_many(docs)
+            plan_stats.apply_sessions(docs, 1)
+        return docs
+
+    def study_summary(self, exam_id, today_str):
+        """
+        สรุปของแผนด้วย aggregation เดียว (ส่งกลับมาแค่ตัวเลข ไม่ใช่ทุก Session)
+        คืนค่า {"days_read", "days_remaining", "total_duration_minutes", "subjects"}
+        """
+        is_completed = {"$eq": ["$status", "completed"]}
+        pipeline = [
+            {"$match": {"exam_id": exam_id}},
+            {"$group": {
+                "_id": None,
+                "days_read": {"$addToSet": {"$cond": [is_completed, "$date", "$$REMOVE"]}},
+                "days_remaining": {"$addToSet": {"$cond": [
+                    {"$and": [{"$gte": ["$date", today_str]}, {"$not": [is_completed]}]}, "$date", "$$REMOVE",
+                ]}},
+                "total_duration_minutes": {"$sum": {"$cond": [is_completed, "$duration_minutes", 0]}},
+                "subjects": {"$addToSet": "$subject"},
+            }},
+            {"$project": {
+                "_id": 0,
+                "days_read": {"$size": "$days_read"},
+                "days_remaining": {"$size": "$days_remaining"},
+                "total_duration_minutes": 1,
+                "subjects": 1,
+            }},
+        ]
+        result = next(self.collection.aggregate(pipeline), None)
+        return result or {"days_read": 0, "days_remaining": 0, "total_duration_minutes": 0, "subjects": []}
+
+    def delete_sessions(self, docs):
+        """ลบ Session ตามเอกสารที่อ่านมาแล้ว (ต้องมี _id + STATS_PROJECTION)"""
+        if not docs:
+            return 0
+        result = self.collection.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+        plan_stats.apply_sessions(docs, -1)
+        return result.deleted_count
+
+    def update_statuses(self, user_id, items, exam_id=None):
+        """
+        อัปเดต status หลาย Slot ใน bulk write เดียว (unordered) ไม่ต้องอ่านก่อนเขียน
+        items: [{"slot_id": ..., "status": ...}] (slot_id ซ้ำ ใช้ค่าสุดท้าย)
+        exam_id: จำกัดให้แก้ได้เฉพาะ Slot ของแผนนี้ (Slot ของแผนอื่นนับเป็น matched 0)
+        คืนค่า {"matched", "modified", "slots": [{"slot_id", "matched", "modified"}]}
+
+        แต่ละ Slot มี 2 operation ที่ filter ไม่ทับกัน: สถานะเดิม completed / ไม่ใช่ completed
+        operation ไหน modified จึงรู้เลยว่า Slot นั้นเปลี่ยนข้าม completed หรือไม่ (ใช้ $inc ของ plan_stats)
+        แต่ละ operation atomic ในตัว เขียนพร้อมกันหลาย request ยอดก็ยังตรง ไม่ต้อง compare-and-set
+        """
+        changes = {}
+        for item in items:
+            slot_id, status = item.get("slot_id"), item.get("status")
+            if slot_id and status:
+                changes[slot_id] = status
+        if not changes:
+            return {"matched": 0, "modified": 0, "slots": []}
+
+        scope = {"user_id": user_id}
+        if exam_id is not None:
+            scope["exam_id"] = exam_id
+        slot_ids = list(changes)
+        ops = []
+        for slot_id in slot_ids:
+            update = {"$set": {"status": changes[slot_id]}}
+            ops.append(({"slot_id": slot_id, **scope, "status": "completed"}, update))
+            ops.append(({"slot_id": slot_id, **scope, "status": {"$ne": "completed"}}, update))
+
+        # MongoDB 8.0+: client bulk write คืนผลราย operation ได้ในรอบเดียว
+        try:
+            result = get_client().bulk_write(
+                [UpdateOne(f, u, namespace=self.collection.full_name) for f, u in ops],
+                ordered=False,
+                verbose_results=True,
+            )
+        except InvalidOperation:
+            return self._write_statuses_fallback(slot_ids, changes, scope, ops)
+
+        per_op = result.update_results
+        slots, flips = [], {}
+        for n, slot_id in enumerate(slot_ids):
+            from_done, from_other = per_op.get(2 * n), per_op.get(2 * n + 1)
+            now_done = changes[slot_id] == "completed"
+            if from_done is not None and from_done.modified_count and not now_done:
+                flips[slot_id] = -1
+            elif from_other is not None and from_other.modified_count and now_done:
+                flips[slot_id] = 1
+            # op ที่สองของคู่อาจ match ค่าที่ op แรกเพิ่งตั้ง (ค่าเดิม modified 0) จึงนับ matched ต่อ Slot
+            slots.append({
+                "slot_id": slot_id,
+                "matched": int(any(r is not None and r.matched_count for r in (from_done, from_other))),
+                "modified": sum(r.modified_count for r in (from_done, from_other) if r is not None),
+            })
+
+        if flips:
+            # วันที่ / ความยาว Session ไม่เปลี่ยนตาม status อ่านหลังเขียนได้ (เฉพาะ Slot ที่ข้าม completed)
+            docs = self.collection.find({"slot_id": {"$in": list(flips)}, **scope}, {**self.STATS_PROJECTION, "slot_id": 1})
+            plan_stats.apply_completion_changes([(doc, flips[doc["slot_id"]]) for doc in docs])
+
+        return {"matched": sum(s["matched"] for s in slots), "modified": result.modified_count, "slots": slots}
+
+    def _write_statuses_fallback(self, slot_ids, changes, scope, ops):
+        """
+        Server รุ่นเก่า: bulk write ระดับ collection ได้เฉพาะยอดรวม ไม่รู้ว่า Slot ไหนข้าม completed
+        มีการแก้ -> คำนวณ plan_stats ใหม่เฉพาะแผนของ Slot ที่ขอ / ผลราย Slot อ่านจากสถานะหลังเขียน
+        """
+        result = self.collection.bulk_write([UpdateOne(f, u) for f, u in ops], ordered=False)
+        # matched ราย Slot = สถานะตอนนี้เป็นค่าที่ขอ (ยอดรวม matched ของ server นับซ้ำได้ ดู update_statuses)
+        current = {
+            doc["slot_id"]: doc
+            for doc in self.collection.find({"slot_id": {"$in": slot_ids}, **scope}, {"slot_id": 1, "status": 1, "exam_id": 1})
+        }
+        if result.modified_count:
+            for exam_id in {doc.get("exam_id") for doc in current.values()}:
+                plan_stats.rebuild(exam_id)
+        slots = [
+            {"slot_id": slot_id, "matched": int(current.get(slot_id, {}).get("status") == changes[slot_id]), "modified": None}
+            for slot_id in slot_ids
+        ]
+        return {
+            "matched": sum(s["matched"] for s in slots),
+            "modified": result.modified_count,
+            "slots": slots,
+        }
+
+
+class ExamPlanRepository(Repository):
+
+    def bump_version(self, plan_id, user_id=None):
+        """
+        เพิ่ม version ของแผนทุกครั้งที่ Session ของแผนเปลี่ยน (ใช้ทำ ETag)
+        user_id: ให้ bump ได้เฉพาะแผนของผู้ใช้คนนี้
+        """
+        query = {"_id": plan_id}
+        if user_id is not None:
+            query["user_id"] = user_id
+        self.collection.update_one(query, {"$inc": {"version": 1}})
+
+
+class PlanStatsRepository(Repository):
+    """
+    plan_stats: สรุปของแผน 1 document ต่อแผน อัปเดตด้วย $inc ทุกครั้งที่ Session เปลี่ยน
+    {_id: exam_id, days: {"YYYY-MM-DD": {"total", "completed"}}, completed_minutes}
+    แผนที่ยังไม่มี document (แผนเก่า) จะถูกสร้างด้วย rebuild() ตอนอ่านครั้งแรก
+    """
+
+    @staticmethod
+    def _add_completed(inc, doc, sign):
+        inc[f"days.{doc['date']}.completed"] += sign
+        minutes = doc.get("duration_minutes")
+        if minutes is None:
+            minutes = session_minutes(doc.get("startTime", "00:00"), doc.get("endTime", "00:00"))
+        inc["completed_minutes"] += sign * minutes
+
+    @classmethod
+    def _add_session(cls, inc, doc, sign):
+        inc[f"days.{doc['date']}.total"] += sign
+        if doc.get("status") == "completed":
+            cls._add_completed(inc, doc, sign)
+
+    def _write(self, incs):
+        ops = []
+        for exam_id, inc in incs.items():
+            inc = {k: v for k, v in inc.items() if v}
+            if inc:
+                # ไม่ upsert: ถ้ายังไม่มี document ให้ rebuild() สร้างจาก Session จริงทีเดียว
+                ops.append(UpdateOne({"_id": exam_id}, {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}}))
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+
+    def apply_sessions(self, docs, sign):
+        """นับ Session ที่เพิ่ม (sign=1) หรือลบ (sign=-1)"""
+        incs = defaultdict(lambda: defaultdict(int))
+        for doc in docs:
+            if doc.get("exam_id") is not None:
+                self._add_session(incs[doc["exam_id"]], doc, sign)
+        self._write(incs)
+
+    def apply_completion_changes(self, changes):
+        """changes: [(session, +1 กลายเป็น completed / -1 ไม่ completed แล้ว)]"""
+        incs = defaultdict(lambda: defaultdict(int))
+        for doc, sign in changes:
+            if doc.get("exam_id") is not None:
+                self._add_completed(incs[doc["exam_id"]], doc, sign)
+        self._write(incs)
+
+    def init_plan(self, exam_id):
+        """เรียกก่อน insert Session ชุดแรกของแผนใหม่ ให้ $inc มี document รองรับ"""
+        self.collection.replace_one(
+            {"_id": exam_id},
+            {"days": {}, "completed_minutes": 0, "updated_at": datetime.utcnow()},
+            upsert=True,
+        )
+
+    def rebuild(self, exam_id):
+        """คำนวณใหม่จาก study_sessions ทั้งหมดของแผน (ใช้ซ่อมค่าที่ drift)"""
+        inc = defaultdict(int)
+        for doc in study_sessions.find({"exam_id": exam_id}, StudySessionRepository.STATS_PROJECTION):
+            self._add_session(inc, doc, 1)
+
+        days = defaultdict(lambda: {"total": 0, "completed": 0})
+        for key, value in inc.items():
+            if key.startswith("days."):
+                _, day, field = key.split(".")
+                days[day][field] = value
+
+        stats = {
+            "days": dict(days),
+            "completed_minutes": inc["completed_minutes"],
+            "updated_at": datetime.utcnow(),
+        }
+        self.collection.replace_one({"_id": exam_id}, stats, upsert=True)
+        return {"_id": exam_id, **stats}
+
+    def get_or_rebuild(self, exam_id):
+        return self.collection.find_one({"_id": exam_id}) or self.rebuild(exam_id)
+
+
+users = Repository("users")
+subjects = Repository("subject")
+exam_plans = ExamPlanRepository("exam_plans")
+study_sessions = StudySessionRepository("study_sessions")
+fixed_schedules = Repository("fixed_schedules")
+availability_bitmaps = Repository("availability_bitmaps")
+custom_tasks = Repository("custom_tasks")
+admin_summary_log = Repository("admin_summary_log")
+plan_stats = PlanStatsRepository("plan_stats")
+admin_metrics = Repository("admin_metrics")
+user_events = Repository("user_events")
+counters = Repository("counters")
+notification_outbox = Repository("notification_outbox")
+outbox_batches = Repository("outbox_batches")
+leases = Repository("leases")
+job_runs = Repository("job_runs")
+schedule_versions = Repository("schedule_versions")
+cache_entries = Repository("cache_entries")
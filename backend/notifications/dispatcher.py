@@ -0,0 +1,191 @@
+"""
+ตัวจับเวลาแจ้งเตือนแบบ event-driven แทน interval job ทุก 1 นาที
+
+โหลดเวลาเริ่มของ Session ที่จะถึง NOTIFY_HEAP_SIZE ตัวแรกเข้า min-heap แล้วหลับจนถึงตัวที่เร็วที่สุด
+ถึงเวลาแล้วค่อยเรียก check_and_send_notifications (query ช่วงเวลาเดียวด้วย index)
+ตารางเปลี่ยน (สร้างแผน / เลื่อนตาราง) เรียก schedule_changed() ซึ่งเพิ่ม version ใน schedule_versions
+dispatcher (อยู่ใน leader process เดียว) เช็ค version ทุก NOTIFY_POLL_SECONDS แล้วโหลด heap ใหม่
+และโหลดใหม่เองทุก NOTIFY_REFRESH_SECONDS กันพลาด
+"""
+import heapq
+import os
+import threading
+from datetime import datetime
+
+from pymongo.errors import PyMongoError
+
+from api.scheduler_jobs import NOTIFY_WINDOW, check_and_send_notifications
+from database import repositories
+
+
+NOTIFY_HEAP_SIZE = int(os.getenv("NOTIFY_HEAP_SIZE", "200"))
+NOTIFY_REFRESH_SECONDS = int(os.getenv("NOTIFY_REFRESH_SECONDS", "300"))
+NOTIFY_POLL_SECONDS = int(os.getenv("NOTIFY_POLL_SECONDS", "5"))
+ERROR_BACKOFF_SECONDS = 30
+SCHEDULE_VERSION_ID = "study_sessions"
+
+study_sessions_collection = repositories.study_sessions
+schedule_versions_collection = repositories.schedule_versions
+
+
+def schedule_version():
+    """version ปัจจุบันของตาราง (0 ถ้ายังไม่เคยเปลี่ยน) อ่านด้วย _id ถูกพอจะ poll ถี่ๆ"""
+    doc = schedule_versions_collection.find_one({"_id": SCHEDULE_VERSION_ID}, {"version": 1})
+    return doc["version"] if doc else 0
+
+
+class NotificationDispatcher:
+
+    def __init__(self, app, horizon=NOTIFY_HEAP_SIZE, refresh_seconds=NOTIFY_REFRESH_SECONDS):
+        self.app = app
+        self.horizon = horizon
+        self.refresh_seconds = refresh_seconds
+        self.heap = []
+        self.loaded_at = None
+        # เวลาเริ่มล่าสุดที่ยิงไปแล้ว: โหลดครั้งต่อไปเอาเฉพาะ starts_at ที่ใหม่กว่านี้
+        # (Session ที่ยิงแล้วแต่ยังไม่ถูก mark จะไม่วนกลับเข้า heap)
+        self.last_fired_at = None
+        self.version = None
+        # โหลดมาไม่ถึง horizon หรือไม่ได้อะไรใหม่ = ไม่ต้องโหลดซ้ำจนกว่าจะ refresh / version เปลี่ยน
+        self.exhausted = False
+        self._loaded_ids = set()
+        self._changed = True
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="notification-dispatcher", daemon=True)
+        self._thread.start()
+        print(f"[DISPATCHER] started (heap {self.horizon}, refresh every {self.refresh_seconds}s)")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """ตารางเปลี่ยน: โหลด heap ใหม่ในรอบถัดไปทันที"""
+        self._changed = True
+        self._wake.set()
+
+    def load(self, now):
+        """เวลาเริ่มของ Session ที่ยัง pending และยังไม่แจ้ง (ใช้ index pending_starts_at)"""
+        since = now - NOTIFY_WINDOW
+        if self.last_fired_at is not None and self.last_fired_at > since:
+            since = self.last_fired_at
+        upcoming = study_sessions_collection.find(
+            {
+                "starts_at": {"$gt": since},
+                "status": "pending",
+                "notified_at": {"$exists": False},
+            },
+            {"starts_at": 1},
+        ).sort("starts_at", 1).limit(self.horizon)
+
+        self.heap = [(s["starts_at"], s["_id"]) for s in upcoming]
+        heapq.heapify(self.heap)
+        ids = {session_id for _, session_id in self.heap}
+        # โหลดซ้ำแล้วได้ชุดเดิม = ไม่มีอะไรใหม่ ถอยไปรอ refresh แทนการวนโหลดทันที
+        self.exhausted = len(self.heap) < self.horizon or ids == self._loaded_ids
+        self._loaded_ids = ids
+        self.loaded_at = now
+        self._changed = False
+
+    def check_version(self):
+        """ตารางเปลี่ยนจาก process ไหนก็ตาม: โหลด heap ใหม่ รวมเวลาเริ่มที่เคยยิงไปแล้วด้วย"""
+        version = schedule_version()
+        if version != self.version:
+            if self.version is not None:
+                # Session ใหม่อาจเริ่มเวลาเดียวกับที่ยิงไปแล้ว
+                self.last_fired_at = None
+            self.version = version
+            self._changed = True
+
+    def needs_reload(self, now):
+        if self._changed or self.loaded_at is None:
+            return True
+        if not self.heap and not self.exhausted:
+            return True
+        return (now - self.loaded_at).total_seconds() >= self.refresh_seconds
+
+    def seconds_until_next(self, now):
+        if self.needs_reload(now):
+            return 0.0
+        wait = min(self.refresh_seconds - (now - self.loaded_at).total_seconds(), NOTIFY_POLL_SECONDS)
+        if self.heap:
+            wait = min(wait, (self.heap[0][0] - now).total_seconds())
+        return max(0.0, wait)
+
+    def tick(self):
+        """ทำงาน 1 รอบ คืนค่าจำนวนวินาทีที่ควรหลับต่อ"""
+        now = datetime.utcnow()
+        self.check_version()
+        if self.needs_reload(now):
+            self.load(now)
+
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap))
+        if due:
+            fire_at = due[-1][0]
+            # Session ที่เริ่มพร้อมกันรวมเป็นการเช็คครั้งเดียว ไม่ต้องจองรอบไว้ใน job_runs:
+            # leader คนใหม่เช็คเวลาเดิมซ้ำได้ ได้แค่ Session ที่ยังไม่ถูก mark และ outbox กันเมลซ้ำด้วย dedupe_key
+            try:
+                check_and_send_notifications(self.app)
+            except Exception:
+                # เช็คไม่สำเร็จ: ใส่กลับเข้า heap ให้รอบถัดไปยิงเวลาเดิมใหม่
+                # (last_fired_at ยังไม่ขยับ โหลดใหม่ก็ยังได้ Session เหล่านี้)
+                for entry in due:
+                    heapq.heappush(self.heap, entry)
+                raise
+            self.last_fired_at = fire_at
+
+        return self.seconds_until_next(now)
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    wait = self.tick()
+                except Exception as e:
+                    print(f"[DISPATCHER] error: {e}")
+                    self._changed = True
+                    wait = ERROR_BACKOFF_SECONDS
+
+                self._wake.wait(wait)
+                self._wake.clear()
+
+
+dispatcher = None
+
+
+def start_dispatcher(app):
+    """เริ่ม dispatcher ตัวเดียวของ process"""
+    global dispatcher
+    if dispatcher is None:
+        dispatcher = NotificationDispatcher(app)
+        dispatcher.start()
+    return dispatcher
+
+
+def stop_dispatcher():
+    global dispatcher
+    if dispatcher is not None:
+        dispatcher.stop()
+        dispatcher = None
+
+
+def schedule_changed():
+    """บอก dispatcher ทุก process (ผ่าน MongoDB) ว่าตารางเปลี่ยน ไม่ให้ request ล้มถ้าเขียนไม่สำเร็จ"""
+    try:
+        schedule_versions_collection.update_one(
+            {"_id": SCHEDULE_VERSION_ID},
+            {"$inc": {"version": 1}, "$set": {"changed_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    except PyMongoError as e:
+        print(f"[DISPATCHER] schedule_changed failed: {e}")
+    if dispatcher is not None:
+        dispatcher.wake()
@@ -0,0 +1,127 @@
+"""
+SMTP server ปลอมสำหรับทดสอบการส่งอีเมลในเครื่อง (ไม่ส่งออกจริง แค่พิมพ์/เก็บไว้)
+
+รัน:  cd backend && python -m notifications.fake_smtp --port 1025 [--fail-rate 0.2] [--delay 0.5]
+แล้วตั้ง MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=0 ตอนรันแอป
+--fail-rate ตอบ error แบบสุ่ม (ลอง retry ของ outbox), --delay หน่วงทุกคำสั่ง (ลอง SMTP ช้า)
+"""
+import argparse
+import random
+import re
+import socketserver
+import threading
+import time
+from email import message_from_bytes
+from email.header import decode_header, make_header
+
+
+ADDRESS_RE = re.compile(r"<([^>]*)>")
+
+
+def parse_address(command):
+    """'MAIL FROM:<a@b.c> SIZE=10' -> 'a@b.c'"""
+    match = ADDRESS_RE.search(command)
+    return match.group(1) if match else command.split(":", 1)[-1].strip()
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        time.sleep(self.server.delay)
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.reply("220 fake-smtp ready")
+        sender, recipients = None, []
+
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            command = raw.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb == "EHLO":
+                self.reply("250-fake-smtp")
+                self.reply("250 SIZE 10485760")
+            elif verb == "HELO":
+                self.reply("250 fake-smtp")
+            elif verb == "MAIL":
+                sender, recipients = parse_address(command), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(parse_address(command))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = self.read_data()
+                if random.random() < self.server.fail_rate:
+                    self.reply("451 Temporary failure (fake)")
+                else:
+                    self.server.store(sender, recipients, data)
+                    self.reply("250 OK queued")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b".\r\n", b".\n"):
+                break
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        return b"".join(lines)
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=1025, fail_rate=0.0, delay=0.0, quiet=False):
+        super().__init__((host, port), FakeSMTPHandler)
+        self.fail_rate = fail_rate
+        self.delay = delay
+        self.quiet = quiet
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def store(self, sender, recipients, data):
+        message = message_from_bytes(data)
+        subject = str(make_header(decode_header(message.get("Subject", ""))))
+        with self._lock:
+            self.messages.append({"from": sender, "to": recipients, "subject": subject, "raw": data})
+        if not self.quiet:
+            print(f"[FAKE SMTP] #{len(self.messages)} {sender} -> {', '.join(recipients)}: {subject}")
+
+    def start_background(self):
+        """เปิด server ใน thread (ใช้ในสคริปต์ทดสอบ) คืนค่า thread"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake SMTP server for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeSMTPServer(args.host, args.port, args.fail_rate, args.delay)
+    print(f"Fake SMTP listening on {args.host}:{args.port} (fail-rate={args.fail_rate}, delay={args.delay}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
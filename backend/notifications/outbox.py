@@ -0,0 +1,135 @@
+"""
+Outbox ของอีเมลแจ้งเตือน (collection notification_outbox)
+
+Scheduler แค่ enqueue_notification() แล้วจบ ส่วนการส่งจริงเป็นหน้าที่ของ worker (notifications/sender.py)
+สถานะ: queued -> sending -> sent | failed (ส่งไม่สำเร็จจะกลับเป็น queued พร้อมเวลา retry ถัดไป)
+"""
+import os
+import random
+from datetime import datetime, timedelta
+
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from database import repositories
+
+
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = int(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+RETRY_MAX_SECONDS = 3600
+# worker ค้าง/ตายระหว่างส่ง เกินเวลานี้ให้ worker อื่นหยิบไปส่งใหม่
+SENDING_LEASE = timedelta(minutes=2)
+
+outbox_collection = repositories.notification_outbox
+batches_collection = repositories.outbox_batches
+
+
+def dedupe_key(recipient, session_id):
+    return f"{recipient.lower()}:{session_id}"
+
+
+def enqueue_notification(recipient, subject, session_id, user_id=None, start_time=None):
+    """
+    เพิ่มงานส่งอีเมล 1 ฉบับ คืนค่า False ถ้าผู้รับคนนี้มีงานของ Session นี้อยู่แล้ว (dedupe_key unique)
+    """
+    now = datetime.utcnow()
+    try:
+        outbox_collection.insert_one({
+            "dedupe_key": dedupe_key(recipient, session_id),
+            "recipient": recipient,
+            "subject": subject,
+            "start_time": start_time,
+            "session_id": session_id,
+            "user_id": user_id,
+            "status": "queued",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        })
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+def claim_next(now=None):
+    """หยิบงานที่ถึงเวลาส่ง 1 งานแบบ atomic (งาน sending ที่ค้างเกิน lease ก็หยิบได้)"""
+    now = now or datetime.utcnow()
+    return outbox_collection.find_one_and_update(
+        {"$or": [
+            {"status": "queued", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "locked_until": {"$lt": now}},
+        ]},
+        {"$set": {"status": "sending", "locked_until": now + SENDING_LEASE}, "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def claim_batch(limit, now=None):
+    """หยิบงานที่ถึงเวลาส่งสูงสุด limit งาน (ส่งด้วย SMTP connection เดียวกัน)"""
+    now = now or datetime.utcnow()
+    jobs = []
+    while len(jobs) < limit:
+        job = claim_next(now)
+        if job is None:
+            break
+        jobs.append(job)
+    return jobs
+
+
+def extend_lease(job, now=None):
+    """
+    ต่อ lease ก่อนส่งจริงทีละงาน (งานท้าย batch อาจรอ token bucket นานเกิน SENDING_LEASE)
+    คืน False ถ้างานถูก worker อื่นหยิบไปแล้ว (attempts เพิ่มทุกครั้งที่ถูกหยิบ) ห้ามส่งซ้ำ
+    """
+    now = now or datetime.utcnow()
+    result = outbox_collection.update_one(
+        {"_id": job["_id"], "status": "sending", "attempts": job["attempts"]},
+        {"$set": {"locked_until": now + SENDING_LEASE}},
+    )
+    return result.matched_count == 1
+
+
+def mark_sent(job):
+    outbox_collection.update_one(
+        {"_id": job["_id"]},
+        {"$set": {"status": "sent", "sent_at": datetime.utcnow()}, "$unset": {"locked_until": ""}},
+    )
+
+
+def retry_delay(attempts):
+    """exponential backoff + jitter: 30s, 60s, 120s, ... ไม่เกิน 1 ชั่วโมง"""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def mark_failed(job, error):
+    """ส่งไม่สำเร็จ: ตั้งเวลา retry ใหม่ หรือเลิกส่งเมื่อครบ MAX_ATTEMPTS"""
+    now = datetime.utcnow()
+    update = {"last_error": str(error)[:500], "last_attempt_at": now}
+    if job["attempts"] >= MAX_ATTEMPTS:
+        update["status"] = "failed"
+    else:
+        update["status"] = "queued"
+        update["next_attempt_at"] = now + retry_delay(job["attempts"])
+    outbox_collection.update_one({"_id": job["_id"]}, {"$set": update, "$unset": {"locked_until": ""}})
+    return update["status"]
+
+
+def outbox_stats():
+    counts = {doc["_id"]: doc["count"] for doc in outbox_collection.aggregate([
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+    ])}
+    return {status: counts.get(status, 0) for status in ("queued", "sending", "sent", "failed")}
+
+
+def record_batch(stats):
+    """เก็บสถิติ batch ไว้ใน outbox_batches (หมดอายุเองด้วย TTL) ให้ทุก worker อ่านได้"""
+    try:
+        batches_collection.insert_one(dict(stats))
+    except PyMongoError as e:
+        print(f"[OUTBOX] record batch failed: {e}")
+
+
+def recent_batches(limit=50):
+    return list(batches_collection.find({}, {"_id": 0}).sort("finished_at", DESCENDING).limit(limit))
@@ -0,0 +1,234 @@
+"""
+Worker pool ที่ดึงงานจาก outbox ไปส่งอีเมล
+
+OUTBOX_WORKERS      จำนวน thread ที่ส่งพร้อมกัน (ค่าเริ่มต้น 4) = จำนวน SMTP connection สูงสุด
+OUTBOX_RATE_PER_SEC จำกัดจำนวนอีเมลต่อวินาทีรวมทุก worker (token bucket)
+OUTBOX_BATCH_SIZE   จำนวนอีเมลที่ส่งต่อ 1 SMTP connection (STARTTLS + login ครั้งเดียวต่อ batch)
+"""
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime
+
+from api.email_service import build_notification_message, mail
+from notifications import outbox
+
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_RATE_PER_SEC = float(os.getenv("OUTBOX_RATE_PER_SEC", "5"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+POLL_SECONDS = 5
+# batch ล้มด้วย error ที่ไม่คาดไว้ (เช่น DB หลุดตอน mark_sent) พักก่อนหยิบ batch ใหม่
+ERROR_BACKOFF_SECONDS = 5
+
+# server ปฏิเสธเฉพาะฉบับนี้ (connection ยังใช้ต่อได้)
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+# ที่เหลือ (หลุด / timeout / handshake ล้ม) ต้องเปิด connection ใหม่
+CONNECTION_ERRORS = (OSError,)
+
+
+class TokenBucket:
+    """จำกัดอัตราแบบ token bucket: เติม rate token ต่อวินาที เก็บได้ไม่เกิน capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class OutboxWorkerPool:
+
+    def __init__(self, app, size=OUTBOX_WORKERS, rate_per_sec=OUTBOX_RATE_PER_SEC, batch_size=OUTBOX_BATCH_SIZE):
+        self.app = app
+        self.size = size
+        self.batch_size = max(1, batch_size)
+        self.bucket = TokenBucket(rate_per_sec)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _spawn(self, index):
+        thread = threading.Thread(target=self._run, name=f"outbox-sender-{index}", daemon=True)
+        thread.start()
+        return thread
+
+    def start(self):
+        with self._lock:
+            self._threads = [self._spawn(i) for i in range(self.size)]
+        print(f"[OUTBOX] {self.size} sender workers started ({self.bucket.rate}/s, batch {self.batch_size})")
+
+    def ensure_workers(self):
+        """เริ่ม thread ใหม่แทนตัวที่ตายไป คืนจำนวนที่เริ่มใหม่"""
+        if self._stop.is_set():
+            return 0
+        restarted = 0
+        with self._lock:
+            for i, thread in enumerate(self._threads):
+                if not thread.is_alive():
+                    print(f"[OUTBOX] {thread.name} died, restarting")
+                    self._threads[i] = self._spawn(i)
+                    restarted += 1
+        return restarted
+
+    def wake(self):
+        """มีงานใหม่เข้า outbox: ปลุก worker ที่รออยู่โดยไม่ต้องรอรอบ poll"""
+        self.ensure_workers()
+        self._wake.set()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    jobs = outbox.claim_batch(self.batch_size)
+                except Exception as e:
+                    print(f"[OUTBOX] claim failed: {e}")
+                    jobs = []
+
+                if not jobs:
+                    self._wake.wait(POLL_SECONDS)
+                    self._wake.clear()
+                    continue
+
+                try:
+                    self.send_batch(jobs)
+                except Exception as e:
+                    # เช่น PyMongoError จาก mark_sent / BadHeaderError: thread ต้องไม่ตาย
+                    # งานที่ค้างสถานะ sending จะถูกหยิบไปส่งใหม่เมื่อหมด lease
+                    print(f"[OUTBOX] batch failed: {e!r}")
+                    self._stop.wait(ERROR_BACKOFF_SECONDS)
+
+    @staticmethod
+    def _connect():
+        """เปิด SMTP connection (STARTTLS + login) ผ่าน Flask-Mail"""
+        return mail.connect().__enter__()
+
+    @staticmethod
+    def _close(conn):
+        if conn is None or conn.host is None:
+            return
+        try:
+            conn.host.quit()
+        except CONNECTION_ERRORS:
+            conn.host.close()
+
+    def send_batch(self, jobs):
+        """
+        ส่งทุกงานใน batch ด้วย connection เดียว หลุดกลางทางเปิดใหม่ 1 ครั้งแล้วส่งฉบับนั้นซ้ำ
+        เปิดใหม่ไม่ได้ -> งานที่เหลือถูกตั้ง retry ตาม backoff
+        """
+        stats = {"size": len(jobs), "sent": 0, "failed": 0, "skipped": 0, "reconnects": 0, "connect_ms": 0.0}
+        started = time.perf_counter()
+        conn = None
+
+        try:
+            for index, job in enumerate(jobs):
+                self.bucket.acquire()
+                if not outbox.extend_lease(job):
+                    stats["skipped"] += 1
+                    print(f"[OUTBOX] {job['recipient']} lease lost, taken by another worker")
+                    continue
+                message = build_notification_message(job["subject"], job["recipient"], job.get("start_time"))
+
+                for attempt in (1, 2):
+                    try:
+                        if conn is None:
+                            connect_started = time.perf_counter()
+                            conn = self._connect()
+                            stats["connect_ms"] += (time.perf_counter() - connect_started) * 1000
+                        conn.send(message)
+                        outbox.mark_sent(job)
+                        stats["sent"] += 1
+                        break
+                    except MESSAGE_ERRORS as e:
+                        status = outbox.mark_failed(job, e)
+                        stats["failed"] += 1
+                        print(f"[OUTBOX] {job['recipient']} rejected (attempt {job['attempts']}, now {status}): {e}")
+                        break
+                    except CONNECTION_ERRORS as e:
+                        self._close(conn)
+                        conn = None
+                        if attempt == 1:
+                            stats["reconnects"] += 1
+                            continue
+                        # เปิดใหม่แล้วยังล้ม: คืนงานที่เหลือทั้งหมดเข้าคิว retry
+                        for rest in jobs[index:]:
+                            outbox.mark_failed(rest, e)
+                        stats["failed"] += len(jobs) - index
+                        print(f"[OUTBOX] SMTP unavailable, {len(jobs) - index} jobs rescheduled: {e}")
+                        return stats
+        finally:
+            self._close(conn)
+            stats["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            stats["connect_ms"] = round(stats["connect_ms"], 1)
+            stats["finished_at"] = datetime.utcnow()
+            outbox.record_batch(stats)
+            print(f"[OUTBOX] batch {stats['sent']}/{stats['size']} sent in {stats['total_ms']} ms "
+                  f"(connect {stats['connect_ms']} ms, reconnects {stats['reconnects']})")
+
+        return stats
+
+
+pool = None
+
+
+def start_pool(app):
+    """เริ่ม worker pool ตัวเดียวของ process"""
+    global pool
+    if pool is None:
+        pool = OutboxWorkerPool(app)
+        pool.start()
+    return pool
+
+
+def stop_pool():
+    global pool
+    if pool is not None:
+        pool.stop()
+        pool = None
+
+
+def wake_workers():
+    if pool is not None:
+        pool.wake()
+
+
+def ensure_workers():
+    """เรียกเป็นระยะจาก scheduler กัน worker ตายหมดแล้วงาน retry ค้างจนกว่าจะมีงานใหม่"""
+    if pool is not None:
+        pool.ensure_workers()
+
+
+def batch_stats():
+    """สถิติ batch ล่าสุดจาก MongoDB (อ่านได้จากทุก process ไม่ใช่แค่ leader)"""
+    batches = outbox.recent_batches(50)
+    sent = sum(b["sent"] for b in batches)
+    total_ms = sum(b["total_ms"] for b in batches)
+    return {
+        "batch_size": OUTBOX_BATCH_SIZE,
+        "workers": OUTBOX_WORKERS,
+        "recent": batches[:10],
+        "avg_ms_per_email": round(total_ms / sent, 1) if sent else None,
+    }
@@ -0,0 +1,70 @@
+import heapq
+import random
+
+
+def apportion(weights, total_slots):
+    """
+    แบ่งจำนวน Slot ตามน้ำหนัก (Largest Remainder Method)
+    คืนค่า list จำนวน Slot ของแต่ละวิชา (ลำดับเดียวกับ weights)
+    """
+    total_weight = sum(weights)
+    if total_slots <= 0 or total_weight <= 0:
+        return [0] * len(weights)
+
+    counts = []
+    remainders = []
+    for idx, w in enumerate(weights):
+        # ใช้ divmod แทนการหารทศนิยม เพื่อให้เศษเทียบกันได้แม่นยำ
+        quota, rem = divmod(w * total_slots, total_weight)
+        counts.append(int(quota))
+        remainders.append((rem, w, -idx))
+
+    # เติมเศษที่เหลือให้วิชาที่มีเศษมากที่สุดก่อน (เสมอกันให้ priority สูงกว่าได้ก่อน)
+    leftover = total_slots - sum(counts)
+    if leftover > 0:
+        ranked = heapq.nlargest(leftover, range(len(weights)), key=lambda i: remainders[i])
+        for i in ranked:
+            counts[i] += 1
+
+    return counts
+
+
+def interleave(counts, rng=None):
+    """
+    เรียงลำดับวิชาให้ไม่ซ้ำติดกัน โดยเลือกวิชาที่เหลือมากที่สุดก่อน
+    ใช้ heap ทำให้แต่ละ Slot ใช้เวลา O(log วิชา)
+    คืนค่า list ของ index วิชา ยาวเท่ากับ sum(counts)
+    """
+    rng = rng or random
+    heap = [(-c, rng.random(), idx) for idx, c in enumerate(counts) if c > 0]
+    heapq.heapify(heap)
+
+    order = []
+    last_idx = None
+    while heap:
+        neg_count, tie, idx = heapq.heappop(heap)
+
+        # ถ้าซ้ำกับวิชาก่อนหน้า ให้หยิบอันดับถัดไปแทน (ถ้าไม่มีแล้วจำเป็นต้องซ้ำ)
+        if idx == last_idx and heap:
+            held = (neg_count, tie, idx)
+            neg_count, tie, idx = heapq.heappop(heap)
+            heapq.heappush(heap, held)
+
+        order.append(idx)
+        last_idx = idx
+        if neg_count + 1 < 0:
+            heapq.heappush(heap, (neg_count + 1, rng.random(), idx))
+
+    return order
+
+
+def allocate_slots(weights, total_slots, rng=None):
+    """
+    รวม apportion + interleave: คืนค่า index วิชาสำหรับทุก Slot
+    (Slot ที่ไม่มีวิชาจะเป็น None เมื่อ weight รวมเป็น 0)
+    """
+    counts = apportion(weights, total_slots)
+    order = interleave(counts, rng)
+    if len(order) < total_slots:
+        order.extend([None] * (total_slots - len(order)))
+    return order
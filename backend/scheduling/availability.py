@@ -0,0 +1,107 @@
+from datetime import datetime
+
+from scheduling.timeutil import time_to_minutes, minutes_to_time
+
+
+DEFAULT_SLOT_MINUTES = 60
+
+
+def merge_intervals(intervals):
+    """
+    รวมช่วงเวลาที่ซ้อนทับ/ติดกัน [(start, end), ...] ให้เป็นช่วงเดียว (เรียงตาม start)
+    """
+    merged = []
+    for start, end in sorted(i for i in intervals if i[0] < i[1]):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(s, e) for s, e in merged]
+
+
+def free_windows(day_start, day_end, busy):
+    """
+    หักช่วงที่ไม่ว่าง (busy ต้อง merge และเรียงแล้ว) ออกจากช่วงอ่านหนังสือของวัน
+    เดินครั้งเดียวตามลำดับเวลา (sweep) คืนค่าช่วงที่ว่าง
+    """
+    windows = []
+    cursor = day_start
+    for busy_start, busy_end in busy:
+        if busy_end <= cursor:
+            continue
+        if busy_start >= day_end:
+            break
+        if busy_start > cursor:
+            windows.append((cursor, busy_start))
+        cursor = max(cursor, busy_end)
+    if cursor < day_end:
+        windows.append((cursor, day_end))
+    return windows
+
+
+def cut_slots(windows, slot_minutes=DEFAULT_SLOT_MINUTES):
+    """
+    ตัดช่วงว่างเป็น Slot ยาว slot_minutes นาที (เศษท้ายช่วงที่ไม่ครบจะถูกทิ้ง)
+    """
+    slots = []
+    for start, end in windows:
+        current = start
+        while current + slot_minutes <= end:
+            slots.append((current, current + slot_minutes))
+            current += slot_minutes
+    return slots
+
+
+def group_fixed_schedules(fixed_schedules):
+    """
+    แปลง Fixed Schedule [{day, startTime, endTime}] เป็น {ชื่อวัน: [(start, end), ...]} ที่ merge แล้ว
+    """
+    by_day = {}
+    for fs in fixed_schedules:
+        by_day.setdefault(fs.get('day'), []).append(
+            (time_to_minutes(fs.get('startTime')), time_to_minutes(fs.get('endTime')))
+        )
+    return {day: merge_intervals(intervals) for day, intervals in by_day.items()}
+
+
+def build_available_slots(study_days, busy_by_weekday=None, exam_date_str=None,
+                          slot_minutes=DEFAULT_SLOT_MINUTES, availability=None):
+    """
+    สร้าง Slot ว่างจากช่วงอ่านหนังสือรายวัน [{date, startTime, endTime}]
+    busy_by_weekday: {ชื่อวัน (Monday...): [(start, end), ...] ที่ merge แล้ว}
+    availability: WeeklyAvailability (bitmap) ถ้าให้มา ตัด Slot ด้วย bit test แทนการ sweep
+    วันสอบ (exam_date_str) จะไม่ถูกนำมาจัด
+    """
+    busy_by_weekday = busy_by_weekday or {}
+    available = []
+
+    for day in study_days:
+        day_date_str = str(day['date']).split("T")[0].strip()
+        if day_date_str == exam_date_str:
+            continue
+
+        day_date = datetime.strptime(day_date_str, "%Y-%m-%d")
+        day_start, day_end = time_to_minutes(day['startTime']), time_to_minutes(day['endTime'])
+        if availability is not None:
+            slots = availability.free_slots(day_date.weekday(), day_start, day_end, slot_minutes)
+        else:
+            windows = free_windows(day_start, day_end, busy_by_weekday.get(day_date.strftime("%A"), []))
+            slots = cut_slots(windows, slot_minutes)
+
+        for slot_start, slot_end in slots:
+            available.append({
+                'date': day_date_str,
+                'startTime': minutes_to_time(slot_start),
+                'endTime': minutes_to_time(slot_end),
+            })
+
+    return available
+
+
+def parse_slot_minutes(value):
+    try:
+        minutes = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_SLOT_MINUTES
+    return minutes if minutes > 0 else DEFAULT_SLOT_MINUTES
@@ -0,0 +1,30 @@
+"""
+Benchmark ตัวจัดสรร Slot
+รัน: cd backend && python -m scheduling.bench_allocator
+"""
+import random
+import time
+
+from scheduling.allocator import allocate_slots
+
+
+def run(total_slots, subject_count, rounds=5):
+    rng = random.Random(42)
+    weights = [rng.randint(1, 3) for _ in range(subject_count)]
+
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        order = allocate_slots(weights, total_slots, rng)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+
+    repeats = sum(1 for a, b in zip(order, order[1:]) if a == b)
+    print(f"slots={total_slots:>7} subjects={subject_count:>3} "
+          f"best={best:8.2f} ms repeats={repeats}")
+
+
+if __name__ == "__main__":
+    for slots in (1_000, 10_000, 50_000, 100_000):
+        for subjects in (3, 10, 50):
+            run(slots, subjects)
@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import OrderedDict
+from bson.binary import Binary
+from pymongo import ReturnDocument
+
+from scheduling.availability import group_fixed_schedules
+from scheduling.timeutil import utc_now
+
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MINUTES_PER_DAY = 1440
+BYTES_PER_DAY = MINUTES_PER_DAY // 8
+
+
+class WeeklyAvailability:
+    """
+    Bitmap เวลาไม่ว่างรายสัปดาห์ (7 วัน x 1440 นาที) 1 bit ต่อ 1 นาที
+    เก็บแต่ละวันเป็น int เพื่อให้เช็คช่วงเวลาได้ด้วย bit operation ครั้งเดียว
+    """
+
+    def __init__(self, day_masks):
+        self.day_masks = list(day_masks)
+        self._intervals = {}
+
+    @classmethod
+    def from_fixed_schedules(cls, fixed_schedules):
+        grouped = group_fixed_schedules(fixed_schedules)
+        masks = []
+        for day_name in WEEKDAYS:
+            mask = 0
+            for start, end in grouped.get(day_name, []):
+                start, end = max(0, start), min(MINUTES_PER_DAY, end)
+                if start < end:
+                    mask |= ((1 << (end - start)) - 1) << start
+            masks.append(mask)
+        return cls(masks)
+
+    @classmethod
+    def from_bytes(cls, raw):
+        raw = bytes(raw)
+        return cls(
+            int.from_bytes(raw[i * BYTES_PER_DAY:(i + 1) * BYTES_PER_DAY], "little")
+            for i in range(len(WEEKDAYS))
+        )
+
+    def to_bytes(self):
+        return b"".join(mask.to_bytes(BYTES_PER_DAY, "little") for mask in self.day_masks)
+
+    def is_busy(self, weekday, minute):
+        """นาทีนี้ไม่ว่างไหม: shift แล้ว mask bit เดียว"""
+        return (self.day_masks[weekday] >> minute) & 1 == 1
+
+    def is_free(self, weekday, start, end):
+        """ช่วง [start, end) ว่างทั้งช่วงไหม: AND กับ mask ของช่วงครั้งเดียว"""
+        return self.day_masks[weekday] & (((1 << (end - start)) - 1) << start) == 0
+
+    def free_slots(self, weekday, day_start, day_end, slot_minutes):
+        """
+        ตัด Slot ยาว slot_minutes จากช่วง [day_start, day_end) ด้วย is_free ต่อ Slot
+        Slot ชนเวลาไม่ว่าง -> กระโดดไปท้ายช่วงไม่ว่างนั้น (ผลเหมือน free_windows + cut_slots)
+        """
+        mask = self.day_masks[weekday]
+        slots = []
+        cursor = day_start
+        while cursor + slot_minutes <= day_end:
+            overlap = mask & (((1 << slot_minutes) - 1) << cursor)
+            if not overlap:
+                slots.append((cursor, cursor + slot_minutes))
+                cursor += slot_minutes
+                continue
+            busy_start = (overlap & -overlap).bit_length() - 1
+            run = mask >> busy_start
+            cursor = busy_start + (~run & (run + 1)).bit_length() - 1
+        return slots
+
+    def busy_intervals(self, weekday):
+        """แปลง bit ที่ติดกันกลับเป็นช่วง [(start, end), ...] (merge แล้วโดยธรรมชาติ)"""
+        if weekday not in self._intervals:
+            intervals = []
+            mask = self.day_masks[weekday]
+            offset = 0
+            while mask:
+                low = (mask & -mask).bit_length() - 1
+                mask >>= low
+                offset += low
+                run = (~mask & (mask + 1)).bit_length() - 1
+                intervals.append((offset, offset + run))
+                mask >>= run
+                offset += run
+            self._intervals[weekday] = intervals
+        return self._intervals[weekday]
+
+    def by_weekday_name(self):
+        """รูปแบบเดียวกับ group_fixed_schedules() สำหรับ build_available_slots()"""
+        return {name: self.busy_intervals(i) for i, name in enumerate(WEEKDAYS)}
+
+
+class _LRUCache:
+    """
+    LRU ขนาดเล็กในหน่วยความจำ มีอายุ (ttl) คืนพื้นที่ของผู้ใช้ที่ไม่ได้ใช้นาน
+    """
+
+    def __init__(self, maxsize, ttl_seconds):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+# cache เก็บ (version, bitmap) ทุกครั้งที่ hit ต้องเช็ค version ใน DB ก่อน
+# process อื่นบันทึก Fixed Schedule ใหม่ version จะเพิ่ม -> ไม่ใช้ bitmap เก่าไปจัดตารางทับเวลาเรียน
+_availability_cache = _LRUCache(maxsize=1024, ttl_seconds=300)
+
+
+def save_user_availability(bitmaps_collection, user_id, fixed_schedules):
+    """
+    สร้าง Bitmap ใหม่จาก Fixed Schedule แล้วบันทึกลง DB (เรียกทุกครั้งที่บันทึก Fixed Schedule)
+    """
+    availability = WeeklyAvailability.from_fixed_schedules(fixed_schedules)
+    doc = bitmaps_collection.find_one_and_update(
+        {"_id": user_id},
+        {
+            "$set": {"bitmap": Binary(availability.to_bytes()), "updated_at": utc_now()},
+            "$inc": {"version": 1},
+        },
+        projection={"version": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    _availability_cache.put(str(user_id), (doc["version"], availability))
+    return availability
+
+
+def load_user_availability(bitmaps_collection, fixed_schedules_collection, user_id):
+    """
+    อ่าน Bitmap ของผู้ใช้ (Cache -> DB) ถ้ายังไม่เคยสร้าง จะสร้างจาก Fixed Schedule เดิมให้
+    cache hit อ่านแค่ version (ไม่ต้องดึงและแปลง bitmap ใหม่)
+    """
+    key = str(user_id)
+    cached = _availability_cache.get(key)
+    if cached is not None:
+        version, availability = cached
+        doc = bitmaps_collection.find_one({"_id": user_id}, {"version": 1})
+        if doc is not None and doc.get("version", 0) == version:
+            return availability
+        _availability_cache.pop(key)
+
+    doc = bitmaps_collection.find_one({"_id": user_id}, {"bitmap": 1, "version": 1})
+    if doc and doc.get("bitmap"):
+        availability = WeeklyAvailability.from_bytes(doc["bitmap"])
+        _availability_cache.put(key, (doc.get("version", 0), availability))
+        return availability
+
+    fixed_schedules = fixed_schedules_collection.find(
+        {"user_id": user_id}, {"_id": 0, "day": 1, "startTime": 1, "endTime": 1}
+    )
+    return save_user_availability(bitmaps_collection, user_id, fixed_schedules)
@@ -0,0 +1,93 @@
+import uuid
+
+from scheduling.allocator import allocate_slots
+
+
+FREE_SLOT_NAME = 'Free Slot'
+FREE_SLOT_COLOR = '#E5E7EB'
+DEFAULT_SUBJECT_COLOR = '#EF4444'
+
+
+class ScheduleStrategy:
+    """
+    Interface ของ Algorithm จัดตาราง
+    assign() คืนค่า index วิชาของแต่ละ Slot (None = Slot ว่าง)
+    """
+    name = None
+
+    def assign(self, subjects, study_slots):
+        raise NotImplementedError
+
+
+class WeightedInterleaveStrategy(ScheduleStrategy):
+    """แบ่ง Slot ตาม Priority และสลับวิชาไม่ให้ซ้ำติดกัน"""
+    name = 'weighted'
+
+    def assign(self, subjects, study_slots):
+        weights = [subject_weight(s) for s in subjects]
+        return allocate_slots(weights, len(study_slots))
+
+
+STRATEGIES = {}
+DEFAULT_STRATEGY = WeightedInterleaveStrategy.name
+
+
+def register_strategy(strategy):
+    STRATEGIES[strategy.name] = strategy
+    return strategy
+
+
+def get_strategy(name=None):
+    name = name or DEFAULT_STRATEGY
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown scheduling strategy: {name}")
+    return STRATEGIES[name]
+
+
+register_strategy(WeightedInterleaveStrategy())
+
+
+def subject_weight(subject):
+    # วิชาที่ถูกเลือกมาต้องได้เวลาอ่านอย่างน้อย 1 ส่วน
+    try:
+        return max(1, int(subject.get('priority', 1)))
+    except (TypeError, ValueError):
+        return 1
+
+
+def new_slot_id():
+    return str(uuid.uuid4())
+
+
+def build_session(slot, subject=None):
+    """
+    รูปแบบผลลัพธ์ของแต่ละ Slot (ใช้ร่วมกันทุก endpoint)
+    """
+    if subject is None:
+        name, color = FREE_SLOT_NAME, FREE_SLOT_COLOR
+    else:
+        name, color = subject['name'], subject.get('color', DEFAULT_SUBJECT_COLOR)
+
+    return {
+        'date': slot['date'],
+        'startTime': slot['startTime'],
+        'endTime': slot['endTime'],
+        'subject': name,
+        'color': color,
+        'status': 'pending',
+        'slot_id': new_slot_id(),
+    }
+
+
+def generate_schedule(subjects, study_slots, strategy=None):
+    """
+    จัดวิชาลง Slot ด้วย Strategy ที่เลือก (ค่าเริ่มต้น: weighted)
+    """
+    if not subjects or not study_slots:
+        return []
+
+    order = get_strategy(strategy).assign(subjects, study_slots)
+    return [
+        build_session(slot, subjects[idx] if idx is not None else None)
+        for slot, idx in zip(study_slots, order)
+    ]
@@ -0,0 +1,77 @@
+from datetime import date, datetime, timedelta
+
+import pytz
+
+
+def time_to_minutes(time_str):
+
+    try:
+        hours, minutes = map(int, time_str.split(':'))
+        return (hours * 60) + minutes
+    except Exception:
+        return 0
+
+def minutes_to_time(total_minutes):
+
+    hours = total_minutes // 60
+    minutes = total_minutes % 60
+    return f"{hours:02d}:{minutes:02d}"
+
+def is_time_overlap(start1, end1, start2, end2):
+
+    return max(start1, start2) < min(end1, end2)
+
+def session_minutes(start_time, end_time):
+    """ความยาว Session เป็นนาที (ข้ามเที่ยงคืนได้)"""
+    diff = time_to_minutes(end_time) - time_to_minutes(start_time)
+    return diff + 24 * 60 if diff < 0 else diff
+
+
+THAI_TZ = pytz.timezone('Asia/Bangkok')
+EPOCH_DATE = date(1970, 1, 1)
+
+
+def normalize_date_str(value):
+    """แปลงวันที่ที่เก็บได้หลายแบบ (string / ISO / datetime) ให้เป็น 'YYYY-MM-DD'"""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    return str(value).split("T")[0].strip()
+
+
+def day_number(date_str):
+    """เลขวัน (จำนวนวันนับจาก 1970-01-01) ใช้ทำ index / query ช่วงวันที่"""
+    return (datetime.strptime(date_str, "%Y-%m-%d").date() - EPOCH_DATE).days
+
+
+def day_number_to_date_str(number):
+    return (EPOCH_DATE + timedelta(days=number)).strftime("%Y-%m-%d")
+
+
+def utc_now():
+    """เวลาปัจจุบันแบบมี timezone (UTC) แทน datetime.utcnow() ที่ deprecated"""
+    return datetime.now(pytz.utc)
+
+
+def local_to_utc(date_str, minutes):
+    local_midnight = THAI_TZ.localize(datetime.strptime(date_str, "%Y-%m-%d"))
+    return (local_midnight + timedelta(minutes=minutes)).astimezone(pytz.utc)
+
+
+def session_time_fields(date_value, start_time, end_time):
+    """
+    ฟิลด์เวลาแบบ canonical ของ study_sessions
+    date (YYYY-MM-DD), day (int), starts_at / ends_at (UTC datetime), duration_minutes (int)
+    """
+    date_str = normalize_date_str(date_value)
+    start_min = time_to_minutes(start_time)
+    end_min = time_to_minutes(end_time)
+    if end_min <= start_min:
+        end_min += 24 * 60
+
+    return {
+        "date": date_str,
+        "day": day_number(date_str),
+        "starts_at": local_to_utc(date_str, start_min),
+        "ends_at": local_to_utc(date_str, end_min),
+        "duration_minutes": session_minutes(start_time, end_time),
+    }
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# รันจาก backend/ ได้ทั้ง `python -m pytest` และ `pytest` (import แบบ from database import ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RUN_MIGRATIONS", "0")
+os.environ.setdefault("RUN_BACKGROUND_JOBS", "0")
@@ -0,0 +1,38 @@
+import random
+
+from scheduling.allocator import allocate_slots, apportion, interleave
+
+
+def test_apportion_sums_to_total_and_follows_weights():
+    counts = apportion([5, 3, 2], 10)
+    assert counts == [5, 3, 2]
+    assert sum(apportion([7, 2, 1], 13)) == 13
+
+
+def test_apportion_gives_remainder_to_higher_weight_on_tie():
+    # เศษเท่ากันทุกวิชา: วิชาที่ weight สูงกว่าได้ก่อน
+    assert apportion([2, 1, 1], 2) == [1, 1, 0]
+    assert apportion([1, 1, 1], 2) == [1, 1, 0]
+
+
+def test_apportion_empty_cases():
+    assert apportion([3, 2], 0) == [0, 0]
+    assert apportion([0, 0], 5) == [0, 0]
+    assert apportion([], 5) == []
+
+
+def test_interleave_avoids_adjacent_repeats_when_possible():
+    order = interleave([3, 3, 2], random.Random(1))
+    assert sorted(order) == [0, 0, 0, 1, 1, 1, 2, 2]
+    assert all(a != b for a, b in zip(order, order[1:]))
+
+
+def test_interleave_repeats_only_when_forced():
+    order = interleave([3, 1], random.Random(1))
+    assert order == [0, 1, 0, 0]
+
+
+def test_allocate_slots_pads_with_none_when_no_weight():
+    assert allocate_slots([0, 0], 3) == [None, None, None]
+    order = allocate_slots([1, 1], 4, random.Random(2))
+    assert sorted(order) == [0, 0, 1, 1]
@@ -0,0 +1,54 @@
+from scheduling.availability import (
+    DEFAULT_SLOT_MINUTES,
+    build_available_slots,
+    cut_slots,
+    free_windows,
+    group_fixed_schedules,
+    merge_intervals,
+    parse_slot_minutes,
+)
+
+
+def test_merge_intervals_joins_overlapping_and_touching():
+    assert merge_intervals([(60, 120), (0, 30), (30, 45), (100, 150), (200, 200)]) == [(0, 45), (60, 150)]
+
+
+def test_free_windows_sweeps_busy_ranges():
+    busy = [(0, 480), (600, 660), (700, 800), (1300, 1400)]
+    assert free_windows(540, 1200, busy) == [(540, 600), (660, 700), (800, 1200)]
+
+
+def test_free_windows_busy_covers_whole_day():
+    assert free_windows(540, 600, [(500, 700)]) == []
+
+
+def test_cut_slots_drops_partial_tail():
+    assert cut_slots([(0, 150), (200, 230)], 60) == [(0, 60), (60, 120)]
+
+
+def test_group_fixed_schedules_merges_per_day():
+    grouped = group_fixed_schedules([
+        {"day": "Monday", "startTime": "09:00", "endTime": "10:00"},
+        {"day": "Monday", "startTime": "09:30", "endTime": "11:00"},
+        {"day": "Tuesday", "startTime": "13:00", "endTime": "14:00"},
+    ])
+    assert grouped == {"Monday": [(540, 660)], "Tuesday": [(780, 840)]}
+
+
+def test_build_available_slots_skips_busy_time_and_exam_day():
+    study_days = [
+        {"date": "2026-10-19", "startTime": "08:00", "endTime": "12:00"},  # Monday
+        {"date": "2026-10-20T00:00:00", "startTime": "08:00", "endTime": "10:00"},  # วันสอบ
+    ]
+    slots = build_available_slots(study_days, {"Monday": [(540, 660)]}, exam_date_str="2026-10-20")
+    assert slots == [
+        {"date": "2026-10-19", "startTime": "08:00", "endTime": "09:00"},
+        {"date": "2026-10-19", "startTime": "11:00", "endTime": "12:00"},
+    ]
+
+
+def test_parse_slot_minutes_falls_back_to_default():
+    assert parse_slot_minutes("45") == 45
+    assert parse_slot_minutes("0") == DEFAULT_SLOT_MINUTES
+    assert parse_slot_minutes(None) == DEFAULT_SLOT_MINUTES
+    assert parse_slot_minutes("abc") == DEFAULT_SLOT_MINUTES
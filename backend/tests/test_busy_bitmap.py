@@ -0,0 +1,113 @@
+import random
+
+import pytest
+
+from scheduling import busy_bitmap
+from scheduling.availability import cut_slots, free_windows
+from scheduling.busy_bitmap import WEEKDAYS, WeeklyAvailability
+
+
+FIXED = [
+    {"day": "Monday", "startTime": "09:00", "endTime": "10:00"},
+    {"day": "Monday", "startTime": "09:30", "endTime": "11:00"},
+    {"day": "Sunday", "startTime": "23:00", "endTime": "23:59"},
+]
+
+
+class FakeBitmaps:
+    """availability_bitmaps ในหน่วยความจำ (เฉพาะ method ที่ busy_bitmap ใช้)"""
+
+    def __init__(self):
+        self.docs = {}
+        self.reads = []
+
+    def find_one(self, query, projection):
+        self.reads.append(set(projection))
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc else None
+
+    def find_one_and_update(self, query, update, projection, upsert, return_document):
+        doc = self.docs.setdefault(query["_id"], {"_id": query["_id"]})
+        doc.update(update["$set"])
+        doc["version"] = doc.get("version", 0) + update["$inc"]["version"]
+        return {"_id": doc["_id"], "version": doc["version"]}
+
+
+class FakeFixed:
+
+    def __init__(self, schedules):
+        self.schedules = schedules
+
+    def find(self, query, projection):
+        return list(self.schedules)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(busy_bitmap, "_availability_cache", busy_bitmap._LRUCache(maxsize=16, ttl_seconds=300))
+
+
+def test_busy_intervals_are_merged_per_weekday():
+    availability = WeeklyAvailability.from_fixed_schedules(FIXED)
+    assert availability.busy_intervals(0) == [(540, 660)]
+    assert availability.busy_intervals(6) == [(1380, 1439)]
+    assert availability.busy_intervals(2) == []
+    assert availability.by_weekday_name()["Monday"] == [(540, 660)]
+    assert set(availability.by_weekday_name()) == set(WEEKDAYS)
+
+
+def test_bytes_round_trip():
+    availability = WeeklyAvailability.from_fixed_schedules(FIXED)
+    raw = availability.to_bytes()
+    assert len(raw) == 7 * busy_bitmap.BYTES_PER_DAY
+    assert WeeklyAvailability.from_bytes(raw).day_masks == availability.day_masks
+
+
+def test_is_busy_and_is_free_test_bits():
+    availability = WeeklyAvailability.from_fixed_schedules(FIXED)
+    assert availability.is_busy(0, 540)
+    assert availability.is_busy(0, 659)
+    assert not availability.is_busy(0, 660)
+    assert not availability.is_busy(0, 539)
+    assert availability.is_free(0, 480, 540)
+    assert not availability.is_free(0, 480, 541)
+    assert availability.is_free(0, 660, 720)
+
+
+def test_free_slots_matches_sweep():
+    rng = random.Random(7)
+    for _ in range(200):
+        busy = []
+        for _ in range(rng.randint(0, 6)):
+            start = rng.randint(0, 1400)
+            busy.append({"day": "Monday", "startTime": "%02d:%02d" % divmod(start, 60),
+                         "endTime": "%02d:%02d" % divmod(min(1439, start + rng.randint(1, 180)), 60)})
+        availability = WeeklyAvailability.from_fixed_schedules(busy)
+        day_start, day_end = sorted(rng.sample(range(0, 1440), 2))
+        slot = rng.choice([30, 45, 60, 90])
+
+        expected = cut_slots(free_windows(day_start, day_end, availability.busy_intervals(0)), slot)
+        assert availability.free_slots(0, day_start, day_end, slot) == expected
+
+
+def test_load_builds_bitmap_from_fixed_schedule_once():
+    bitmaps = FakeBitmaps()
+    availability = busy_bitmap.load_user_availability(bitmaps, FakeFixed(FIXED), "u1")
+    assert availability.busy_intervals(0) == [(540, 660)]
+    assert bitmaps.docs["u1"]["version"] == 1
+
+    # cache hit อ่านแค่ version ไม่ดึง bitmap
+    assert busy_bitmap.load_user_availability(bitmaps, FakeFixed([]), "u1") is availability
+    assert bitmaps.reads[-1] == {"version"}
+
+
+def test_cache_hit_is_dropped_when_another_process_saved_newer_schedule():
+    bitmaps = FakeBitmaps()
+    busy_bitmap.load_user_availability(bitmaps, FakeFixed(FIXED), "u1")
+
+    # process อื่นบันทึก Fixed Schedule ใหม่ (ไม่ผ่าน cache ของ process นี้)
+    newer = WeeklyAvailability.from_fixed_schedules([{"day": "Monday", "startTime": "13:00", "endTime": "14:00"}])
+    bitmaps.docs["u1"].update({"bitmap": busy_bitmap.Binary(newer.to_bytes()), "version": 2})
+
+    availability = busy_bitmap.load_user_availability(bitmaps, FakeFixed(FIXED), "u1")
+    assert availability.busy_intervals(0) == [(780, 840)]
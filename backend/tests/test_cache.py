@@ -0,0 +1,75 @@
+import pytest
+
+from database import cache as cache_module
+from database.cache import InProcessBackend, ReadThroughCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    state = {"now": 1000.0}
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: state["now"])
+    return state
+
+
+def loader(calls, value):
+    def load():
+        calls.append(value)
+        return value
+    return load
+
+
+def test_read_through_loads_once_then_hits(clock):
+    cache = ReadThroughCache(InProcessBackend(), default_ttl=60)
+    calls = []
+
+    assert cache.get_or_load("u1", "plans", "list", loader(calls, [1])) == [1]
+    assert cache.get_or_load("u1", "plans", "list", loader(calls, [2])) == [1]
+    assert calls == [[1]]
+    assert cache.stats()["groups"]["plans"] == {"hits": 1, "misses": 1, "invalidations": 0, "hit_rate": 0.5}
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ReadThroughCache(InProcessBackend(), default_ttl=60)
+    calls = []
+    cache.get_or_load("u1", "plans", "list", loader(calls, "a"))
+
+    clock["now"] += 61
+    assert cache.get_or_load("u1", "plans", "list", loader(calls, "b")) == "b"
+
+
+def test_callable_ttl_is_computed_from_the_loaded_value(clock):
+    cache = ReadThroughCache(InProcessBackend(), default_ttl=60)
+    calls = []
+    cache.get_or_load("u1", "plans", "timer", loader(calls, {"ttl": 5}), ttl=lambda v: v["ttl"])
+
+    clock["now"] += 6
+    cache.get_or_load("u1", "plans", "timer", loader(calls, {"ttl": 5}), ttl=lambda v: v["ttl"])
+    assert len(calls) == 2
+
+
+def test_invalidate_drops_only_that_users_group(clock):
+    cache = ReadThroughCache(InProcessBackend(), default_ttl=60)
+    calls = []
+    for user in ("u1", "u10"):
+        cache.get_or_load(user, "plans", "list", loader(calls, user))
+    cache.get_or_load("u1", "subjects", "list", loader(calls, "subjects"))
+
+    cache.invalidate("u1", "plans")
+
+    assert cache.get_or_load("u1", "plans", "list", loader(calls, "new")) == "new"
+    # "u1:plans:" ไม่ใช่ prefix ของ "u10:plans:"
+    assert cache.get_or_load("u10", "plans", "list", loader(calls, "new")) == "u10"
+    assert cache.get_or_load("u1", "subjects", "list", loader(calls, "new")) == "subjects"
+    assert cache.stats()["groups"]["plans"]["invalidations"] == 1
+
+
+def test_in_process_backend_evicts_least_recently_used(clock):
+    backend = InProcessBackend(maxsize=2)
+    backend.set("a", 1, 60)
+    backend.set("b", 2, 60)
+    assert backend.get("a") == (True, 1)
+    backend.set("c", 3, 60)
+
+    assert backend.get("b") == (False, None)
+    assert backend.get("a") == (True, 1)
+    assert backend.size() == 2
@@ -0,0 +1,81 @@
+import pytest
+from bson.objectid import ObjectId
+from flask import Flask
+
+from api import calender
+from api.conditional import is_not_modified, not_modified_response, plan_etag
+
+app = Flask(__name__)
+app.secret_key = "test"
+app.register_blueprint(calender.calender_bp)
+
+
+def test_etag_changes_with_version_and_query_string():
+    plan = {"_id": ObjectId(), "version": 3}
+    with app.test_request_context("/?weeks=2"):
+        etag = plan_etag(plan)
+        assert etag.startswith(f"{plan['_id']}-3-")
+        assert plan_etag({**plan, "version": 4}) != etag
+    with app.test_request_context("/?weeks=3"):
+        assert plan_etag(plan) != etag
+    with app.test_request_context("/?weeks=2"):
+        assert plan_etag(plan) == etag
+
+
+def test_is_not_modified_and_304_response():
+    with app.test_request_context("/", headers={"If-None-Match": '"abc-1-00000000", "x"'}):
+        assert is_not_modified("abc-1-00000000")
+        assert not is_not_modified("abc-2-00000000")
+
+        response = not_modified_response("abc-1-00000000")
+        assert response.status_code == 304
+        assert response.headers["ETag"] == '"abc-1-00000000"'
+        assert response.headers["Cache-Control"] == "private, no-cache"
+
+
+class FakePlans:
+    """exam_plans ในหน่วยความจำ บันทึก projection ของแต่ละ find_one"""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.projections = []
+
+    def find_one(self, query, projection=None):
+        self.projections.append(projection)
+        if query != {"_id": self.plan["_id"], "user_id": self.plan["user_id"]}:
+            return None
+        return self.plan
+
+
+@pytest.fixture
+def plans(monkeypatch):
+    plan = {"_id": ObjectId(), "user_id": ObjectId(), "version": 5, "exam_title": "Final"}
+    fake = FakePlans(plan)
+    monkeypatch.setattr(calender, "exam_plans_collection", fake)
+    return fake
+
+
+def get_plan(plans, user_id, etag):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = str(user_id)
+    return client.get(f"/calender/api/exam-plan/{plans.plan['_id']}", headers={"If-None-Match": f'"{etag}"'})
+
+
+def test_matching_etag_answers_304_from_version_only(plans):
+    with app.test_request_context("/calender/api/exam-plan/x"):
+        etag = plan_etag(plans.plan)
+
+    response = get_plan(plans, plans.plan["user_id"], etag)
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == f'"{etag}"'
+    # อ่านแค่ version ครั้งเดียว ไม่โหลดแผนเต็มหรือ Session
+    assert plans.projections == [{"version": 1}]
+
+
+def test_etag_of_another_users_plan_is_not_found(plans):
+    with app.test_request_context("/calender/api/exam-plan/x"):
+        etag = plan_etag(plans.plan)
+
+    assert get_plan(plans, ObjectId(), etag).status_code == 404
@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from notifications import dispatcher as dispatcher_module
+from notifications.dispatcher import NOTIFY_POLL_SECONDS, NotificationDispatcher
+
+
+NOW = datetime(2026, 10, 17, 12, 0)
+
+
+class Cursor(list):
+
+    def sort(self, key, direction):
+        return Cursor(sorted(self, key=lambda d: d[key]))
+
+    def limit(self, n):
+        return Cursor(self[:n])
+
+
+class FakeSessions:
+    """study_sessions ในหน่วยความจำ: นับจำนวนครั้งที่ dispatcher โหลด heap"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.loads = 0
+
+    def find(self, query, projection):
+        self.loads += 1
+        since = query["starts_at"]["$gt"]
+        return Cursor(d for d in self.docs if d["starts_at"] > since and "notified_at" not in d)
+
+
+@pytest.fixture
+def env(monkeypatch):
+    state = {"now": NOW, "version": 0, "checks": 0}
+
+    class Clock(datetime):
+        @classmethod
+        def utcnow(cls):
+            return state["now"]
+
+    def check(app):
+        if state.get("fail"):
+            raise RuntimeError("smtp down")
+        state["checks"] += 1
+
+    monkeypatch.setattr(dispatcher_module, "datetime", Clock)
+    monkeypatch.setattr(dispatcher_module, "schedule_version", lambda: state["version"])
+    monkeypatch.setattr(dispatcher_module, "check_and_send_notifications", check)
+
+    def install(docs):
+        sessions = FakeSessions(docs)
+        monkeypatch.setattr(dispatcher_module, "study_sessions_collection", sessions)
+        state["sessions"] = sessions
+        return state
+    return install
+
+
+def session(_id, minutes):
+    return {"_id": _id, "starts_at": NOW + timedelta(minutes=minutes)}
+
+
+def test_heap_sleeps_until_earliest_start_and_fires_once_per_start_time(env):
+    state = env([session(1, 10), session(2, 3), session(3, 3)])
+    d = NotificationDispatcher(app=None, horizon=10)
+
+    assert d.tick() == NOTIFY_POLL_SECONDS
+    assert [entry[1] for entry in sorted(d.heap)] == [2, 3, 1]
+
+    state["now"] = NOW + timedelta(minutes=3)
+    d.tick()
+    # Session 2 และ 3 เริ่มพร้อมกัน: เช็คครั้งเดียว
+    assert state["checks"] == 1
+    assert [entry[1] for entry in d.heap] == [1]
+    assert d.last_fired_at == NOW + timedelta(minutes=3)
+
+
+def test_failed_check_retries_same_start_time(env):
+    state = env([session(1, 0), session(2, 5)])
+    d = NotificationDispatcher(app=None, horizon=10)
+    state["fail"] = True
+
+    with pytest.raises(RuntimeError):
+        d.tick()
+    assert d.last_fired_at is None
+    assert [entry[1] for entry in sorted(d.heap)] == [1, 2]
+
+    # _run ตั้ง _changed หลัง error: โหลดใหม่ต้องยังได้ Session ที่ยิงไม่สำเร็จ
+    d._changed = True
+    state["fail"] = False
+    d.tick()
+    assert state["checks"] == 1
+    assert d.last_fired_at == NOW
+    assert [entry[1] for entry in d.heap] == [2]
+
+
+def test_unmarked_sessions_do_not_cause_a_busy_loop(env):
+    # Session ในหน้าต่างแจ้งเตือนที่ไม่ถูก mark (เช่น ข้ามไป) มากกว่า horizon
+    state = env([session(i, -1) for i in range(5)])
+    d = NotificationDispatcher(app=None, horizon=2)
+
+    waits = [d.tick() for _ in range(10)]
+
+    assert state["sessions"].loads <= 3
+    assert waits[-1] == NOTIFY_POLL_SECONDS
+    assert d.exhausted
+
+
+def test_reload_returning_same_set_backs_off(env):
+    state = env([session(1, 30), session(2, 40)])
+    d = NotificationDispatcher(app=None, horizon=2)
+    d.tick()
+    assert not d.exhausted
+
+    d.heap = []
+    d.tick()
+    # โหลดใหม่ได้ชุดเดิม: ไม่โหลดซ้ำทันที รอ refresh
+    assert d.exhausted
+    assert d.tick() > 0
+    assert state["sessions"].loads == 2
+
+
+def test_schedule_version_change_reloads_and_renotifies_same_start_time(env):
+    state = env([session(1, 0)])
+    d = NotificationDispatcher(app=None, horizon=10)
+    d.tick()
+    assert state["checks"] == 1
+    loads = state["sessions"].loads
+
+    # process อื่นเพิ่ม Session ที่เริ่มเวลาเดียวกับที่ยิงไปแล้ว
+    state["sessions"].docs[0]["notified_at"] = NOW
+    state["sessions"].docs.append(session(2, 0))
+    state["now"] = NOW + timedelta(seconds=NOTIFY_POLL_SECONDS)
+    state["version"] = 1
+    d.tick()
+
+    assert state["sessions"].loads == loads + 1
+    assert state["checks"] == 2
+
+
+def test_refresh_reloads_even_without_version_change(env):
+    state = env([])
+    d = NotificationDispatcher(app=None, horizon=10, refresh_seconds=60)
+    d.tick()
+    state["now"] = NOW + timedelta(seconds=30)
+    d.tick()
+    assert state["sessions"].loads == 1
+    state["now"] = NOW + timedelta(seconds=60)
+    d.tick()
+    assert state["sessions"].loads == 2
+
+
+def test_new_leader_rechecks_a_start_time_the_old_leader_fired(env):
+    # leader เดิมล้มหลังเช็คแต่ก่อน mark: leader ใหม่ต้องเช็คเวลาเดิมอีกครั้ง (outbox กันเมลซ้ำเอง)
+    state = env([session(1, 0)])
+    NotificationDispatcher(app=None, horizon=10).tick()
+    NotificationDispatcher(app=None, horizon=10).tick()
+    assert state["checks"] == 2
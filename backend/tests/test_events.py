@@ -0,0 +1,91 @@
+from itertools import islice
+
+import pytest
+from bson.objectid import ObjectId
+from flask import Flask
+
+from api import events
+from api.events import EventFilter, Subscriber
+
+USER = ObjectId()
+app = Flask(__name__)
+
+
+def event(seq, user_id=USER):
+    return {"_id": ObjectId(), "seq": seq, "user_id": user_id, "type": "session_status", "data": {"n": seq}}
+
+
+class Cursor(list):
+
+    def sort(self, key, direction):
+        return Cursor(sorted(self, key=lambda d: d[key]))
+
+
+class FakeEvents:
+    """user_events ในหน่วยความจำ: docs เรียงตาม $natural (ลำดับ insert)"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find_one(self, query, projection, sort):
+        return self.docs[0] if self.docs else None
+
+    def find(self, query):
+        return Cursor(d for d in self.docs if d["user_id"] == query["user_id"] and d["seq"] > query["seq"]["$gt"])
+
+
+class FakeTailer:
+
+    def __init__(self, live):
+        self.subscriber = Subscriber(USER, 16)
+        for doc in live:
+            self.subscriber.push(doc)
+
+    def subscribe(self, user_oid):
+        return self.subscriber
+
+    def unsubscribe(self, subscriber):
+        pass
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    def open_stream(stored, live, last_seq, count):
+        monkeypatch.setattr(events, "user_events_collection", FakeEvents(stored))
+        monkeypatch.setattr(events, "tailer", FakeTailer(live))
+        monkeypatch.setattr(events, "AWAIT_MS", 1)
+        with app.app_context():
+            return list(islice(events.event_stream(USER, last_seq), count))
+    return open_stream
+
+
+def ids(messages):
+    return [int(m.split("\n")[0][len("id: "):]) for m in messages if m.startswith("id: ")]
+
+
+def test_filter_accepts_late_lower_seq_once():
+    events_filter = EventFilter(floor=10)
+    assert [events_filter.accept(s) for s in (12, 11, 12, 10, 13)] == [True, True, False, False, True]
+
+
+def test_filter_stays_bounded():
+    events_filter = EventFilter(floor=0)
+    for seq in range(1, 1000):
+        assert events_filter.accept(seq)
+    assert len(events_filter.seen) <= 4 * events.RESUME_SLACK
+    assert not events_filter.accept(1)
+
+
+def test_replays_missed_events_by_seq_then_skips_them_live(stream):
+    # seq 7 ถูก insert หลัง seq 8 (insert ช้ากว่า) ยังต้องได้รับ และไม่ส่งซ้ำจาก tailer
+    stored = [event(5), event(6), event(8), event(7), event(9, ObjectId())]
+    live = [stored[2], stored[3], event(10)]
+
+    messages = stream(stored, live, last_seq=5, count=4)
+
+    assert ids(messages) == [6, 7, 8, 10]
+
+
+def test_resync_when_next_event_was_overwritten(stream):
+    messages = stream([event(9), event(10)], [], last_seq=5, count=1)
+    assert messages[0].startswith("event: resync")
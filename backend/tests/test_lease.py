@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import lease
+
+
+NOW = datetime(2026, 10, 17, 12, 0)
+MISSING = object()
+
+
+class FakeLeases:
+    """leases ในหน่วยความจำ: ประเมิน update pipeline ด้วย operator ชุดที่ acquire_lease ใช้"""
+
+    def __init__(self):
+        self.docs = {}
+        self.now = NOW
+
+    def evaluate(self, expr, doc):
+        if isinstance(expr, str):
+            if expr == "$$NOW":
+                return self.now
+            if expr.startswith("$"):
+                return doc.get(expr[1:], MISSING)
+            return expr
+        if isinstance(expr, dict):
+            (op, args), = expr.items()
+            if op == "$literal":
+                return args
+            if op == "$type":
+                return "missing" if self.evaluate(args, doc) is MISSING else "other"
+            values = [self.evaluate(arg, doc) for arg in args]
+            if op == "$or":
+                return any(values)
+            if op == "$eq":
+                return values[0] == values[1]
+            if op == "$lt":
+                return values[0] is MISSING or values[0] < values[1]
+            if op == "$cond":
+                return values[1] if values[0] else values[2]
+            if op == "$add":
+                return values[0] + timedelta(milliseconds=values[1])
+            raise AssertionError(f"unsupported operator {op}")
+        return expr
+
+    def find_one_and_update(self, query, pipeline, projection=None, upsert=False, return_document=None):
+        # MongoDB ไม่รับ $expr ใน filter ของ upsert
+        assert not (upsert and "$expr" in query)
+        doc = self.docs.get(query["_id"])
+        if doc is None:
+            if not upsert:
+                return None
+            doc = {"_id": query["_id"]}
+        for stage in pipeline:
+            updates = {field: self.evaluate(expr, doc) for field, expr in stage["$set"].items()}
+            doc = {**doc, **{k: v for k, v in updates.items() if v is not MISSING}}
+        self.docs[doc["_id"]] = doc
+        return doc
+
+    def delete_one(self, query):
+        doc = self.docs.get(query["_id"])
+        if doc is not None and doc.get("holder") == query["holder"]:
+            del self.docs[query["_id"]]
+
+
+@pytest.fixture
+def leases(monkeypatch):
+    fake = FakeLeases()
+    monkeypatch.setattr(lease, "leases_collection", fake)
+    return fake
+
+
+def test_acquire_creates_lease_and_renews_own(leases):
+    assert lease.acquire_lease("jobs", "a", ttl_seconds=15)
+    assert leases.docs["jobs"]["expires_at"] == NOW + timedelta(seconds=15)
+
+    leases.now = NOW + timedelta(seconds=10)
+    assert lease.acquire_lease("jobs", "a", ttl_seconds=15)
+    assert leases.docs["jobs"]["expires_at"] == NOW + timedelta(seconds=25)
+
+
+def test_other_holder_cannot_take_live_lease(leases):
+    assert lease.acquire_lease("jobs", "a", ttl_seconds=15)
+    leases.now = NOW + timedelta(seconds=14)
+
+    assert not lease.acquire_lease("jobs", "b", ttl_seconds=15)
+    assert leases.docs["jobs"]["holder"] == "a"
+    assert leases.docs["jobs"]["expires_at"] == NOW + timedelta(seconds=15)
+
+
+def test_expired_lease_is_stolen_and_old_holder_loses_it(leases):
+    assert lease.acquire_lease("jobs", "a", ttl_seconds=15)
+    leases.now = NOW + timedelta(seconds=16)
+
+    assert lease.acquire_lease("jobs", "b", ttl_seconds=15)
+    assert leases.docs["jobs"]["holder"] == "b"
+    assert not lease.acquire_lease("jobs", "a", ttl_seconds=15)
+
+
+def test_released_lease_can_be_acquired_by_another_holder(leases):
+    assert lease.acquire_lease("jobs", "a")
+    lease.release_lease("jobs", "a")
+    assert lease.acquire_lease("jobs", "b")
+
+
+class StopAfter:
+    """แทน threading.Event ของ LeaderElector: หยุด _run หลังวน n รอบ"""
+
+    def __init__(self, rounds):
+        self.rounds = rounds
+
+    def is_set(self):
+        return self.rounds <= 0
+
+    def wait(self, timeout):
+        self.rounds -= 1
+
+
+def test_failed_on_elected_steps_down_and_releases_lease(leases):
+    calls = []
+
+    def on_elected():
+        calls.append("elected")
+        raise RuntimeError("scheduler failed to start")
+
+    elector = lease.LeaderElector("jobs", on_elected, lambda: calls.append("lost"))
+    elector._stop = StopAfter(1)
+    elector._run()
+
+    assert calls == ["elected", "lost"]
+    assert not elector.is_leader
+    assert "jobs" not in leases.docs
+    assert lease.acquire_lease("jobs", "other")
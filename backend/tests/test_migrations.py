@@ -0,0 +1,139 @@
+from bson.objectid import ObjectId
+from pymongo.errors import OperationFailure
+
+from database import migrations
+from database.migrations import Migration
+
+
+class Cursor(list):
+
+    def sort(self, key, direction):
+        return Cursor(sorted(self, key=lambda d: d[key]))
+
+    def limit(self, n):
+        return Cursor(self[:n])
+
+
+def matches(doc, query):
+    for key, cond in query.items():
+        if isinstance(cond, dict):
+            if "$exists" in cond and (key in doc) != cond["$exists"]:
+                return False
+            if "$gt" in cond and not (key in doc and doc[key] > cond["$gt"]):
+                return False
+            if "$type" in cond and not isinstance(doc.get(key), int):
+                return False
+        elif doc.get(key) != cond:
+            return False
+    return True
+
+
+class FakeCollection:
+    """collection ในหน่วยความจำ รองรับเฉพาะสิ่งที่ migrations.py ใช้"""
+
+    def __init__(self):
+        self.docs = []
+        self.bulk_writes = 0
+
+    def find(self, query, projection=None):
+        return Cursor(dict(d) for d in self.docs if matches(d, query))
+
+    def find_one(self, query):
+        return next(iter(self.find(query)), None)
+
+    def update_one(self, query, update, upsert=False):
+        doc = self.find_one_doc(query)
+        if doc is None and upsert:
+            doc = {"_id": query["_id"]}
+            self.docs.append(doc)
+        if doc is not None:
+            doc.update(update["$set"])
+
+    def find_one_doc(self, query):
+        return next((d for d in self.docs if matches(d, query)), None)
+
+    def bulk_write(self, ops, ordered):
+        self.bulk_writes += 1
+        for op in ops:
+            self.find_one_doc(op._filter).update(op._doc["$set"])
+        return type("Result", (), {"modified_count": len(ops)})()
+
+
+class FakeDb(dict):
+
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+
+def recorder(applied, version, error=None):
+    def run(db):
+        if error:
+            raise error
+        applied.append(version)
+    return run
+
+
+def test_runs_pending_migrations_in_order_and_records_them(monkeypatch):
+    db, ran = FakeDb(), []
+    monkeypatch.setattr(migrations, "MIGRATIONS", [
+        Migration(2, "second", run=recorder(ran, 2)),
+        Migration(1, "first", run=recorder(ran, 1)),
+    ])
+
+    assert migrations.run_migrations(db, log=lambda msg: None) == [1, 2]
+    assert ran == [1, 2]
+    assert migrations.applied_versions(db) == {1, 2}
+
+    # รอบถัดไปไม่รันซ้ำ
+    assert migrations.run_migrations(db, log=lambda msg: None) == []
+    assert ran == [1, 2]
+
+
+def test_stops_at_failed_migration_but_skips_optional(monkeypatch):
+    db, ran = FakeDb(), []
+    monkeypatch.setattr(migrations, "MIGRATIONS", [
+        Migration(1, "optional", run=recorder(ran, 1, OperationFailure("no time-series")), optional=True),
+        Migration(2, "ok", run=recorder(ran, 2)),
+        Migration(3, "broken", run=recorder(ran, 3, OperationFailure("boom"))),
+        Migration(4, "after broken", run=recorder(ran, 4)),
+    ])
+
+    assert migrations.run_migrations(db, log=lambda msg: None) == [2]
+    assert migrations.applied_versions(db) == {2}
+
+
+def test_legacy_named_checkpoints_are_not_counted_as_versions():
+    db = FakeDb()
+    db[migrations.MIGRATIONS_COLLECTION].docs = [{"_id": 1}, {"_id": "backfill_session_times"}]
+    assert migrations.applied_versions(db) == {1}
+
+
+def test_expected_indexes_follow_drops():
+    expected = migrations.expected_indexes()
+    for migration in migrations.MIGRATIONS:
+        for collection, name in migration.drop_indexes:
+            assert name not in expected.get(collection, {})
+
+
+def session(date="2026-10-17"):
+    return {"_id": ObjectId(), "date": date, "startTime": "09:00", "endTime": "10:30"}
+
+
+def test_backfill_fills_time_fields_in_batches_and_resumes_from_checkpoint():
+    db = FakeDb()
+    sessions = db["study_sessions"]
+    sessions.docs = sorted([session() for _ in range(5)] + [session("not a date")], key=lambda d: d["_id"])
+
+    # หยุดกลางทาง: checkpoint ชี้ไปที่ document ที่ 2 แล้ว
+    db[migrations.CHECKPOINTS_COLLECTION].docs = [
+        {"_id": "backfill_session_times", "last_id": sessions.docs[1]["_id"], "updated": 2}
+    ]
+    migrations.backfill_session_times(db, batch_size=2, log=lambda msg: None)
+
+    assert ["day" in d for d in sessions.docs] == [False, False, True, True, True, False]
+    assert sessions.docs[2]["duration_minutes"] == 90
+    checkpoint = db[migrations.CHECKPOINTS_COLLECTION].docs[0]
+    assert checkpoint["last_id"] == sessions.docs[-1]["_id"]
+    assert checkpoint["updated"] == 5
+    assert sessions.bulk_writes == 2
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from notifications import outbox
+
+
+def matches(doc, query):
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = doc.get(key)
+            for op, arg in cond.items():
+                if op == "$lte" and not (value is not None and value <= arg):
+                    return False
+                if op == "$lt" and not (value is not None and value < arg):
+                    return False
+        elif doc.get(key) != cond:
+            return False
+    return True
+
+
+class FakeOutbox:
+    """notification_outbox ในหน่วยความจำ รองรับเฉพาะ query ที่ outbox.py ใช้"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def _apply(self, doc, update):
+        doc.update(update.get("$set", {}))
+        for key, amount in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + amount
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+
+    def find_one_and_update(self, query, update, sort, return_document):
+        candidates = sorted((d for d in self.docs if matches(d, query)), key=lambda d: d[sort[0][0]])
+        if not candidates:
+            return None
+        self._apply(candidates[0], update)
+        return dict(candidates[0])
+
+    def update_one(self, query, update):
+        for doc in self.docs:
+            if matches(doc, query):
+                self._apply(doc, update)
+                return SimpleNamespace(matched_count=1)
+        return SimpleNamespace(matched_count=0)
+
+
+NOW = datetime(2026, 10, 17, 12, 0)
+
+
+def job(_id, **fields):
+    return {"_id": _id, "recipient": f"{_id}@x.com", "status": "queued", "attempts": 0,
+            "next_attempt_at": NOW - timedelta(minutes=1), **fields}
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    def install(docs):
+        collection = FakeOutbox(docs)
+        monkeypatch.setattr(outbox, "outbox_collection", collection)
+        return collection
+    return install
+
+
+def test_retry_delay_grows_exponentially_with_jitter_and_cap(monkeypatch):
+    monkeypatch.setattr(outbox.random, "uniform", lambda low, high: 1.0)
+    assert [outbox.retry_delay(n).total_seconds() for n in (1, 2, 3)] == [30, 60, 120]
+    assert outbox.retry_delay(20).total_seconds() == outbox.RETRY_MAX_SECONDS
+
+    monkeypatch.setattr(outbox.random, "uniform", lambda low, high: low)
+    assert outbox.retry_delay(1).total_seconds() == pytest.approx(24)
+
+
+def test_claim_batch_takes_due_jobs_in_order_and_expired_leases(fake):
+    collection = fake([
+        job(1, next_attempt_at=NOW - timedelta(minutes=5)),
+        job(2, next_attempt_at=NOW + timedelta(minutes=5)),  # ยังไม่ถึงเวลา retry
+        job(3, status="sending", attempts=1, locked_until=NOW - timedelta(seconds=1),
+            next_attempt_at=NOW - timedelta(minutes=10)),  # worker เดิมค้างเกิน lease
+        job(4, status="sending", attempts=1, locked_until=NOW + timedelta(minutes=1)),
+    ])
+
+    jobs = outbox.claim_batch(10, NOW)
+
+    assert [j["_id"] for j in jobs] == [3, 1]
+    assert [j["attempts"] for j in jobs] == [2, 1]
+    assert all(j["locked_until"] == NOW + outbox.SENDING_LEASE for j in jobs)
+    assert collection.docs[1]["status"] == "queued"
+
+
+def test_claim_batch_respects_limit(fake):
+    fake([job(i) for i in range(5)])
+    assert len(outbox.claim_batch(3, NOW)) == 3
+
+
+def test_mark_failed_reschedules_then_gives_up(fake, monkeypatch):
+    monkeypatch.setattr(outbox.random, "uniform", lambda low, high: 1.0)
+    collection = fake([job(1, status="sending", attempts=1, locked_until=NOW)])
+
+    assert outbox.mark_failed(collection.docs[0], OSError("down")) == "queued"
+    assert "locked_until" not in collection.docs[0]
+    assert collection.docs[0]["next_attempt_at"] > collection.docs[0]["last_attempt_at"]
+
+    collection.docs[0]["attempts"] = outbox.MAX_ATTEMPTS
+    assert outbox.mark_failed(collection.docs[0], OSError("down")) == "failed"
+
+
+def test_extend_lease_refuses_job_reclaimed_by_another_worker(fake):
+    collection = fake([job(1)])
+    mine = outbox.claim_batch(1, NOW)[0]
+    assert outbox.extend_lease(mine, NOW + timedelta(minutes=1))
+    assert collection.docs[0]["locked_until"] == NOW + timedelta(minutes=1) + outbox.SENDING_LEASE
+
+    # lease หมดระหว่างรอ token bucket แล้ว worker อื่นหยิบไป (attempts เพิ่ม)
+    later = NOW + timedelta(minutes=10)
+    assert outbox.claim_batch(1, later)[0]["attempts"] == 2
+    assert not outbox.extend_lease(mine, later)
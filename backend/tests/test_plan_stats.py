@@ -0,0 +1,97 @@
+import pytest
+
+from database import repositories
+from database.repositories import PlanStatsRepository
+
+
+def apply_inc(doc, inc):
+    for path, value in inc.items():
+        target = doc
+        *parents, field = path.split(".")
+        for key in parents:
+            target = target.setdefault(key, {})
+        target[field] = target.get(field, 0) + value
+
+
+class FakeStats:
+    """plan_stats ในหน่วยความจำ: $inc แบบ dotted path, ไม่ upsert"""
+
+    def __init__(self):
+        self.docs = {}
+        self.bulk_writes = 0
+
+    def bulk_write(self, ops, ordered):
+        self.bulk_writes += 1
+        for op in ops:
+            doc = self.docs.get(op._filter["_id"])
+            if doc is not None:
+                apply_inc(doc, op._doc["$inc"])
+
+    def replace_one(self, query, doc, upsert):
+        self.docs[query["_id"]] = dict(doc)
+
+
+class FakeSessions:
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        return [d for d in self.docs if d["exam_id"] == query["exam_id"]]
+
+
+def session(date, status="pending", exam_id="p1", minutes=60):
+    return {"exam_id": exam_id, "date": date, "status": status, "duration_minutes": minutes}
+
+
+@pytest.fixture
+def stats():
+    repo = PlanStatsRepository("plan_stats")
+    repo._collection = FakeStats()
+    return repo
+
+
+def counters(doc):
+    # $inc ไม่สร้างตัวนับที่เป็น 0 ผู้อ่าน (home.py) ใช้ค่า default 0 อยู่แล้ว
+    days = {day: {"total": 0, "completed": 0, **c} for day, c in doc["days"].items()}
+    return {"days": days, "completed_minutes": doc["completed_minutes"]}
+
+
+def test_incremental_counters_match_a_rebuild(stats, monkeypatch):
+    docs = [session("2026-10-17"), session("2026-10-17", "completed", minutes=90), session("2026-10-18")]
+    stats.init_plan("p1")
+    stats.apply_sessions(docs, 1)
+
+    docs[0]["status"] = "completed"
+    docs[1]["status"] = "pending"
+    stats.apply_completion_changes([(docs[0], 1), (docs[1], -1)])
+    incremental = counters(stats.collection.docs["p1"])
+
+    monkeypatch.setattr(repositories, "study_sessions", FakeSessions(docs))
+    assert counters(stats.rebuild("p1")) == incremental == {
+        "days": {"2026-10-17": {"total": 2, "completed": 1}, "2026-10-18": {"total": 1, "completed": 0}},
+        "completed_minutes": 60,
+    }
+
+
+def test_sessions_are_grouped_per_plan_in_one_write(stats):
+    stats.init_plan("p1")
+    stats.init_plan("p2")
+    stats.apply_sessions([session("2026-10-17"), session("2026-10-17", exam_id="p2")], 1)
+
+    assert stats.collection.bulk_writes == 1
+    assert stats.collection.docs["p2"]["days"] == {"2026-10-17": {"total": 1}}
+
+
+def test_changes_that_cancel_out_write_nothing(stats):
+    doc = session("2026-10-17")
+    stats.apply_completion_changes([(doc, 1), (doc, -1)])
+    stats.apply_sessions([session("2026-10-17", exam_id=None)], 1)
+    assert stats.collection.bulk_writes == 0
+
+
+def test_missing_duration_falls_back_to_start_and_end_time(stats):
+    stats.init_plan("p1")
+    doc = {"exam_id": "p1", "date": "2026-10-17", "startTime": "09:00", "endTime": "10:30"}
+    stats.apply_completion_changes([(doc, 1)])
+    assert stats.collection.docs["p1"]["completed_minutes"] == 90
@@ -0,0 +1,49 @@
+from bson.objectid import ObjectId
+from flask import Flask
+
+from api import scheduler_jobs
+
+app = Flask(__name__)
+
+
+class FakeCollection:
+
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.writes = []
+
+    def find(self, query, projection):
+        ids = query["_id"]["$in"]
+        return [d for d in self.docs if d["_id"] in ids]
+
+    def update_many(self, query, update):
+        self.writes.append((sorted(query["_id"]["$in"]), update["$set"]))
+
+
+def test_due_sessions_are_marked_in_one_write_per_outcome(monkeypatch):
+    user, no_email_user = ObjectId(), ObjectId()
+    active, inactive = ObjectId(), ObjectId()
+    due = [
+        {"_id": 1, "exam_id": active, "user_id": user},
+        {"_id": 2, "exam_id": active, "user_id": user},
+        {"_id": 3, "exam_id": inactive, "user_id": user},
+        {"_id": 4, "exam_id": active, "user_id": no_email_user},
+    ]
+    sessions = FakeCollection()
+    queued, woken = [], []
+    monkeypatch.setattr(scheduler_jobs, "find_due_sessions", lambda now: due)
+    monkeypatch.setattr(scheduler_jobs, "study_sessions_collection", sessions)
+    monkeypatch.setattr(scheduler_jobs, "exam_plans_collection", FakeCollection([{"_id": active}]))
+    monkeypatch.setattr(scheduler_jobs, "users_collection", FakeCollection([{"_id": user, "email": "a@b.c"}]))
+    monkeypatch.setattr(scheduler_jobs, "enqueue_notification", lambda *a, **kw: queued.append(kw["session_id"]) or True)
+    monkeypatch.setattr(scheduler_jobs, "wake_workers", lambda: woken.append(True))
+
+    scheduler_jobs.check_and_send_notifications(app)
+
+    assert queued == [1, 2]
+    assert woken == [True]
+    assert [(ids, sorted(fields)) for ids, fields in sessions.writes] == [
+        ([1, 2], ["notified_at"]),
+        ([3], ["notified_at", "notify_skipped"]),
+        ([4], ["notified_at", "notify_skipped"]),
+    ]
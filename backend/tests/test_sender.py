@@ -0,0 +1,89 @@
+import contextlib
+import threading
+import time
+
+from pymongo.errors import AutoReconnect
+
+from notifications import sender
+
+
+class FakeApp:
+
+    def app_context(self):
+        return contextlib.nullcontext()
+
+
+class FakeConnection:
+    host = None
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+def wait_until(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_worker_survives_errors_from_send_batch(monkeypatch):
+    batches = [[{"_id": 1}], [{"_id": 2}]]
+    monkeypatch.setattr(sender.outbox, "claim_batch", lambda limit: batches.pop(0) if batches else [])
+    monkeypatch.setattr(sender, "ERROR_BACKOFF_SECONDS", 0)
+    pool = sender.OutboxWorkerPool(FakeApp(), size=1)
+    handled = []
+
+    def send_batch(jobs):
+        handled.append(jobs[0]["_id"])
+        if jobs[0]["_id"] == 1:
+            raise AutoReconnect("primary stepped down")
+
+    monkeypatch.setattr(pool, "send_batch", send_batch)
+    pool.start()
+    try:
+        assert wait_until(lambda: handled == [1, 2])
+        assert pool._threads[0].is_alive()
+    finally:
+        pool.stop(1)
+
+
+def test_ensure_workers_replaces_dead_threads(monkeypatch):
+    pool = sender.OutboxWorkerPool(FakeApp(), size=2)
+    monkeypatch.setattr(pool, "_run", lambda: pool._stop.wait())
+    pool.start()
+    try:
+        dead = threading.Thread(target=lambda: None)
+        dead.start()
+        dead.join()
+        pool._threads[1] = dead
+
+        assert pool.ensure_workers() == 1
+        assert all(thread.is_alive() for thread in pool._threads)
+        assert pool.ensure_workers() == 0
+    finally:
+        pool.stop(1)
+
+
+def test_send_batch_skips_jobs_whose_lease_was_taken(monkeypatch):
+    connection = FakeConnection()
+    sent, recorded = [], []
+    monkeypatch.setattr(sender.outbox, "extend_lease", lambda job: job["_id"] != 2)
+    monkeypatch.setattr(sender.outbox, "mark_sent", lambda job: sent.append(job["_id"]))
+    monkeypatch.setattr(sender.outbox, "record_batch", recorded.append)
+    monkeypatch.setattr(sender, "build_notification_message", lambda *args: "message")
+    pool = sender.OutboxWorkerPool(FakeApp(), size=1, rate_per_sec=1000)
+    monkeypatch.setattr(pool, "_connect", lambda: connection)
+
+    jobs = [{"_id": i, "recipient": f"{i}@x.com", "subject": "s"} for i in (1, 2, 3)]
+    stats = pool.send_batch(jobs)
+
+    assert sent == [1, 3]
+    assert len(connection.sent) == 2
+    assert stats["skipped"] == 1 and stats["sent"] == 2
+    assert recorded == [stats]
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson.objectid import ObjectId
+
+from api import time as time_api
+from database.cache import InProcessBackend, ReadThroughCache
+
+USER_ID, PLAN_ID = str(ObjectId()), str(ObjectId())
+
+
+class FakeSessions:
+    """study_sessions ในหน่วยความจำ รองรับเฉพาะ find_one ที่ load_current_or_next ใช้"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.finds = 0
+
+    def find_one(self, query, projection, sort):
+        self.finds += 1
+        candidates = [
+            d for d in self.docs
+            if d["ends_at"] > query["ends_at"]["$gt"] and d["starts_at"] < query["starts_at"]["$lt"]
+        ]
+        return min(candidates, key=lambda d: d["ends_at"], default=None)
+
+
+def session(subject, start, minutes=60):
+    return {"subject": subject, "startTime": "", "endTime": "", "starts_at": start,
+            "ends_at": start + timedelta(minutes=minutes)}
+
+
+# 10:00 ที่กรุงเทพ = 03:00 UTC, สิ้นวัน 2026-10-17 ที่กรุงเทพ = 17:00 UTC
+NOW = datetime(2026, 10, 17, 3, 0)
+END_OF_DAY = datetime(2026, 10, 17, 17, 0)
+
+
+@pytest.fixture
+def env(monkeypatch):
+    def install(docs, shared=False):
+        sessions = FakeSessions(docs)
+        backend = InProcessBackend()
+        backend.shared = shared
+        cache = ReadThroughCache(backend, default_ttl=60)
+        monkeypatch.setattr(time_api, "study_sessions_collection", sessions)
+        monkeypatch.setattr(time_api, "cache", cache)
+        return sessions, cache
+    return install
+
+
+def test_returns_active_session_valid_until_it_ends(env):
+    sessions, cache = env([
+        session("later", NOW + timedelta(hours=2)),
+        session("active", NOW - timedelta(minutes=30)),
+        session("done", NOW - timedelta(hours=2)),
+    ])
+
+    entry = time_api.current_or_next(USER_ID, PLAN_ID, NOW)
+
+    assert entry["session"]["subject"] == "active"
+    assert entry["session"]["status"] == "pending"
+    assert entry["valid_until"] == NOW + timedelta(minutes=30)
+
+
+def test_no_more_sessions_today_is_valid_until_end_of_day(env):
+    sessions, cache = env([session("tomorrow", END_OF_DAY + timedelta(hours=1))])
+
+    entry = time_api.current_or_next(USER_ID, PLAN_ID, NOW)
+
+    assert entry == {"session": None, "valid_until": END_OF_DAY}
+
+
+def test_cached_entry_is_reused_until_valid_until(env):
+    sessions, cache = env([session("active", NOW - timedelta(minutes=30))])
+
+    time_api.current_or_next(USER_ID, PLAN_ID, NOW)
+    time_api.current_or_next(USER_ID, PLAN_ID, NOW + timedelta(seconds=10))
+    assert sessions.finds == 1
+
+    # ผลใน cache หมดอายุแล้ว (Session จบ) -> โหลดใหม่แม้ entry ยังไม่ถูกลบ
+    time_api.current_or_next(USER_ID, PLAN_ID, NOW + timedelta(minutes=31))
+    assert sessions.finds == 2
+
+    cache.invalidate(USER_ID, "plans")
+    time_api.current_or_next(USER_ID, PLAN_ID, NOW + timedelta(seconds=10))
+    assert sessions.finds == 3
+
+
+def test_ttl_is_capped_on_the_in_process_backend(env):
+    entry = {"session": None, "valid_until": END_OF_DAY}
+
+    env([], shared=False)
+    assert time_api.timeline_ttl(entry, NOW) == 60
+
+    env([], shared=True)
+    assert time_api.timeline_ttl(entry, NOW) == 14 * 3600
+    assert time_api.timeline_ttl(entry, END_OF_DAY) == 1
@@ -0,0 +1,161 @@
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import InvalidOperation
+
+from database import repositories
+from database.repositories import StudySessionRepository
+
+
+def matches(doc, query):
+    for key, cond in query.items():
+        value = doc.get(key)
+        if isinstance(cond, dict):
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+            if "$ne" in cond and value == cond["$ne"]:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+class FakeSessions:
+    """study_sessions ในหน่วยความจำ รองรับเฉพาะสิ่งที่ update_statuses ใช้"""
+
+    full_name = "db.study_sessions"
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.finds = 0
+
+    def apply(self, op):
+        for doc in self.docs:
+            if matches(doc, op._filter):
+                modified = any(doc.get(k) != v for k, v in op._doc["$set"].items())
+                doc.update(op._doc["$set"])
+                return 1, int(modified)
+        return 0, 0
+
+    def find(self, query, projection):
+        self.finds += 1
+        return [dict(doc) for doc in self.docs if matches(doc, query)]
+
+    def bulk_write(self, ops, ordered):
+        counts = [self.apply(op) for op in ops]
+        return SimpleNamespace(matched_count=sum(m for m, _ in counts), modified_count=sum(n for _, n in counts))
+
+
+class FakeClient:
+
+    def __init__(self, sessions, verbose=True):
+        self.sessions = sessions
+        self.verbose = verbose
+        self.round_trips = 0
+
+    def bulk_write(self, ops, ordered, verbose_results):
+        if not self.verbose:
+            raise InvalidOperation("client bulk write needs MongoDB 8.0")
+        self.round_trips += 1
+        results = {i: SimpleNamespace(matched_count=m, modified_count=n)
+                   for i, (m, n) in enumerate(self.sessions.apply(op) for op in ops)}
+        return SimpleNamespace(
+            matched_count=sum(r.matched_count for r in results.values()),
+            modified_count=sum(r.modified_count for r in results.values()),
+            update_results=results,
+        )
+
+
+class FakePlanStats:
+
+    def __init__(self):
+        self.changes = []
+        self.rebuilt = []
+
+    def apply_completion_changes(self, changes):
+        self.changes.extend((doc["slot_id"], sign) for doc, sign in changes)
+
+    def rebuild(self, exam_id):
+        self.rebuilt.append(exam_id)
+
+
+def session(slot_id, status="pending", exam_id="p1", user_id="u1"):
+    return {"slot_id": slot_id, "status": status, "exam_id": exam_id, "user_id": user_id,
+            "date": "2026-10-17", "startTime": "09:00", "endTime": "10:00", "duration_minutes": 60}
+
+
+@pytest.fixture
+def env(monkeypatch):
+    def install(docs, verbose=True):
+        sessions = FakeSessions(docs)
+        client = FakeClient(sessions, verbose)
+        stats = FakePlanStats()
+        repo = StudySessionRepository("study_sessions")
+        repo._collection = sessions
+        monkeypatch.setattr(repositories, "get_client", lambda: client)
+        monkeypatch.setattr(repositories, "plan_stats", stats)
+        return repo, sessions, client, stats
+    return install
+
+
+def test_single_write_and_exact_completion_flips(env):
+    repo, sessions, client, stats = env([
+        session("a"), session("b", "completed"), session("c", "completed"), session("d"),
+    ])
+
+    result = repo.update_statuses("u1", [
+        {"slot_id": "a", "status": "completed"},
+        {"slot_id": "b", "status": "pending"},
+        {"slot_id": "c", "status": "completed"},  # ไม่เปลี่ยน
+        {"slot_id": "d", "status": "skipped"},    # ไม่ข้าม completed
+    ], exam_id="p1")
+
+    assert client.round_trips == 1
+    assert sorted(stats.changes) == [("a", 1), ("b", -1)]
+    assert result["matched"] == 4 and result["modified"] == 3
+    assert [(s["slot_id"], s["matched"], s["modified"]) for s in result["slots"]] == [
+        ("a", 1, 1), ("b", 1, 1), ("c", 1, 0), ("d", 1, 1),
+    ]
+    assert [d["status"] for d in sessions.docs] == ["completed", "pending", "completed", "skipped"]
+
+
+def test_no_read_when_nothing_crosses_completed(env):
+    repo, sessions, client, stats = env([session("a")])
+    repo.update_statuses("u1", [{"slot_id": "a", "status": "skipped"}])
+    assert sessions.finds == 0
+    assert stats.changes == []
+
+
+def test_slots_of_other_plans_and_users_are_not_touched(env):
+    repo, sessions, client, stats = env([session("a", exam_id="p2"), session("b", user_id="u2")])
+
+    result = repo.update_statuses("u1", [
+        {"slot_id": "a", "status": "completed"},
+        {"slot_id": "b", "status": "completed"},
+    ], exam_id="p1")
+
+    assert result["matched"] == 0 and result["modified"] == 0
+    assert [d["status"] for d in sessions.docs] == ["pending", "pending"]
+    assert stats.changes == []
+
+
+def test_empty_and_duplicate_items(env):
+    repo, sessions, client, stats = env([session("a")])
+    assert repo.update_statuses("u1", [{"slot_id": "a"}])["slots"] == []
+
+    result = repo.update_statuses("u1", [
+        {"slot_id": "a", "status": "completed"},
+        {"slot_id": "a", "status": "skipped"},
+    ])
+    assert [s["slot_id"] for s in result["slots"]] == ["a"]
+    assert sessions.docs[0]["status"] == "skipped"
+
+
+def test_fallback_rebuilds_only_the_affected_plan(env):
+    repo, sessions, client, stats = env([session("a"), session("b", exam_id="p2")], verbose=False)
+
+    result = repo.update_statuses("u1", [{"slot_id": "a", "status": "completed"}], exam_id="p1")
+
+    assert result["modified"] == 1
+    assert result["slots"] == [{"slot_id": "a", "matched": 1, "modified": None}]
+    assert stats.rebuilt == ["p1"]
@@ -6,6 +6,7 @@ import { useNavigate } from 'react-router-dom';
 export default function AdminDashboard() {
   const [liveStats, setLiveStats] = useState(null);
   const [logHistory, setLogHistory] = useState([]);
+  const [nextBefore, setNextBefore] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const navigate = useNavigate();
@@ -17,6 +18,7 @@ export default function AdminDashboard() {
       const res = await axios.get('http://localhost:5000/admin/summary', { withCredentials: true });
       setLiveStats(res.data.live_stats);
       setLogHistory(res.data.log_history);
+      setNextBefore(res.data.next_before);
       setError(null);
     } catch (err) {
       console.error('Fetch summary error:', err);
@@ -30,6 +32,21 @@ export default function AdminDashboard() {
     }
   };
 
+  // โหลด Log หน้าถัดไป (keyset: before = _id ของแถวสุดท้าย)
+  const fetchMoreLogs = async () => {
+    if (!nextBefore) return;
+    try {
+      const res = await axios.get('http://localhost:5000/admin/summary', {
+        params: { before: nextBefore },
+        withCredentials: true,
+      });
+      setLogHistory((prev) => [...prev, ...res.data.log_history]);
+      setNextBefore(res.data.next_before);
+    } catch (err) {
+      console.error('Fetch more logs error:', err);
+    }
+  };
+
   // ดึงข้อมูลครั้งแรกเมื่อเปิดหน้า
   useEffect(() => {
     fetchSummary();
@@ -158,6 +175,16 @@ export default function AdminDashboard() {
                 )}
               </tbody>
             </table>
+            {nextBefore && (
+              <div className="px-6 py-3 text-center border-t border-gray-200">
+                <button
+                  onClick={fetchMoreLogs}
+                  className="text-sm font-semibold text-blue-600 hover:text-blue-800"
+                >
+                  โหลดเพิ่ม
+                </button>
+              </div>
+            )}
           </div>
         </div>
 
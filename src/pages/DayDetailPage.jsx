@@ -45,7 +45,7 @@ export default function DayDetailPage() {
         setIsLoading(true);
         try {
             const [planRes, taskRes] = await Promise.all([
-                axios.get("http://localhost:5000/calender/api/schedule", { withCredentials: true }),
+                axios.get(`http://localhost:5000/calender/api/schedule?from=${date}&to=${date}`, { withCredentials: true }),
                 axios.get(`http://localhost:5000/calender/api/custom-tasks?date=${date}`, { withCredentials: true })
             ]);
             
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import Sidebar from '../components/Sidebar'; 
 import { ClockIcon, PlayIcon, PauseIcon, ArrowPathIcon, ExclamationTriangleIcon } from '@heroicons/react/24/solid';
 
@@ -18,6 +18,12 @@ function Time() {
   const [isLoadingEvent, setIsLoadingEvent] = useState(false);
   const [initialSubject, setInitialSubject] = useState('');
   const [isRescheduled, setIsRescheduled] = useState(false);
+  // ตารางวันนี้ของแผนที่เลือก (แก้ตาม event ของ SSE)
+  const [todayTasks, setTodayTasks] = useState(null);
+  const activeSlotRef = useRef();
+  const rescheduledRef = useRef(false);
+  // เพิ่มค่าเมื่อ server ส่ง resync ให้โหลดตารางวันนี้ใหม่
+  const [refreshKey, setRefreshKey] = useState(0);
 
 
   useEffect(() => {
@@ -73,55 +79,27 @@ function Time() {
 
     const fetchTodayEvent = async () => {
       setIsLoadingEvent(true);
-      setIsActive(false); 
-      setIsRescheduled(false);
+      activeSlotRef.current = undefined;
 
       try {
-        const res = await fetch("http://localhost:5000/calender/api/schedule", {
-          credentials: 'include'
-        });
+        const todayStr = new Date().toLocaleDateString('en-CA'); // YYYY-MM-DD
+        const res = await fetch(
+          `http://localhost:5000/calender/api/schedule?from=${todayStr}&to=${todayStr}&exam_id=${selectedPlanId}`,
+          { credentials: 'include' }
+        );
         
         if (!res.ok) throw new Error('Failed to fetch schedule');
         
         const data = await res.json();
-        const todayStr = new Date().toLocaleDateString('en-CA'); // YYYY-MM-DD
         
-        const todayTasks = data.filter(t => {
+        setTodayTasks(data.filter(t => {
           const tDate = String(t.date).split('T')[0];
           return t.exam_id === selectedPlanId && tDate === todayStr;
-        });
-
-    
-        const rescheduleMarker = todayTasks.find(t => t.status === 'rescheduled');
-        if (rescheduleMarker) {
-          setIsRescheduled(true);
-          setTodaySubject("⛔ วันนี้เลื่อนตาราง");
-          setSecondsLeft(0);
-          setInitialSeconds(0);
-          setInitialSubject('');
-          return;
-        }
-
-  
-        const activeTask = todayTasks.find(t => 
-          t.subject !== 'Free Slot' && t.status !== 'completed'
-        );
-
-        if (activeTask?.startTime && activeTask?.endTime) {
-          const duration = calculateDuration(activeTask.startTime, activeTask.endTime);
-          setSecondsLeft(duration);
-          setInitialSeconds(duration);
-          setTodaySubject(activeTask.subject);
-          setInitialSubject(activeTask.subject);
-        } else {
-          setTodaySubject('ไม่มีเรียนในช่วงนี้ / อ่านครบแล้ว');
-          setSecondsLeft(0);
-          setInitialSeconds(0);
-          setInitialSubject('');
-        }
+        }));
 
       } catch (error) {
         console.error("Fetch event error:", error);
+        setTodayTasks(null);
         setTodaySubject('โหลดข้อมูลไม่สำเร็จ');
       } finally {
         setIsLoadingEvent(false);
@@ -129,6 +107,84 @@ function Time() {
     };
 
     fetchTodayEvent();
+  }, [selectedPlanId, refreshKey]);
+
+
+  // แสดง Session จากตารางวันนี้ (โหลดครั้งแรก หรือแก้ตาม event) ตัวเดิมไม่รีเซ็ต timer
+  useEffect(() => {
+    if (!todayTasks) return;
+
+    rescheduledRef.current = todayTasks.some(t => t.status === 'rescheduled');
+    if (rescheduledRef.current) {
+      activeSlotRef.current = undefined;
+      setIsActive(false);
+      setIsRescheduled(true);
+      setTodaySubject("⛔ วันนี้เลื่อนตาราง");
+      setSecondsLeft(0);
+      setInitialSeconds(0);
+      setInitialSubject('');
+      return;
+    }
+    setIsRescheduled(false);
+
+    const activeTask = todayTasks.find(t => 
+      t.subject !== 'Free Slot' && t.status !== 'completed'
+    );
+    const activeSlot = activeTask?.slot_id ?? null;
+    if (activeSlot === activeSlotRef.current) return;
+    activeSlotRef.current = activeSlot;
+    showTask(activeTask);
+  }, [todayTasks]);
+
+
+  // รับ event แบบ real-time (SSE): ใช้ข้อมูลใน event แก้ state ตรงๆ โหลดใหม่ทั้งหมดตอน reschedule / resync
+  useEffect(() => {
+    if (!selectedPlanId) return;
+
+    const source = new EventSource(
+      `http://localhost:5000/events/stream?plan_id=${selectedPlanId}`,
+      { withCredentials: true }
+    );
+    let isFirstTimer = true;
+
+    const parseForThisPlan = (e) => {
+      const data = JSON.parse(e.data);
+      return !data.plan_id || data.plan_id === selectedPlanId ? data : null;
+    };
+    const handleTimer = (e) => {
+      const data = parseForThisPlan(e);
+      // event timer แรกคือสถานะตอนเชื่อมต่อ (โหลดไปแล้ว)
+      if (!data || isFirstTimer) {
+        isFirstTimer = false;
+        return;
+      }
+      if (rescheduledRef.current) return;
+      // timer บอก Session ตามเวลาจริง: แสดงตามนั้น แล้วให้ตารางที่เปลี่ยนครั้งถัดไปคำนวณใหม่
+      activeSlotRef.current = undefined;
+      showTask(data.session?.status === 'completed' ? null : data.session);
+    };
+    const handleSessionStatus = (e) => {
+      const data = parseForThisPlan(e);
+      if (!data) return;
+      const statuses = new Map(data.changes.map(c => [c.slot_id, c.status]));
+      setTodayTasks((tasks) => tasks && tasks.map(t => 
+        statuses.has(t.slot_id) ? { ...t, status: statuses.get(t.slot_id) } : t
+      ));
+    };
+    const handleReschedule = (e) => {
+      const data = parseForThisPlan(e);
+      const todayStr = new Date().toLocaleDateString('en-CA');
+      // เลื่อนจากวันนี้หรือวันก่อน -> ตารางวันนี้เปลี่ยน โหลดใหม่จาก server
+      if (data && data.date <= todayStr) setRefreshKey((k) => k + 1);
+    };
+    const handleResync = () => setRefreshKey((k) => k + 1);
+
+    source.addEventListener('timer', handleTimer);
+    source.addEventListener('session_status', handleSessionStatus);
+    source.addEventListener('reschedule', handleReschedule);
+    source.addEventListener('resync', handleResync);
+
+    return () => source.close();
   }, [selectedPlanId]);
 
 
@@ -162,6 +218,22 @@ function Time() {
     }
   };
 
+  const showTask = (task) => {
+    setIsActive(false);
+    if (task?.startTime && task?.endTime) {
+      const duration = calculateDuration(task.startTime, task.endTime);
+      setSecondsLeft(duration);
+      setInitialSeconds(duration);
+      setTodaySubject(task.subject);
+      setInitialSubject(task.subject);
+    } else {
+      setTodaySubject('ไม่มีเรียนในช่วงนี้ / อ่านครบแล้ว');
+      setSecondsLeft(0);
+      setInitialSeconds(0);
+      setInitialSubject('');
+    }
+  };
+
   const formatTime = (seconds) => {
     if (seconds <= 0) return "00:00:00";
     const h = Math.floor(seconds / 3600);